@@ -6,18 +6,19 @@ not even need to know the coordinates/location! Good luck!
 import itertools
 import math
 import statistics
-import time
 from collections import namedtuple
-from timeit import default_timer as timer
 
-from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 
 import main
+from budget import COMPLETE, ERROR, Budget, BudgetTracker
+from metrics import TestProgress
 from utils import DATA_FOLDER, get_log_function, log_date_time
 
 
 TARGETS = 30
+# No limits by default, the test always being a fixed number of targets.
+BUDGET = Budget()
 MIN_Y_TO_USE_ACTION_CHAINS = 375
 # Radius of each circular target in pixels.
 RADIUS = 50
@@ -26,7 +27,9 @@ LOG = DATA_FOLDER / "aim.txt"
 
 AimResult = namedtuple(
     "AimResult",
-    ("targets", "seconds", "ms_per_target", "coordinates", "distance")
+    ("targets", "seconds", "ms_per_target", "coordinates", "distance",
+    "stop_reason"),
+    defaults=(None,)
 )
 # Distance between targets - the general results.
 DistanceResult = namedtuple(
@@ -57,14 +60,16 @@ def get_distance_result(coordinates: list[tuple[int, int]]) -> DistanceResult:
 
 
 def get_aim_result(
-    targets: int, seconds: float, coordinates: list[tuple[int, int]]
+    targets: int, seconds: float, coordinates: list[tuple[int, int]],
+    stop_reason: str | None = None
 ) -> AimResult:
     """Returns information regarding the aim trainer result."""
     if not targets:
-        return AimResult(0, 0, 0, [], None)
+        return AimResult(0, 0, 0, [], None, stop_reason)
     ms_per_target = seconds / targets * 1000
     distance = get_distance_result(coordinates)
-    return AimResult(targets, seconds, ms_per_target, coordinates, distance)
+    return AimResult(
+        targets, seconds, ms_per_target, coordinates, distance, stop_reason)
 
 
 def click_target(driver: "main.ComputerBenchmark") -> tuple[int, int]:
@@ -87,9 +92,7 @@ def click_target(driver: "main.ComputerBenchmark") -> tuple[int, int]:
         to_click.click()
     except Exception:
         # Either y is too large (ads will intercept), or basic click fails.
-        action_chain = ActionChains(driver)
-        action_chain.move_to_element_with_offset(
-            to_click, 0, -10).click().perform()
+        driver.offset_click(to_click, 0, -10)
     return (x, y)
 
 
@@ -99,14 +102,21 @@ def get_remaining(driver: "main.ComputerBenchmark") -> int:
     return int(remaining_element.text.removeprefix("Remaining"))
 
 
-def aim_trainer(driver: "main.ComputerBenchmark"):
-    """Performs the aim test and returns the result."""
+def aim_trainer(
+    driver: "main.ComputerBenchmark", budget: Budget | None = None
+) -> AimResult:
+    """
+    Performs the aim test and returns the result,
+    stopping early if the budget (by default BUDGET) is used up.
+    """
     log_date_time(log, "Aim trainer started at {} UTC.")
     driver.get_test("aim")
+    tracker = BudgetTracker(driver, BUDGET if budget is None else budget)
+    progress = TestProgress(driver, "aim")
     # Click the target to start.
     click_target(driver)
     coordinates = []
-    start = timer()
+    start = driver.clock()
     # Click the target n times until completion.s
     for i in range(TARGETS):
         try:
@@ -114,18 +124,29 @@ def aim_trainer(driver: "main.ComputerBenchmark"):
             log(f"{i+1}. {target_coords}")
         except Exception:
             log("Error while clicking!")
+            progress.error()
+            stop_reason = ERROR
             break
         coordinates.append(target_coords)
-    stop = timer()
-    time.sleep(0.25)
+        progress.round(len(coordinates))
+        if i < TARGETS - 1:
+            stop_reason = tracker.check(len(coordinates))
+            if stop_reason is not None:
+                log(f"Budget used up ({stop_reason}).")
+                break
+    else:
+        stop_reason = COMPLETE
+    stop = driver.clock()
+    driver.sleep(0.25)
     if "Average time per target" in driver.page_source:
         # Fully complete.
-        return get_aim_result(TARGETS, stop - start, coordinates)
-    # Incomplete. Something must've gone wrong.
+        return get_aim_result(TARGETS, stop - start, coordinates, COMPLETE)
+    # Incomplete. Either stopped early or something went wrong.
     try:
         targets = TARGETS - get_remaining(driver)
     except Exception:
         log("Error while fetching the remaining number of targets.")
-        return get_aim_result(0, 0, [])
+        progress.error()
+        return get_aim_result(0, 0, [], ERROR)
     return get_aim_result(
-        targets, stop - start, coordinates[:targets])
+        targets, stop - start, coordinates[:targets], stop_reason)
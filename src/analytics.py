@@ -0,0 +1,211 @@
+"""
+Trends across all past runs of the tests, from the logs. Each series of
+values (such as each reaction time, or each verbal memory score) is
+parsed into NumPy arrays along with the start time of the run, cached
+in columnar .npy files so that loading it again is memory-mapped.
+Requires NumPy, unlike the tests themselves.
+"""
+import argparse
+import re
+from collections import namedtuple
+
+import numpy as np
+
+import aim
+import chimp
+import number
+import reaction
+import sequence
+import typing_
+import verbal
+import visual
+from archive import RUN_START_REGEX, read_log
+from utils import DATA_FOLDER
+
+
+CACHE_FOLDER = DATA_FOLDER / "analytics"
+DEFAULT_PERCENTILES = (10, 50, 90)
+# Number of runs in each rolling window.
+DEFAULT_WINDOW = 20
+DEFAULT_BINS = 10
+
+
+Series = namedtuple("Series", ("log_path", "regex", "unit"))
+SeriesData = namedtuple("SeriesData", ("times", "values"))
+DailyPercentiles = namedtuple(
+    "DailyPercentiles", ("days", "counts", "percentiles"))
+
+
+def value_regex(pattern: str) -> re.Pattern:
+    """Regex of a whole log line, capturing the value."""
+    return re.compile(f"^{pattern}$", re.MULTILINE)
+
+
+# Series which can be reported, each value on a line of its own.
+SERIES = {
+    "reaction_ms": Series(
+        reaction.LOG, value_regex(r"Attempt \d+: (\d+)ms"), "ms"),
+    "sequence_score": Series(sequence.LOG, value_regex(r"Score: (\d+)"), ""),
+    "chimp_squares_per_second": Series(
+        chimp.LOG, value_regex(r"Squares per second: ([\d.]+)"), "/s"),
+    "aim_ms_per_target": Series(
+        aim.LOG, value_regex(r"([\d.]+)ms / target"), "ms"),
+    "aim_mean_distance": Series(
+        aim.LOG, value_regex(r"Mean distance: ([\d.]+)px"), "px"),
+    "typing_wpm": Series(typing_.LOG, value_regex(r"([\d.]+) WPM"), "wpm"),
+    "verbal_score": Series(verbal.LOG, value_regex(r"Score: (\d+)"), ""),
+    "number_score": Series(number.LOG, value_regex(r"Score: (\d+)"), ""),
+    "visual_score": Series(visual.LOG, value_regex(r"Score: (\d+)"), "")
+}
+
+
+def parse_series(series: Series) -> SeriesData:
+    """
+    Parses the values of a series from its log (including archived runs),
+    each with the start time of the run it belongs to, in the order logged.
+    """
+    text = read_log(series.log_path)
+    starts = list(RUN_START_REGEX.finditer(text))
+    matches = list(series.regex.finditer(text))
+    start_positions = np.array([start.start() for start in starts])
+    start_times = np.array(
+        [start.group(1) for start in starts], dtype="datetime64[us]")
+    positions = np.array([match.start() for match in matches])
+    values = np.array([float(match.group(1)) for match in matches])
+    # The run of each value is the latest to start before it.
+    runs = np.searchsorted(start_positions, positions, side="right") - 1
+    in_run = runs >= 0
+    return SeriesData(
+        start_times.astype("datetime64[s]")[runs[in_run]], values[in_run])
+
+
+def load_series(name: str) -> SeriesData:
+    """
+    Loads a series, parsing the log only if it has changed since the
+    series was last cached, else memory-mapping the cached columns.
+    """
+    series = SERIES[name]
+    if not series.log_path.is_file():
+        return SeriesData(
+            np.array([], dtype="datetime64[s]"), np.array([], dtype=float))
+    times_path = CACHE_FOLDER / f"{name}.times.npy"
+    values_path = CACHE_FOLDER / f"{name}.values.npy"
+    log_modified = series.log_path.stat().st_mtime
+    if (
+        not values_path.is_file()
+        or values_path.stat().st_mtime < log_modified
+    ):
+        data = parse_series(series)
+        CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+        np.save(times_path, data.times)
+        # Values saved last, so a complete cache is never older than the log.
+        np.save(values_path, data.values)
+    return SeriesData(
+        np.load(times_path, mmap_mode="r"),
+        np.load(values_path, mmap_mode="r"))
+
+
+def grouped_percentiles(
+    groups: np.ndarray, values: np.ndarray, percentiles: tuple[float]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the unique groups, the count of each and the given percentiles
+    of the values in each (one column per percentile), by linear
+    interpolation, computed for all groups at once.
+    """
+    order = np.lexsort((values, groups))
+    groups = groups[order]
+    values = values[order]
+    unique_groups, starts, counts = np.unique(
+        groups, return_index=True, return_counts=True)
+    positions = (
+        starts[:, None]
+        + np.asarray(percentiles)[None, :] / 100 * (counts[:, None] - 1))
+    lower = np.floor(positions).astype(int)
+    upper = np.ceil(positions).astype(int)
+    fractions = positions - lower
+    results = values[lower] + (values[upper] - values[lower]) * fractions
+    return unique_groups, counts, results
+
+
+def daily_percentiles(
+    data: SeriesData, percentiles: tuple[float] = DEFAULT_PERCENTILES
+) -> DailyPercentiles:
+    """Returns the percentiles of the values of each day (UTC)."""
+    days = data.times.astype("datetime64[D]")
+    return DailyPercentiles(
+        *grouped_percentiles(days, np.asarray(data.values), percentiles))
+
+
+def rolling_mean(
+    values: np.ndarray, window: int = DEFAULT_WINDOW
+) -> np.ndarray:
+    """
+    Returns the mean of each full window of consecutive values,
+    from the window ending at the first value onwards.
+    """
+    if len(values) < window:
+        return np.array([], dtype=float)
+    sums = np.cumsum(np.concatenate(([0], values)))
+    return (sums[window:] - sums[:-window]) / window
+
+
+def output_report(
+    name: str, data: SeriesData, percentiles: tuple[float],
+    window: int, bins: int
+) -> None:
+    """Outputs the trend report of a series."""
+    unit = SERIES[name].unit
+    print(f"=== {name} ===")
+    if not len(data.values):
+        print("No data.")
+        return
+    values = np.asarray(data.values)
+    print(f"Values: {len(values)}")
+    overall = np.percentile(values, percentiles)
+    print("Overall: " + ", ".join(
+        f"p{percentile:g} {round(value, 2)}{unit}"
+        for percentile, value in zip(percentiles, overall)))
+    print("Daily:")
+    daily = daily_percentiles(data, percentiles)
+    for day, count, day_percentiles in zip(*daily):
+        print(f"{day} ({count}) - " + ", ".join(
+            f"p{percentile:g} {round(value, 2)}{unit}"
+            for percentile, value in zip(percentiles, day_percentiles)))
+    means = rolling_mean(values, window)
+    if len(means):
+        print(
+            f"Rolling mean of {window}: latest {round(means[-1], 2)}{unit}, "
+            f"min {round(means.min(), 2)}{unit}, "
+            f"max {round(means.max(), 2)}{unit}")
+    print("Distribution:")
+    counts, edges = np.histogram(values, bins)
+    for count, low, high in zip(counts, edges, edges[1:]):
+        print(f"{round(low, 2)}-{round(high, 2)}{unit} - {count}")
+
+
+def main() -> None:
+    """Outputs trend reports of past runs from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "series", nargs="*", default=list(SERIES),
+        help=f"series to report: {', '.join(SERIES)} (by default, all)")
+    parser.add_argument(
+        "--percentiles", nargs="+", type=float,
+        default=list(DEFAULT_PERCENTILES))
+    parser.add_argument(
+        "--window", type=int, default=DEFAULT_WINDOW,
+        help="number of values in each rolling window")
+    parser.add_argument("--bins", type=int, default=DEFAULT_BINS)
+    args = parser.parse_args()
+    for name in args.series:
+        if name not in SERIES:
+            parser.error(f"Unknown series: {name}")
+    for name in args.series:
+        output_report(
+            name, load_series(name), tuple(args.percentiles),
+            args.window, args.bins)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Rotation of the test logs into compressed archives. Once a log grows
+too big or its oldest run too old, its runs are moved into a new gzip
+segment, each run compressed as a gzip member of its own, and indexed
+by start time along with its segment, offset and length. A single run
+can then be read back by seeking straight to it, decompressing only
+that run, rather than scanning the whole history.
+"""
+import argparse
+import bisect
+import datetime as dt
+import gzip
+import pathlib
+import re
+from collections import namedtuple
+from typing import Iterator
+
+from utils import DATA_FOLDER
+
+
+ARCHIVE_FOLDER = DATA_FOLDER / "archive"
+# Logs are rotated once bigger than this many bytes by default...
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+# ...or once their oldest run is older than this many days.
+DEFAULT_MAX_AGE_DAYS = 30
+COMPRESS_LEVEL = 9
+INDEX_NAME = "index.tsv"
+# Logged at the start of every run of every test.
+RUN_START_REGEX = re.compile(r"^.* started at (.+) UTC\.$", re.MULTILINE)
+
+
+# Start time is as logged, empty for any text before the first run.
+IndexEntry = namedtuple(
+    "IndexEntry", ("start", "segment", "offset", "length"))
+RotationResult = namedtuple(
+    "RotationResult", ("log_path", "runs", "bytes_before", "bytes_after"))
+
+
+def get_archive_folder(log_path: pathlib.Path) -> pathlib.Path:
+    """Folder of the segments and index of a log."""
+    return ARCHIVE_FOLDER / log_path.stem
+
+
+def get_disk_usage(log_path: pathlib.Path) -> int:
+    """Bytes taken by a log and its archives."""
+    paths = [log_path]
+    folder = get_archive_folder(log_path)
+    if folder.is_dir():
+        paths.extend(folder.iterdir())
+    return sum(path.stat().st_size for path in paths if path.is_file())
+
+
+def split_runs(text: str) -> list[tuple[str, str]]:
+    """Splits log text into the start time and text of each run."""
+    starts = list(RUN_START_REGEX.finditer(text))
+    runs = []
+    if not starts or starts[0].start():
+        # Text logged before any run started.
+        end = starts[0].start() if starts else len(text)
+        runs.append(("", text[:end]))
+    for start, next_start in zip(starts, starts[1:] + [None]):
+        end = next_start.start() if next_start is not None else len(text)
+        runs.append((start.group(1), text[start.start():end]))
+    return runs
+
+
+def parse_start(start: str) -> dt.datetime:
+    """Date/time of a logged start time, the earliest if empty."""
+    return dt.datetime.fromisoformat(start) if start else dt.datetime.min
+
+
+def read_index(log_path: pathlib.Path) -> list[IndexEntry]:
+    """Index of the archived runs of a log, oldest first."""
+    index_path = get_archive_folder(log_path) / INDEX_NAME
+    if not index_path.is_file():
+        return []
+    entries = []
+    with index_path.open(encoding="utf8") as f:
+        for line in f:
+            start, segment, offset, length = line.rstrip("\n").split("\t")
+            entries.append(
+                IndexEntry(start, segment, int(offset), int(length)))
+    return entries
+
+
+def needs_rotation(
+    log_path: pathlib.Path, max_bytes: int, max_age_days: float
+) -> bool:
+    """Whether a log is too big, or its oldest run too old."""
+    if not log_path.is_file():
+        return False
+    size = log_path.stat().st_size
+    if size > max_bytes:
+        return True
+    if not size:
+        return False
+    # The oldest run starts on the first line.
+    with log_path.open(encoding="utf8") as f:
+        match = RUN_START_REGEX.match(f.readline().rstrip("\n"))
+    if match is None:
+        return False
+    age = dt.datetime.utcnow() - parse_start(match.group(1))
+    return age > dt.timedelta(days=max_age_days)
+
+
+def rotate(
+    log_path: pathlib.Path, max_bytes: int = DEFAULT_MAX_BYTES,
+    max_age_days: float = DEFAULT_MAX_AGE_DAYS, force: bool = False
+) -> RotationResult | None:
+    """
+    Moves the runs of a log into a new compressed segment if it needs
+    rotating (or regardless if forced), emptying the log.
+    Returns None if it did not need rotating.
+    """
+    if not (
+        log_path.is_file() and log_path.stat().st_size
+        and (force or needs_rotation(log_path, max_bytes, max_age_days))
+    ):
+        return None
+    bytes_before = get_disk_usage(log_path)
+    runs = split_runs(log_path.read_text("utf8"))
+    folder = get_archive_folder(log_path)
+    folder.mkdir(parents=True, exist_ok=True)
+    index = read_index(log_path)
+    segment = f"{len(set(entry.segment for entry in index)) + 1}.gz"
+    entries = []
+    offset = 0
+    with (folder / segment).open("wb") as f:
+        for start, text in runs:
+            member = gzip.compress(text.encode("utf8"), COMPRESS_LEVEL)
+            f.write(member)
+            entries.append(IndexEntry(start, segment, offset, len(member)))
+            offset += len(member)
+    # Index written before emptying the log, so no run is ever lost.
+    with (folder / INDEX_NAME).open("a", encoding="utf8") as f:
+        for entry in entries:
+            f.write("\t".join(map(str, entry)) + "\n")
+    log_path.write_text("", "utf8")
+    return RotationResult(
+        log_path, len(runs), bytes_before, get_disk_usage(log_path))
+
+
+def rotate_logs(
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_age_days: float = DEFAULT_MAX_AGE_DAYS, force: bool = False
+) -> list[RotationResult]:
+    """Rotates every log in the data folder which needs it."""
+    results = []
+    for log_path in sorted(DATA_FOLDER.glob("*.txt")):
+        result = rotate(log_path, max_bytes, max_age_days, force)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def read_entry(log_path: pathlib.Path, entry: IndexEntry) -> str:
+    """Decompresses a single archived run."""
+    with (get_archive_folder(log_path) / entry.segment).open("rb") as f:
+        f.seek(entry.offset)
+        return gzip.decompress(f.read(entry.length)).decode("utf8")
+
+
+def read_run(log_path: pathlib.Path, start: dt.datetime) -> str | None:
+    """
+    Text of the run of a log which started at the given time (or the
+    latest to start before it), archived or not. None if there is none.
+    """
+    if log_path.is_file():
+        # Runs still in the log are newer than any archived.
+        live_runs = [
+            text for run_start, text in split_runs(log_path.read_text("utf8"))
+            if run_start and parse_start(run_start) <= start]
+        if live_runs:
+            return live_runs[-1]
+    index = read_index(log_path)
+    starts = [parse_start(entry.start) for entry in index]
+    i = bisect.bisect_right(starts, start) - 1
+    if i < 0:
+        return None
+    return read_entry(log_path, index[i])
+
+
+def iter_runs(log_path: pathlib.Path) -> Iterator[tuple[str, str]]:
+    """Start time and text of every run of a log, oldest first."""
+    for entry in read_index(log_path):
+        yield entry.start, read_entry(log_path, entry)
+    if log_path.is_file():
+        yield from split_runs(log_path.read_text("utf8"))
+
+
+def read_log(log_path: pathlib.Path) -> str:
+    """Entire text of a log, including its archived runs."""
+    return "".join(text for _, text in iter_runs(log_path))
+
+
+def format_bytes(count: int) -> str:
+    """Human-readable number of bytes."""
+    for unit in ("B", "KiB", "MiB"):
+        if count < 1024:
+            return f"{round(count, 1)}{unit}"
+        count /= 1024
+    return f"{round(count, 1)}GiB"
+
+
+def cli() -> None:
+    """Rotates the logs, or outputs a single run, from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rotate_parser = subparsers.add_parser(
+        "rotate", help="archive every log which is too big or old")
+    rotate_parser.add_argument(
+        "--max-bytes", type=int, default=DEFAULT_MAX_BYTES)
+    rotate_parser.add_argument(
+        "--max-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS)
+    rotate_parser.add_argument(
+        "--force", action="store_true", help="archive every log regardless")
+    show_parser = subparsers.add_parser(
+        "show", help="output the run of a log started at a given time")
+    show_parser.add_argument("log", help="name of the log, such as verbal")
+    show_parser.add_argument(
+        "start", type=dt.datetime.fromisoformat,
+        help="UTC start time of the run, such as 2023-05-01T12:00:00")
+    args = parser.parse_args()
+    if args.command == "show":
+        text = read_run(DATA_FOLDER / f"{args.log}.txt", args.start)
+        if text is None:
+            parser.error("no run started by then")
+        print(text, end="")
+        return
+    results = rotate_logs(args.max_bytes, args.max_age_days, args.force)
+    if not results:
+        print("No logs needed rotating.")
+    for result in results:
+        print(
+            f"{result.log_path.name} - {result.runs} runs, "
+            f"{format_bytes(result.bytes_before)} before, "
+            f"{format_bytes(result.bytes_after)} after")
+
+
+if __name__ == "__main__":
+    cli()
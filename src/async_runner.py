@@ -0,0 +1,459 @@
+"""
+Runs the tests over the DevTools protocol with asyncio instead of
+Selenium. DevToolsBenchmark adapts the asynchronous page to the
+synchronous driver interface the tests use, so any test can run on it
+unchanged, whilst tests ported to async (see ASYNC_TESTS) overlap their
+browser commands with parsing and analysis. Logs are written in the
+background in either case. Compares the throughput of each test by
+both paths from the command line.
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+from typing import Any, Callable
+
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import (
+    ElementClickInterceptedException, NoSuchElementException,
+    StaleElementReferenceException, WebDriverException)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait as Wait
+
+import chimp
+import elements
+import main
+import simulation
+from budget import COMPLETE, ERROR, Budget, BudgetTracker
+from devtools import DevToolsError, DevToolsPage
+from utils import background_logging, get_islands, log_date_time
+
+
+DEFAULT_RUNS = 3
+# Finds elements by a Selenium locator, relative to this.
+FIND_FUNCTION = """
+function(by, value) {
+    if (by === "xpath") {
+        const result = document.evaluate(
+            value, this, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        const found = [];
+        for (let i = 0; i < result.snapshotLength; i++) {
+            found.push(result.snapshotItem(i));
+        }
+        return found;
+    }
+    const selector = {
+        "class name": "." + CSS.escape(value.trim()),
+        "id": "#" + CSS.escape(value),
+        "name": `[name="${CSS.escape(value)}"]`
+    }[by] || value;
+    return [...this.querySelectorAll(selector)];
+}
+"""
+# Scrolls an element into view if needed, returning the point to click
+# and whether another element would receive the click instead.
+CLICK_POINT_FUNCTION = """
+function(xOffset, yOffset, checkIntercepted) {
+    let rect = this.getBoundingClientRect();
+    if (
+        rect.top < 0 || rect.left < 0 || rect.bottom > innerHeight
+        || rect.right > innerWidth
+    ) {
+        this.scrollIntoView({block: "center", inline: "center"});
+        rect = this.getBoundingClientRect();
+    }
+    const x = rect.left + rect.width / 2 + xOffset;
+    const y = rect.top + rect.height / 2 + yOffset;
+    const hit = document.elementFromPoint(x, y);
+    const intercepted = (
+        checkIntercepted && !(hit && (hit === this || this.contains(hit))));
+    return [x, y, intercepted];
+}
+"""
+# Same as Selenium, displayed meaning rendered with a size and visible.
+IS_DISPLAYED_FUNCTION = """
+function() {
+    const style = getComputedStyle(this);
+    return (
+        this.getClientRects().length > 0 && style.visibility !== "hidden"
+        && style.display !== "none");
+}
+"""
+# Keys sent as key presses rather than text, with their codes.
+SPECIAL_KEYS = {
+    Keys.ENTER: ("Enter", "Enter", 13, "\r"),
+    Keys.RETURN: ("Enter", "Enter", 13, "\r"),
+    Keys.DOWN: ("ArrowDown", "ArrowDown", 40, None)
+}
+
+
+def element_function(function: str) -> str:
+    """
+    Wraps a function called on an element, checking in the same round
+    trip that the element is still attached to the page.
+    """
+    return (
+        "function(...args) { if (!this.isConnected) return {stale: true}; "
+        f"return {{value: ({function.strip()}).apply(this, args)}}; }}")
+
+
+class DevToolsElement:
+    """Element handle, with the WebElement methods used by the tests."""
+
+    def __init__(self, driver: "DevToolsBenchmark", object_id: str) -> None:
+        self.driver = driver
+        self.object_id = object_id
+
+    def call(self, function: str, *args: Any) -> Any:
+        """Calls a function with the element as this, returning the value."""
+        result = self.driver.run(self.driver.page.call(
+            self.object_id, element_function(function), *args))
+        if result.get("stale"):
+            raise StaleElementReferenceException(
+                "Element is no longer attached to the page.")
+        return result.get("value")
+
+    @property
+    def text(self) -> str:
+        return self.call("function() { return this.innerText; }")
+
+    def get_attribute(self, name: str) -> str | None:
+        return self.call(
+            "function(name) { return name === 'value'"
+            " ? this.value : this.getAttribute(name); }",
+            name)
+
+    def is_displayed(self) -> bool:
+        return self.call(IS_DISPLAYED_FUNCTION)
+
+    def is_enabled(self) -> bool:
+        return self.call("function() { return !this.disabled; }")
+
+    def click(self) -> None:
+        """Clicks the centre of the element with trusted mouse events."""
+        self.click_at(0, 0, True)
+
+    def click_at(
+        self, x_offset: float, y_offset: float, check_intercepted: bool
+    ) -> None:
+        """Clicks at an offset from the centre of the element."""
+        x, y, intercepted = self.call(
+            CLICK_POINT_FUNCTION, x_offset, y_offset, check_intercepted)
+        if intercepted:
+            raise ElementClickInterceptedException(
+                "Another element would receive the click.")
+        self.driver.run(self.driver.page.click_at(x, y))
+
+    def send_keys(self, text: str) -> None:
+        """Focuses the element and types into it."""
+        self.call("function() { this.focus(); }")
+        run = ""
+        for character in text:
+            if character not in SPECIAL_KEYS:
+                run += character
+                continue
+            if run:
+                self.driver.run(self.driver.page.type_text(run))
+                run = ""
+            self.driver.run(
+                self.driver.page.press_key(*SPECIAL_KEYS[character]))
+        if run:
+            self.driver.run(self.driver.page.type_text(run))
+
+    def find_element(self, by: str, value: str) -> "DevToolsElement":
+        return self.driver.find_element(by, value, self)
+
+    def find_elements(self, by: str, value: str) -> list["DevToolsElement"]:
+        return self.driver.find_elements(by, value, self)
+
+
+class DevToolsBenchmark:
+    """
+    Driver interface of ComputerBenchmark over the DevTools protocol.
+    The event loop runs in a thread of its own, with each call waiting
+    on the result of its coroutine, so the tests stay synchronous.
+    """
+
+    def __init__(
+        self, headless: bool = False, domain: str = main.DOMAIN
+    ) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.domain = domain
+        self.element_cache = elements.ElementCache()
+        self.page = self.run(DevToolsPage.launch(headless))
+        self.run(self.page.navigate(domain))
+        # Attempts to agree to cookies several times before giving up.
+        for _ in range(3):
+            try:
+                self.wait(
+                    (By.XPATH, "//span[text()='AGREE']"),
+                    until=EC.element_to_be_clickable).click()
+                break
+            except (WebDriverException, DevToolsError):
+                pass
+        else:
+            raise RuntimeError("Failed to accept cookies.")
+
+    def __enter__(self) -> "DevToolsBenchmark":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.quit()
+
+    def run(self, coroutine: Any) -> Any:
+        """Runs a coroutine on the event loop, waiting for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def quit(self) -> None:
+        """Closes the browser and stops the event loop."""
+        self.run(self.page.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def get_test(self, test_name: str) -> None:
+        """Loads a particular test, by the last part of the URL."""
+        self.element_cache.invalidate()
+        self.element_cache.reset_stats()
+        self.run(self.page.navigate(f"{self.domain}/tests/{test_name}"))
+
+    def click_start(self, start_button_text: str = "Start") -> None:
+        """Clicks on the start button of a test."""
+        self.wait(
+            (By.XPATH, f"//button[text()='{start_button_text}']")).click()
+
+    def clock(self) -> float:
+        """Current time in seconds, for timing the tests."""
+        return timer()
+
+    def sleep(self, seconds: float) -> None:
+        """Pauses between actions, never for a negative duration."""
+        time.sleep(max(seconds, 0))
+
+    def wait(
+        self, locator: tuple[By, str],
+        timeout: int | float = 15, poll: float = 0.1,
+        until = EC.presence_of_element_located
+    ) -> DevToolsElement:
+        """Waits as ComputerBenchmark does, polling over DevTools."""
+        return Wait(self, timeout, poll).until(until(locator))
+
+    def find_elements(
+        self, by: str, value: str, context: DevToolsElement = None
+    ) -> list[DevToolsElement]:
+        """Finds all elements by a locator, within an element if given."""
+
+        async def find() -> list[str]:
+            if context is None:
+                array = await self.page.call(
+                    None, FIND_FUNCTION, by, value, by_value=False)
+            else:
+                array = await self.page.call(
+                    context.object_id,
+                    "function(by, value) {"
+                    " if (!this.isConnected) return null; return"
+                    f" ({FIND_FUNCTION.strip()}).call(this, by, value); }}",
+                    by, value, by_value=False)
+                if array is None:
+                    raise StaleElementReferenceException(
+                        "Element is no longer attached to the page.")
+            return await self.page.array_items(array)
+
+        return [
+            DevToolsElement(self, object_id) for object_id in self.run(find())]
+
+    def find_element(
+        self, by: str, value: str, context: DevToolsElement = None
+    ) -> DevToolsElement:
+        """Finds the first element by a locator, as Selenium does."""
+        found = self.find_elements(by, value, context)
+        if not found:
+            raise NoSuchElementException(f"No element found: {by} {value}")
+        return found[0]
+
+    @property
+    def page_source(self) -> str:
+        return self.run(self.page.call(
+            None, "function() { return this.documentElement.outerHTML; }"))
+
+    def execute_script(self, script: str, *args: Any) -> Any:
+        """Executes a script as Selenium does, as the body of a function."""
+        arguments = [
+            {"objectId": arg.object_id}
+            if isinstance(arg, DevToolsElement) else arg for arg in args]
+        return self.run(self.page.call(
+            None, f"function() {{ {script}\n}}", *arguments))
+
+    def pipeline(self, calls: list[Callable]) -> list:
+        """
+        Runs driver calls which do not depend on each other at once,
+        their commands being in flight on the connection together.
+        """
+        if len(calls) <= 1:
+            return [call() for call in calls]
+        with ThreadPoolExecutor(len(calls)) as executor:
+            return list(executor.map(lambda call: call(), calls))
+
+    def offset_click(
+        self, element: DevToolsElement, x_offset: int, y_offset: int
+    ) -> None:
+        """Clicks at an offset from the centre of an element."""
+        element.click_at(x_offset, y_offset, False)
+
+    def find_cached(
+        self, by: str, value: str, many: bool = False
+    ) -> DevToolsElement | list[DevToolsElement]:
+        """Finds an element (or elements), cached until the page changes."""
+        return self.element_cache.find(self, (by, value), many)
+
+    def use_cached(
+        self, locator: tuple[str, str], use: Callable, many: bool = False
+    ) -> Any:
+        """
+        Calls a function with a cached element (or elements),
+        finding it again if it turns out to be stale.
+        """
+        return self.element_cache.use(self, locator, use, many)
+
+
+# Clicks the chimp test squares in order, in one round trip.
+CHIMP_CLICK_FUNCTION = """
+function(numbers) {
+    for (let number = 1; number <= numbers; number++) {
+        this.querySelector(`[data-cellnumber="${number}"]`).click();
+    }
+}
+"""
+
+
+def parse_chimp_grid(page_source: str) -> list[list[int]]:
+    """Grid of the chimp test numbers, 0 where there is no square."""
+    soup = BeautifulSoup(page_source, "lxml")
+    return [
+        [int(div.get("data-cellnumber", 0))
+            for div in row.find_all("div", recursive=False)]
+        for row in soup.find_all(class_="css-k008qs")]
+
+
+async def async_chimp(
+    driver: DevToolsBenchmark, budget: Budget | None = None
+) -> chimp.ChimpResult:
+    """
+    Performs the chimp test natively on the event loop. Each grid is
+    parsed in a thread whilst its squares are being clicked.
+    """
+    page = driver.page
+    log_date_time(chimp.log, "Chimp test started at {} UTC.")
+    driver.element_cache.invalidate()
+    await page.navigate(f"{driver.domain}/tests/chimp")
+    tracker = BudgetTracker(
+        driver, chimp.BUDGET if budget is None else budget)
+    await asyncio.to_thread(driver.click_start, "Start Test")
+    start = driver.clock()
+    grids = []
+    for numbers in range(chimp.MIN_NUMBERS, chimp.MAX_NUMBERS + 1):
+        page_source = await page.call(
+            None, "function() { return this.documentElement.outerHTML; }")
+        grid_parsed = asyncio.create_task(
+            asyncio.to_thread(parse_chimp_grid, page_source))
+        try:
+            await page.call(None, CHIMP_CLICK_FUNCTION, numbers)
+            grid = await grid_parsed
+        except Exception:
+            chimp.log("Error while clicking!")
+            return chimp.get_chimp_result(
+                grids, driver.clock() - start, ERROR)
+        chimp.log(f"{numbers} numbers done.")
+        for row in grid:
+            chimp.log(row)
+        islands = get_islands(grid)
+        chimp.log(f"Islands: {islands}")
+        grids.append(chimp.Grid(grid, islands))
+        if numbers == chimp.MAX_NUMBERS:
+            return chimp.get_chimp_result(
+                grids, driver.clock() - start, COMPLETE)
+        stop_reason = tracker.check(numbers)
+        if stop_reason is not None:
+            chimp.log(f"Budget used up ({stop_reason}).")
+            return chimp.get_chimp_result(
+                grids, driver.clock() - start, stop_reason)
+        clicked = await page.call(
+            None,
+            "function() { const button = [...this.querySelectorAll('button')]"
+            ".find(button => button.innerText === 'Continue');"
+            " if (!button) return false; button.click(); return true; }")
+        if not clicked:
+            chimp.log("Error while continuing!")
+            return chimp.get_chimp_result(
+                grids, driver.clock() - start, ERROR)
+
+
+# Tests ported to run natively on the event loop, by their method name.
+ASYNC_TESTS = {"chimp": async_chimp}
+
+
+def run_test(driver: Any, test_name: str) -> Any:
+    """Runs a test on any driver, natively if ported and possible."""
+    run_test, _ = simulation.SIMULATED_TESTS[test_name]
+    if isinstance(driver, DevToolsBenchmark) and test_name in ASYNC_TESTS:
+        return driver.run(ASYNC_TESTS[test_name](driver))
+    return run_test(driver)
+
+
+def compare(
+    test_names: list[str], runs: int, headless: bool
+) -> dict[str, dict[str, float]]:
+    """
+    Runs each test a number of times by Selenium and by DevTools,
+    returning the rounds per second of each by test name and path.
+    """
+    throughputs = {test_name: {} for test_name in test_names}
+    drivers = (
+        ("selenium", lambda: main.ComputerBenchmark(headless=headless)),
+        ("devtools", lambda: DevToolsBenchmark(headless=headless)))
+    for path, create_driver in drivers:
+        with create_driver() as driver, background_logging():
+            for test_name in test_names:
+                _, count_rounds = simulation.SIMULATED_TESTS[test_name]
+                rounds = 0
+                start = timer()
+                for _ in range(runs):
+                    rounds += count_rounds(run_test(driver, test_name))
+                throughputs[test_name][path] = rounds / (timer() - start)
+    return throughputs
+
+
+def cli() -> None:
+    """Compares the throughput of each path from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "tests", nargs="*", default=list(simulation.SIMULATED_TESTS),
+        help=(
+            "tests to compare (default all): "
+            f"{', '.join(simulation.SIMULATED_TESTS)}"))
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+    for test_name in args.tests:
+        if test_name not in simulation.SIMULATED_TESTS:
+            parser.error(f"unknown test: {test_name}")
+    throughputs = compare(args.tests, args.runs, args.headless)
+    for test_name, rates in throughputs.items():
+        mode = "async" if test_name in ASYNC_TESTS else "adapter"
+        speedup = (
+            f"{round(rates['devtools'] / rates['selenium'], 2)}x"
+            if rates["selenium"] else "-")
+        print(
+            f"{test_name} - Selenium {round(rates['selenium'], 2)} rounds/s, "
+            f"DevTools ({mode}) {round(rates['devtools'], 2)} rounds/s "
+            f"({speedup})")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,205 @@
+"""
+Performance regression gate. A baseline stores the distribution of the
+headline metrics of each test over a number of runs. Comparing runs the
+tests again, testing each metric for having got worse than the baseline
+with a one-sided Mann-Whitney U test, exiting with an error if so.
+"""
+import argparse
+import json
+import math
+import pathlib
+import statistics
+import sys
+from collections import namedtuple
+from typing import Any
+
+import main
+import simulation
+from utils import DATA_FOLDER, logging_disabled
+
+
+BASELINE_FILE = DATA_FOLDER / "baseline.json"
+DEFAULT_RUNS = 10
+# Significance level below which a metric is considered to have regressed.
+DEFAULT_ALPHA = 0.05
+
+
+# Gets the metric from a test result, None if not applicable (e.g. failed).
+Metric = namedtuple("Metric", ("name", "get", "higher_is_better"))
+Comparison = namedtuple(
+    "Comparison",
+    ("test_name", "metric", "baseline_median", "current_median",
+    "p_value", "regressed"))
+
+
+# Headline metrics of each test, by the name of the test method.
+METRICS = {
+    "reaction_time": (
+        Metric("mean_ms", lambda result: result.mean, False),),
+    "sequence": (Metric("score", lambda result: result.score, True),),
+    "chimp": (
+        Metric(
+            "squares_per_second",
+            lambda result: result.squares_per_second, True),),
+    "aim": (
+        Metric(
+            "ms_per_target", lambda result: result.ms_per_target or None,
+            False),),
+    "typing": (
+        Metric("words_per_min", lambda result: result.words_per_min, True),),
+    "verbal": (Metric("score", lambda result: result.score, True),),
+    "number": (Metric("score", lambda result: result.score, True),),
+    "visual": (Metric("score", lambda result: result.score, True),)
+}
+
+
+def mann_whitney_p_value(
+    baseline: list[float], current: list[float], higher_is_better: bool
+) -> float:
+    """
+    One-sided p-value of the current values being worse than the baseline
+    values, by the Mann-Whitney U test (normal approximation, corrected
+    for ties and continuity).
+    """
+    n1 = len(current)
+    n2 = len(baseline)
+    if not n1 or not n2:
+        return 1
+    values = sorted(
+        [(value, 0) for value in current] + [(value, 1) for value in baseline])
+    # Ranks from 1, tied values sharing the mean of their ranks.
+    current_rank_sum = 0
+    tie_term = 0
+    i = 0
+    while i < len(values):
+        j = i
+        while j < len(values) and values[j][0] == values[i][0]:
+            j += 1
+        rank = (i + 1 + j) / 2
+        current_rank_sum += rank * sum(
+            1 for _, group in values[i:j] if group == 0)
+        tie_term += (j - i) ** 3 - (j - i)
+        i = j
+    n = n1 + n2
+    u = current_rank_sum - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1
+    normal = statistics.NormalDist()
+    if higher_is_better:
+        # Worse means the current values tend to be lower.
+        return normal.cdf((u + 0.5 - mean) / math.sqrt(variance))
+    return 1 - normal.cdf((u - 0.5 - mean) / math.sqrt(variance))
+
+
+def run_tests(
+    test_names: list[str], runs: int, simulate: bool
+) -> dict[str, dict[str, list[float]]]:
+    """
+    Runs each test a number of times, returning the values of each
+    metric by test and metric name.
+    """
+    values = {
+        test_name: {metric.name: [] for metric in METRICS[test_name]}
+        for test_name in test_names}
+
+    def record(test_name: str, result: Any) -> None:
+        for metric in METRICS[test_name]:
+            value = metric.get(result)
+            if value is not None:
+                values[test_name][metric.name].append(value)
+
+    if simulate:
+        with logging_disabled():
+            for test_name in test_names:
+                run_test = simulation.SIMULATED_TESTS[test_name][0]
+                for seed in range(runs):
+                    with simulation.SimulatedBenchmark(seed) as driver:
+                        record(test_name, run_test(driver))
+        return values
+    with main.ComputerBenchmark(headless=True) as driver:
+        for test_name in test_names:
+            for _ in range(runs):
+                record(test_name, getattr(driver, test_name)())
+    return values
+
+
+def compare(
+    baseline: dict[str, dict[str, list[float]]],
+    current: dict[str, dict[str, list[float]]], alpha: float
+) -> list[Comparison]:
+    """Compares each metric of the current runs against the baseline."""
+    comparisons = []
+    for test_name, metric_values in current.items():
+        for metric in METRICS[test_name]:
+            baseline_values = baseline.get(test_name, {}).get(metric.name)
+            if not baseline_values:
+                continue
+            current_values = metric_values[metric.name]
+            p_value = mann_whitney_p_value(
+                baseline_values, current_values, metric.higher_is_better)
+            comparisons.append(Comparison(
+                test_name, metric.name, statistics.median(baseline_values),
+                statistics.median(current_values) if current_values else None,
+                p_value, p_value < alpha or not current_values))
+    return comparisons
+
+
+def output_comparisons(comparisons: list[Comparison]) -> None:
+    """Outputs the comparisons as a table."""
+    headings = ("Test", "Metric", "Baseline", "Current", "p", "Result")
+    rows = [headings] + [
+        (comparison.test_name, comparison.metric,
+            f"{comparison.baseline_median:.4g}",
+            "-" if comparison.current_median is None
+            else f"{comparison.current_median:.4g}",
+            f"{comparison.p_value:.3f}",
+            "REGRESS" if comparison.regressed else "PASS")
+        for comparison in comparisons]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(headings))]
+    for row in rows:
+        print("  ".join(
+            cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def cli() -> None:
+    """Captures a baseline or compares against it from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("mode", choices=("capture", "compare"))
+    parser.add_argument(
+        "tests", nargs="*", default=list(METRICS),
+        help=f"tests to run (default all): {', '.join(METRICS)}")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--baseline", type=pathlib.Path, default=BASELINE_FILE)
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA)
+    parser.add_argument(
+        "--simulate", action="store_true",
+        help="run the simulated tests instead of the browser")
+    args = parser.parse_args()
+    for test_name in args.tests:
+        if test_name not in METRICS:
+            parser.error(f"unknown test: {test_name}")
+    if args.mode == "compare" and not args.baseline.is_file():
+        parser.error(f"No baseline at {args.baseline}, capture one first.")
+    values = run_tests(args.tests, args.runs, args.simulate)
+    if args.mode == "capture":
+        baseline = {}
+        if args.baseline.is_file():
+            baseline = json.loads(args.baseline.read_text("utf8"))
+        # Captured tests replace their previous baseline only.
+        baseline.update(values)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=4), "utf8")
+        print(f"Baseline of {', '.join(args.tests)} saved to {args.baseline}")
+        return
+    baseline = json.loads(args.baseline.read_text("utf8"))
+    comparisons = compare(baseline, values, args.alpha)
+    output_comparisons(comparisons)
+    if any(comparison.regressed for comparison in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
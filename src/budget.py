@@ -0,0 +1,110 @@
+"""
+Run budgets, bounding how long the tests run deterministically rather
+than stopping them at random. A test stops at whichever of its target
+(score or level), wall-clock limit, WebDriver command count or memory
+ceiling is reached first, recording why in its result. Failing at
+random remains available as an optional policy.
+"""
+import random
+from collections import namedtuple
+from typing import Any
+
+try:
+    import psutil
+except ImportError:
+    # Only needed for memory ceilings.
+    psutil = None
+
+
+# Reasons for a test stopping, recorded in its result.
+TARGET = "target"
+TIME = "time"
+COMMANDS = "commands"
+MEMORY = "memory"
+RANDOM_FAILURE = "random failure"
+# The test ended by itself.
+COMPLETE = "complete"
+GAME_OVER = "game over"
+ERROR = "error"
+# Minimum seconds between memory checks, since measuring the memory of
+# the browser processes takes longer than a round of some tests.
+MEMORY_CHECK_INTERVAL = 1
+
+
+# Each limit is None for no limit. Seconds are by the driver clock, and
+# memory is the resident set size of the program and the browser.
+Budget = namedtuple(
+    "Budget",
+    ("target", "seconds", "commands", "rss_bytes", "random_failure"),
+    defaults=(None, None, None, None, False))
+
+
+def get_rss_bytes() -> int:
+    """
+    Resident set size of this process and all its descendants
+    (the driver and the browser processes).
+    """
+    process = psutil.Process()
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            # Browser processes come and go.
+            pass
+    return total
+
+
+def get_command_count(driver: Any) -> int | None:
+    """
+    WebDriver commands sent since the test was loaded,
+    None if the driver does not count its commands.
+    """
+    metrics = getattr(
+        getattr(driver, "command_executor", None), "metrics", None)
+    if metrics is None:
+        return None
+    return sum(metrics.counts.values())
+
+
+class BudgetTracker:
+    """
+    Tracks a running test against its budget, on any driver
+    (including the simulated and replaying ones).
+    """
+
+    def __init__(self, driver: Any, budget: Budget) -> None:
+        if budget.rss_bytes is not None and psutil is None:
+            raise RuntimeError("psutil is required for a memory ceiling.")
+        self.driver = driver
+        self.budget = budget
+        self.start = driver.clock()
+        self.last_memory_check = None
+
+    def check(self, score: int) -> str | None:
+        """
+        Returns the reason to stop at a given score or level,
+        None if the budget is not yet used up.
+        """
+        budget = self.budget
+        if budget.target is not None and score >= budget.target:
+            return TARGET
+        now = self.driver.clock()
+        if budget.seconds is not None and now - self.start >= budget.seconds:
+            return TIME
+        if budget.commands is not None:
+            commands = get_command_count(self.driver)
+            if commands is not None and commands >= budget.commands:
+                return COMMANDS
+        if budget.rss_bytes is not None and (
+            self.last_memory_check is None
+            or now - self.last_memory_check >= MEMORY_CHECK_INTERVAL
+        ):
+            self.last_memory_check = now
+            if get_rss_bytes() >= budget.rss_bytes:
+                return MEMORY
+        return None
+
+    def random_failure(self, failure_rate: float) -> bool:
+        """Whether to fail at random now, if the policy is enabled."""
+        return self.budget.random_failure and random.random() < failure_rate
@@ -7,13 +7,14 @@ Of course, the computer will win on this test!
 The computer is beyond a chimpanzee or human. RIP!
 """
 from collections import namedtuple
-from timeit import default_timer as timer
 
 import lxml
 from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 
 import main
+from budget import COMPLETE, ERROR, Budget, BudgetTracker
+from metrics import TestProgress
 from utils import DATA_FOLDER, get_log_function, get_islands, log_date_time
 
 
@@ -21,35 +22,49 @@ from utils import DATA_FOLDER, get_log_function, get_islands, log_date_time
 # by the final number count for the last level.
 MIN_NUMBERS = 4
 MAX_NUMBERS = 40
+# No limits by default, the test always ending at the maximum numbers.
+BUDGET = Budget()
 LOG = DATA_FOLDER / "chimp.txt"
 
 
 ChimpResult = namedtuple(
     "ChimpResult",
-    ("numbers", "grids", "seconds", "squares", "squares_per_second")
+    ("numbers", "grids", "seconds", "squares", "squares_per_second",
+    "stop_reason"),
+    defaults=(None,)
 )
 Grid = namedtuple("Grid", ("grid", "islands"))
 log = get_log_function(LOG)
 
 
-def get_chimp_result(grids: list[Grid], time_taken: float) -> ChimpResult:
+def get_chimp_result(
+    grids: list[Grid], time_taken: float, stop_reason: str | None = None
+) -> ChimpResult:
     """Generates the chimp test result."""
     if not grids:
-        return ChimpResult(0, [], time_taken, 0, 0)
+        return ChimpResult(0, [], time_taken, 0, 0, stop_reason)
     numbers = len(grids) + MIN_NUMBERS - 1
     squares = (
         (numbers * (numbers + 1)) // 2
         - ((MIN_NUMBERS - 1) * MIN_NUMBERS) // 2)
     squares_per_second = squares / time_taken
-    return ChimpResult(numbers, grids, time_taken, squares, squares_per_second)
+    return ChimpResult(
+        numbers, grids, time_taken, squares, squares_per_second, stop_reason)
 
 
-def chimp(driver: "main.ComputerBenchmark") -> ChimpResult:
-    """Performs the chimp test and returns the result."""
+def chimp(
+    driver: "main.ComputerBenchmark", budget: Budget | None = None
+) -> ChimpResult:
+    """
+    Performs the chimp test and returns the result,
+    stopping early if the budget (by default BUDGET) is used up.
+    """
     log_date_time(log, "Chimp test started at {} UTC.")
     driver.get_test("chimp")
+    tracker = BudgetTracker(driver, BUDGET if budget is None else budget)
+    progress = TestProgress(driver, "chimp")
     driver.click_start("Start Test")
-    start = timer()
+    start = driver.clock()
     grids = []
     for numbers in range(MIN_NUMBERS, MAX_NUMBERS + 1):
         try:
@@ -60,28 +75,41 @@ def chimp(driver: "main.ComputerBenchmark") -> ChimpResult:
                 for row in soup.find_all(class_="css-k008qs")]
         except Exception:
             log("Error while identifying grid!")
-            return get_chimp_result(grids, timer() - start)
-        for number in range(1, numbers + 1):
-            try:
-                square = driver.find_element(
+            progress.error()
+            return get_chimp_result(grids, driver.clock() - start, ERROR)
+        try:
+            # The squares do not depend on each other, so can all be
+            # found at once, but must still be clicked in order.
+            squares = driver.pipeline([
+                lambda number=number: driver.find_element(
                     By.XPATH, f"//div[@data-cellnumber='{number}']")
+                for number in range(1, numbers + 1)])
+            for square in squares:
                 # Performs a JavaScript click since it works.
                 # This makes the test very reliable and fast.
                 driver.execute_script("arguments[0].click();", square)
-            except Exception:
-                log("Error while clicking!")
-                return get_chimp_result(grids, timer() - start)
+        except Exception:
+            log("Error while clicking!")
+            progress.error()
+            return get_chimp_result(grids, driver.clock() - start, ERROR)
         log(f"{numbers} numbers done.")
         for row in grid:
             log(row)
         islands = get_islands(grid)
         log(f"Islands: {islands}")
         grids.append(Grid(grid, islands))
+        progress.round(numbers)
         if numbers == MAX_NUMBERS:
-            return get_chimp_result(grids, timer() - start)
+            return get_chimp_result(grids, driver.clock() - start, COMPLETE)
+        stop_reason = tracker.check(numbers)
+        if stop_reason is not None:
+            log(f"Budget used up ({stop_reason}).")
+            return get_chimp_result(
+                grids, driver.clock() - start, stop_reason)
         try:
             driver.find_element(
                 By.XPATH, "//button[text()='Continue']").click()
         except Exception:
             log("Error while continuing!")
-            return get_chimp_result(grids, timer() - start)
+            progress.error()
+            return get_chimp_result(grids, driver.clock() - start, ERROR)
@@ -0,0 +1,399 @@
+"""
+Minimal asyncio client of the Chrome DevTools protocol, talking to a
+locally launched Chrome over its websocket directly, needing nothing
+but Chrome itself. Commands are sent without waiting for the previous
+response, so independent commands are in flight at the same time.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import tempfile
+from typing import Any, Callable
+from urllib.parse import urlparse
+
+
+# Appended to the websocket key by the server to prove the handshake.
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B85"
+# Websocket frame opcodes.
+CONTINUATION = 0x0
+TEXT = 0x1
+BINARY = 0x2
+CLOSE = 0x8
+PING = 0x9
+PONG = 0xA
+# Chrome executables searched for, by name on the PATH, then by path.
+CHROME_NAMES = (
+    "google-chrome", "google-chrome-stable", "chromium", "chromium-browser",
+    "chrome")
+CHROME_PATHS = (
+    r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome")
+# Seconds to wait for Chrome to start listening for DevTools connections.
+LAUNCH_TIMEOUT = 20
+# Remote objects are grouped, so they can be released at once.
+OBJECT_GROUP = "benchmark"
+
+
+class DevToolsError(Exception):
+    """A DevTools command failed, or the connection was lost."""
+    pass
+
+
+def apply_mask(payload: bytes, mask: bytes) -> bytes:
+    """Masks (or unmasks) a payload, all at once as one big integer."""
+    length = len(payload)
+    repeated_mask = (mask * (length // 4 + 1))[:length]
+    return (
+        int.from_bytes(payload, "big") ^ int.from_bytes(repeated_mask, "big")
+    ).to_bytes(length, "big")
+
+
+class WebSocket:
+    """Client side of a websocket connection (RFC 6455), text only."""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url: str) -> "WebSocket":
+        """Opens a websocket connection to a ws:// URL."""
+        parsed_url = urlparse(url)
+        reader, writer = await asyncio.open_connection(
+            parsed_url.hostname, parsed_url.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f"GET {parsed_url.path} HTTP/1.1\r\n"
+            f"Host: {parsed_url.hostname}:{parsed_url.port}\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        await writer.drain()
+        status, *header_lines = (
+            (await reader.readuntil(b"\r\n\r\n")).decode().split("\r\n"))
+        headers = {
+            name.strip().lower(): value.strip()
+            for name, _, value in (
+                line.partition(":") for line in header_lines)}
+        accept = base64.b64encode(
+            hashlib.sha1(f"{key}{WEBSOCKET_GUID}".encode()).digest()).decode()
+        if " 101 " not in status or headers.get(
+            "sec-websocket-accept") != accept:
+            writer.close()
+            raise DevToolsError(f"Websocket handshake failed: {status}")
+        return cls(reader, writer)
+
+    def send_frame(self, opcode: int, payload: bytes) -> None:
+        """Writes a single masked frame, as clients must."""
+        length = len(payload)
+        header = bytearray([0x80 | opcode])
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 2 ** 16:
+            header.append(0x80 | 126)
+            header.extend(length.to_bytes(2, "big"))
+        else:
+            header.append(0x80 | 127)
+            header.extend(length.to_bytes(8, "big"))
+        mask = os.urandom(4)
+        self.writer.write(bytes(header) + mask + apply_mask(payload, mask))
+
+    async def send(self, text: str) -> None:
+        """Sends a text message."""
+        self.send_frame(TEXT, text.encode())
+        await self.writer.drain()
+
+    async def receive(self) -> str:
+        """Receives the next text message, answering any pings."""
+        fragments = []
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length in (126, 127):
+                length = int.from_bytes(
+                    await self.reader.readexactly(
+                        2 if length == 126 else 8), "big")
+            mask = await self.reader.readexactly(4) if second & 0x80 else None
+            payload = await self.reader.readexactly(length)
+            if mask is not None:
+                payload = apply_mask(payload, mask)
+            if opcode == PING:
+                self.send_frame(PONG, payload)
+                continue
+            if opcode == PONG:
+                continue
+            if opcode == CLOSE:
+                raise ConnectionError("Websocket closed by Chrome.")
+            fragments.append(payload)
+            if first & 0x80:
+                return b"".join(fragments).decode()
+
+    async def close(self) -> None:
+        """Closes the connection."""
+        if not self.writer.is_closing():
+            self.send_frame(CLOSE, b"")
+            self.writer.close()
+
+
+class DevToolsConnection:
+    """DevTools protocol messages over a websocket, matched by ID."""
+
+    def __init__(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        self.next_id = 0
+        self.pending: dict[int, asyncio.Future] = {}
+        self.listeners: dict[str, list[Callable]] = {}
+        self.reader = asyncio.create_task(self.read_messages())
+
+    async def read_messages(self) -> None:
+        """Resolves responses and dispatches events as they arrive."""
+        try:
+            while True:
+                message = json.loads(await self.websocket.receive())
+                if "id" in message:
+                    future = self.pending.pop(message["id"], None)
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        future.set_exception(
+                            DevToolsError(message["error"].get("message")))
+                    else:
+                        future.set_result(message.get("result", {}))
+                    continue
+                for listener in self.listeners.get(message.get("method"), []):
+                    listener(
+                        message.get("params", {}), message.get("sessionId"))
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(DevToolsError(str(error)))
+            self.pending.clear()
+
+    async def send(
+        self, method: str, params: dict = None, session_id: str = None
+    ) -> dict:
+        """Sends a command, returning its result once it arrives."""
+        self.next_id += 1
+        message = {
+            "id": self.next_id, "method": method, "params": params or {}}
+        if session_id is not None:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.next_id] = future
+        await self.websocket.send(json.dumps(message))
+        return await future
+
+    def on(self, method: str, listener: Callable) -> None:
+        """Calls a listener with the parameters of each event of a type."""
+        self.listeners.setdefault(method, []).append(listener)
+
+    def off(self, method: str, listener: Callable) -> None:
+        """Stops calling a listener."""
+        self.listeners[method].remove(listener)
+
+    def expect(self, method: str, session_id: str = None) -> asyncio.Future:
+        """Returns a future resolved by the next event of a type."""
+        future = asyncio.get_running_loop().create_future()
+
+        def listener(params: dict, event_session_id: str | None) -> None:
+            if event_session_id == session_id and not future.done():
+                future.set_result(params)
+                self.off(method, listener)
+
+        self.on(method, listener)
+        return future
+
+    async def close(self) -> None:
+        """Closes the connection."""
+        self.reader.cancel()
+        await self.websocket.close()
+
+
+def find_chrome() -> str:
+    """Returns the path of the Chrome executable."""
+    if "CHROME_PATH" in os.environ:
+        return os.environ["CHROME_PATH"]
+    for name in CHROME_NAMES:
+        path = shutil.which(name)
+        if path is not None:
+            return path
+    for path in CHROME_PATHS:
+        if os.path.isfile(path):
+            return path
+    raise DevToolsError("Chrome not found, set CHROME_PATH to its location.")
+
+
+class DevToolsPage:
+    """A tab of a Chrome instance launched for DevTools access only."""
+
+    def __init__(
+        self, process: subprocess.Popen, profile: pathlib.Path,
+        connection: DevToolsConnection, session_id: str
+    ) -> None:
+        self.process = process
+        self.profile = profile
+        self.connection = connection
+        self.session_id = session_id
+        # Remote object of the document, replaced on each navigation.
+        self.document = None
+
+    @classmethod
+    async def launch(cls, headless: bool = False) -> "DevToolsPage":
+        """Launches Chrome and attaches to its first tab."""
+        profile = pathlib.Path(tempfile.mkdtemp(prefix="benchmark-chrome-"))
+        arguments = [
+            find_chrome(), "--remote-debugging-port=0",
+            f"--user-data-dir={profile}", "--no-first-run",
+            "--no-default-browser-check", "--start-maximized",
+            "--window-size=1920,1080"]
+        if headless:
+            arguments.append("--headless=new")
+        arguments.append("about:blank")
+        process = subprocess.Popen(
+            arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Chrome writes the port and browser path once listening.
+        port_file = profile / "DevToolsActivePort"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LAUNCH_TIMEOUT
+        while not port_file.is_file() or len(
+            port_file.read_text().splitlines()) < 2:
+            if loop.time() > deadline or process.poll() is not None:
+                process.kill()
+                raise DevToolsError("Chrome failed to start.")
+            await asyncio.sleep(0.05)
+        port, path = port_file.read_text().splitlines()[:2]
+        websocket = await WebSocket.connect(f"ws://127.0.0.1:{port}{path}")
+        connection = DevToolsConnection(websocket)
+        targets = await connection.send("Target.getTargets")
+        target_id = next(
+            target["targetId"] for target in targets["targetInfos"]
+            if target["type"] == "page")
+        attached = await connection.send(
+            "Target.attachToTarget", {"targetId": target_id, "flatten": True})
+        page = cls(process, profile, connection, attached["sessionId"])
+        await page.send("Page.enable")
+        return page
+
+    async def send(self, method: str, params: dict = None) -> dict:
+        """Sends a command to the tab."""
+        return await self.connection.send(method, params, self.session_id)
+
+    async def navigate(self, url: str, eager: bool = False) -> None:
+        """Loads a URL, until loaded or until the DOM is ready if eager."""
+        loaded = self.connection.expect(
+            "Page.domContentEventFired" if eager else "Page.loadEventFired",
+            self.session_id)
+        await self.send("Page.navigate", {"url": url})
+        await loaded
+        await self.send(
+            "Runtime.releaseObjectGroup", {"objectGroup": OBJECT_GROUP})
+        self.document = None
+
+    async def get_document(self) -> str:
+        """Returns the remote object ID of the current document."""
+        if self.document is None:
+            result = await self.send(
+                "Runtime.evaluate",
+                {"expression": "document", "objectGroup": OBJECT_GROUP})
+            self.document = result["result"]["objectId"]
+        return self.document
+
+    async def call(
+        self, object_id: str | None, declaration: str, *args: Any,
+        by_value: bool = True
+    ) -> Any:
+        """
+        Calls a JavaScript function with a remote object (by default the
+        document) as this, returning the value or a remote object ID.
+        Arguments which are remote objects are passed as {"objectId": id}.
+        """
+        arguments = [
+            arg if isinstance(arg, dict) and "objectId" in arg
+            else {"value": arg} for arg in args]
+        for attempt in range(2):
+            try:
+                result = await self.send("Runtime.callFunctionOn", {
+                    "objectId": object_id or await self.get_document(),
+                    "functionDeclaration": declaration,
+                    "arguments": arguments, "returnByValue": by_value,
+                    "awaitPromise": True, "objectGroup": OBJECT_GROUP})
+                break
+            except DevToolsError:
+                # The document may have been replaced, such as by a reload.
+                if object_id is not None or attempt:
+                    raise
+                self.document = None
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise DevToolsError(
+                details.get("exception", {}).get("description")
+                or details.get("text"))
+        if by_value:
+            return result["result"].get("value")
+        return result["result"].get("objectId")
+
+    async def array_items(self, object_id: str) -> list[str]:
+        """Returns the remote object IDs of the items of a remote array."""
+        properties = await self.send(
+            "Runtime.getProperties",
+            {"objectId": object_id, "ownProperties": True})
+        items = [
+            (int(item["name"]), item["value"]["objectId"])
+            for item in properties["result"]
+            if item["name"].isdigit() and "objectId" in item.get("value", {})]
+        return [object_id for _, object_id in sorted(items)]
+
+    async def click_at(self, x: float, y: float) -> None:
+        """Clicks at a point of the viewport with trusted mouse events."""
+        await asyncio.gather(*(
+            self.send("Input.dispatchMouseEvent", {
+                "type": event_type, "x": x, "y": y, "button": "left",
+                "clickCount": 1})
+            for event_type in ("mousePressed", "mouseReleased")))
+
+    async def press_key(
+        self, key: str, code: str, key_code: int, text: str = None
+    ) -> None:
+        """Presses and releases a key with trusted keyboard events."""
+        down = {
+            "type": "keyDown", "key": key, "code": code,
+            "windowsVirtualKeyCode": key_code}
+        if text is not None:
+            down.update(text=text, unmodifiedText=text)
+        await asyncio.gather(
+            self.send("Input.dispatchKeyEvent", down),
+            self.send("Input.dispatchKeyEvent", {
+                "type": "keyUp", "key": key, "code": code,
+                "windowsVirtualKeyCode": key_code}))
+
+    async def type_text(self, text: str) -> None:
+        """
+        Types text a character at a time with trusted keyboard events,
+        all sent at once since they are processed in order anyway.
+        """
+        await asyncio.gather(*(
+            self.send("Input.dispatchKeyEvent", {
+                "type": event_type, "key": character,
+                **({"text": character, "unmodifiedText": character}
+                    if event_type == "keyDown" else {})})
+            for character in text for event_type in ("keyDown", "keyUp")))
+
+    async def close(self) -> None:
+        """Closes Chrome, removing its temporary profile."""
+        try:
+            await asyncio.wait_for(self.connection.send("Browser.close"), 5)
+        except (DevToolsError, asyncio.TimeoutError):
+            self.process.kill()
+        await self.connection.close()
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.process.wait)
+        shutil.rmtree(self.profile, ignore_errors=True)
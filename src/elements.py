@@ -0,0 +1,87 @@
+"""
+Cache of element handles found on the current page. The tests look up
+the same elements again and again, each lookup being a round trip to
+the browser, whereas the handles usually remain valid until the page
+changes. Handles are only found again once navigated away (a new page
+generation) or once used and found to be stale.
+"""
+from typing import Any, Callable
+
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver.remote.webelement import WebElement
+
+import main
+
+
+class ElementCache:
+    """Element handles by locator, for the current page generation."""
+
+    def __init__(self) -> None:
+        # Incremented whenever the page changes, invalidating all handles.
+        self.generation = 0
+        self.elements: dict[tuple, tuple[int, Any]] = {}
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Clears the statistics, such as before starting a new test."""
+        self.hits = 0
+        self.misses = 0
+        # Cached handles which turned out to be stale when used.
+        self.stale = 0
+
+    def invalidate(self) -> None:
+        """Invalidates all handles, such as after navigating."""
+        self.generation += 1
+
+    def find(
+        self, driver: "main.ComputerBenchmark", locator: tuple[str, str],
+        many: bool = False
+    ) -> WebElement | list[WebElement]:
+        """
+        Returns the cached element (or elements) for a locator,
+        finding it if not cached for the current page generation.
+        """
+        key = (*locator, many)
+        generation, elements = self.elements.get(key, (None, None))
+        if generation == self.generation:
+            self.hits += 1
+            return elements
+        self.misses += 1
+        if many:
+            elements = driver.find_elements(*locator)
+        else:
+            elements = driver.find_element(*locator)
+        # Nothing found may just mean not found yet, so is not cached.
+        if elements:
+            self.elements[key] = (self.generation, elements)
+        return elements
+
+    def use(
+        self, driver: "main.ComputerBenchmark", locator: tuple[str, str],
+        use: Callable[[WebElement | list[WebElement]], Any],
+        many: bool = False
+    ) -> Any:
+        """
+        Calls a function with the cached element (or elements) for a
+        locator, finding it again and retrying once if it is stale.
+        """
+        try:
+            return use(self.find(driver, locator, many))
+        except StaleElementReferenceException:
+            self.stale += 1
+            self.elements.pop((*locator, many), None)
+            return use(self.find(driver, locator, many))
+
+    @property
+    def round_trips_saved(self) -> int:
+        """Lookups avoided, less the failed commands on stale handles."""
+        return self.hits - self.stale
+
+    def summary(self) -> str:
+        """Hit rate and round trips saved as text."""
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0
+        return (
+            f"Element cache: {self.hits}/{lookups} hits "
+            f"({round(hit_rate, 1)}%), {self.stale} stale, "
+            f"{self.round_trips_saved} round trips saved")
@@ -0,0 +1,449 @@
+"""
+Work distribution across hosts sharing a filesystem. Jobs (a test, a
+number of repetitions and a budget) are submitted to a queue in a
+shared SQLite database. Worker processes on each host claim a job at a
+time under a lease, which a heartbeat keeps renewing whilst the tests
+run on the worker's own headless browser, then write the results back.
+A lease left to expire by a crashed worker or host is claimed again,
+up to a maximum number of attempts. Hosts are assumed to have their
+clocks synchronised.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import closing, suppress
+from typing import Any
+
+from selenium.common.exceptions import WebDriverException
+
+import main
+import profiles
+import simulation
+import stalls
+import watchdog
+from baseline import METRICS
+from budget import Budget
+from utils import logging_disabled
+
+
+# Seconds a claimed job is leased for without a heartbeat.
+LEASE_SECONDS = 60
+# Heartbeats renew the lease several times per lease.
+HEARTBEATS_PER_LEASE = 3
+# Attempts at a job before it is marked as failed.
+MAX_ATTEMPTS = 3
+# Seconds between claim attempts whilst other workers hold every job.
+POLL_INTERVAL = 1
+# Seconds to wait on another process holding the database lock.
+LOCK_TIMEOUT = 30
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+# No WAL, which needs shared memory that network filesystems lack.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    test_name TEXT NOT NULL,
+    repetitions INTEGER NOT NULL,
+    budget TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    results TEXT,
+    error TEXT,
+    submitted REAL NOT NULL,
+    finished REAL
+)
+"""
+
+
+# Budget is None for the default budget of the test.
+Job = namedtuple(
+    "Job", ("id", "test_name", "repetitions", "budget", "attempts"))
+# Headline metric (None if the run failed) and stop reason of each run.
+RunResult = namedtuple("RunResult", ("value", "stop_reason", "seconds"))
+
+
+class JobQueue:
+    """Queue of jobs in an SQLite database, leased out to workers."""
+
+    def __init__(
+        self, path: pathlib.Path, lease_seconds: float = LEASE_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS
+    ) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self.connect()) as connection:
+            connection.execute(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection in autocommit mode, transactions being begun
+        explicitly. Each call opens its own, so threads never share one.
+        """
+        return sqlite3.connect(
+            self.path, timeout=LOCK_TIMEOUT, isolation_level=None)
+
+    def submit(
+        self, test_name: str, repetitions: int, budget: Budget | None = None
+    ) -> int:
+        """Adds a job to the queue, returning its ID."""
+        with closing(self.connect()) as connection:
+            return connection.execute(
+                "INSERT INTO jobs (test_name, repetitions, budget, submitted) "
+                "VALUES (?, ?, ?, ?)",
+                (test_name, repetitions,
+                    None if budget is None else json.dumps(budget._asdict()),
+                    time.time())).lastrowid
+
+    def claim(self, worker: str) -> Job | None:
+        """
+        Leases the oldest pending job (or job with an expired lease)
+        to a worker, None if there is none to claim right now.
+        """
+        now = time.time()
+        with closing(self.connect()) as connection:
+            # Taking the write lock first, so no two workers claim a job.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired jobs out of attempts will never be claimed.
+                connection.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished = ? "
+                    "WHERE status = ? AND lease_expires < ? "
+                    "AND attempts >= ?",
+                    (FAILED, "lease expired", now, LEASED, now,
+                        self.max_attempts))
+                row = connection.execute(
+                    "SELECT id, test_name, repetitions, budget, attempts "
+                    "FROM jobs WHERE status = ? "
+                    "OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY id LIMIT 1", (PENDING, LEASED, now)).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, "
+                        "lease_expires = ?, attempts = attempts + 1 "
+                        "WHERE id = ?",
+                        (LEASED, worker, now + self.lease_seconds, row[0]))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, test_name, repetitions, budget, attempts = row
+        if budget is not None:
+            budget = Budget(**json.loads(budget))
+        return Job(job_id, test_name, repetitions, budget, attempts + 1)
+
+    def update_leased(
+        self, job_id: int, worker: str, assignments: str, values: tuple
+    ) -> bool:
+        """
+        Updates a job only if still leased to the worker,
+        returning whether it was.
+        """
+        with closing(self.connect()) as connection:
+            return connection.execute(
+                f"UPDATE jobs SET {assignments} "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (*values, job_id, worker, LEASED)).rowcount == 1
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """Renews the lease of a job, returning False if it was lost."""
+        return self.update_leased(
+            job_id, worker, "lease_expires = ?",
+            (time.time() + self.lease_seconds,))
+
+    def complete(
+        self, job_id: int, worker: str, results: list[RunResult]
+    ) -> bool:
+        """Stores the results of a job, returning False if it was lost."""
+        return self.update_leased(
+            job_id, worker, "status = ?, results = ?, finished = ?",
+            (DONE, json.dumps([result._asdict() for result in results]),
+                time.time()))
+
+    def fail(self, job: Job, worker: str, error: str) -> bool:
+        """
+        Returns a job to the queue after an error, or marks it as failed
+        once out of attempts. Returns False if the lease was lost.
+        """
+        if job.attempts >= self.max_attempts:
+            return self.update_leased(
+                job.id, worker, "status = ?, error = ?, finished = ?",
+                (FAILED, error, time.time()))
+        return self.update_leased(
+            job.id, worker, "status = ?, error = ?, lease_expires = NULL",
+            (PENDING, error))
+
+    def counts(self) -> dict[str, int]:
+        """Number of jobs by status."""
+        with closing(self.connect()) as connection:
+            return dict(connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def is_drained(self) -> bool:
+        """Whether no job is pending or leased."""
+        counts = self.counts()
+        return not counts.get(PENDING) and not counts.get(LEASED)
+
+    def results(self) -> list[tuple]:
+        """ID, test, status, worker, results and error of every job."""
+        with closing(self.connect()) as connection:
+            return [
+                (job_id, test_name, status, worker,
+                    None if results is None else [
+                        RunResult(**result) for result in json.loads(results)],
+                    error)
+                for job_id, test_name, status, worker, results, error
+                in connection.execute(
+                    "SELECT id, test_name, status, worker, results, error "
+                    "FROM jobs ORDER BY id")]
+
+
+class Heartbeat:
+    """Renews the lease of a job in the background whilst it runs."""
+
+    def __init__(self, queue: JobQueue, job: Job, worker: str) -> None:
+        self.queue = queue
+        self.job = job
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.lost = False
+        self.thread = threading.Thread(target=self.beat, daemon=True)
+
+    def __enter__(self) -> "Heartbeat":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def beat(self) -> None:
+        """Renews the lease several times per lease until stopped."""
+        interval = self.queue.lease_seconds / HEARTBEATS_PER_LEASE
+        while not self.stopped.wait(interval):
+            if not self.queue.heartbeat(self.job.id, self.worker):
+                # Another worker has the job now, so stop renewing it.
+                self.lost = True
+                return
+
+
+def run_job(driver: Any, job: Job, simulate: bool) -> list[RunResult]:
+    """Runs the repetitions of a job, returning the result of each."""
+    metric = METRICS[job.test_name][0]
+    if simulate:
+        test = simulation.SIMULATED_TESTS[job.test_name][0]
+        run_test = lambda *args: test(driver, *args)
+    else:
+        run_test = getattr(driver, job.test_name)
+    # The typing test is a single round, so takes no budget.
+    args = () if job.budget is None else (job.budget,)
+    results = []
+    for _ in range(job.repetitions):
+        start = driver.clock()
+        result = run_test(*args)
+        results.append(RunResult(
+            metric.get(result), getattr(result, "stop_reason", None),
+            driver.clock() - start))
+    return results
+
+
+def get_worker_name() -> str:
+    """Name of this worker, unique across hosts."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def start_driver(
+    worker: str, simulate: bool, headless: bool, template: bool
+) -> tuple[Any, pathlib.Path | None]:
+    """
+    Starts the driver of a worker, returning it and the clone of the
+    template profile it uses, if any.
+    """
+    if simulate:
+        return simulation.SimulatedBenchmark(os.getpid()), None
+    profile = profiles.clone_template(worker).path if template else None
+    driver = main.ComputerBenchmark(
+        headless=headless, profile=profile,
+        resource_thresholds=watchdog.Thresholds(),
+        stall_slo=stalls.DEFAULT_SLO)
+    return driver, profile
+
+
+def stop_driver(
+    driver: Any, profile: pathlib.Path | None, simulate: bool
+) -> None:
+    """Quits the driver of a worker, removing its profile clone."""
+    try:
+        if not simulate:
+            with suppress(WebDriverException):
+                driver.quit()
+    finally:
+        if profile is not None:
+            profiles.remove_clone(profile)
+
+
+def work(
+    path: pathlib.Path, simulate: bool = False, headless: bool = True,
+    lease_seconds: float = LEASE_SECONDS, template: bool = False
+) -> int:
+    """
+    Claims and runs jobs until none are pending or leased, on a browser
+    of its own (started on the first job), returning the jobs completed.
+    The browser starts on a clone of the template profile if chosen.
+    """
+    queue = JobQueue(path, lease_seconds)
+    worker = get_worker_name()
+    driver = None
+    profile = None
+    completed = 0
+    try:
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                if queue.is_drained():
+                    return completed
+                # Other workers hold the remaining jobs, which might yet
+                # expire and need claiming.
+                time.sleep(POLL_INTERVAL)
+                continue
+            if driver is None:
+                driver, profile = start_driver(
+                    worker, simulate, headless, template)
+            try:
+                with Heartbeat(queue, job, worker) as heartbeat:
+                    if simulate:
+                        # Simulated runs are kept out of the logs.
+                        with logging_disabled():
+                            results = run_job(driver, job, simulate)
+                    else:
+                        results = run_job(driver, job, simulate)
+            except Exception as e:
+                queue.fail(job, worker, f"{type(e).__name__}: {e}")
+                # The browser may have crashed or be left mid-test, so
+                # the next job starts on a new one.
+                stop_driver(driver, profile, simulate)
+                driver = profile = None
+                continue
+            if not heartbeat.lost and queue.complete(job.id, worker, results):
+                completed += 1
+    finally:
+        if driver is not None:
+            stop_driver(driver, profile, simulate)
+
+
+def report_work(results: multiprocessing.Queue, *args: Any) -> None:
+    """Runs a worker in its own process, reporting the jobs completed."""
+    results.put((os.getpid(), work(*args)))
+
+
+def output_results(queue: JobQueue) -> None:
+    """Outputs the status and results of every job."""
+    for job_id, test_name, status, worker, results, error in queue.results():
+        line = f"{job_id}. {test_name} - {status}"
+        if worker is not None:
+            line += f" ({worker})"
+        if results:
+            values = [
+                round(result.value, 2) for result in results
+                if result.value is not None]
+            line += f" - {values}"
+        if error is not None and status != DONE:
+            line += f" - {error}"
+        print(line)
+
+
+def cli() -> None:
+    """Submits jobs, runs workers or outputs results from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("queue", type=pathlib.Path, help="database file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    submit_parser = subparsers.add_parser("submit", help="add jobs")
+    submit_parser.add_argument("tests", nargs="+", help="tests to run")
+    submit_parser.add_argument(
+        "--repetitions", type=int, default=1, help="runs per job")
+    submit_parser.add_argument(
+        "--jobs", type=int, default=1, help="jobs per test")
+    submit_parser.add_argument("--target", type=int)
+    submit_parser.add_argument("--seconds", type=float)
+    submit_parser.add_argument("--commands", type=int)
+    work_parser = subparsers.add_parser(
+        "work", help="run worker processes until the queue is drained")
+    work_parser.add_argument("--workers", type=int, default=1)
+    work_parser.add_argument(
+        "--simulate", action="store_true",
+        help="run the simulated tests instead of the browser")
+    work_parser.add_argument("--windowed", action="store_true")
+    work_parser.add_argument(
+        "--lease-seconds", type=float, default=LEASE_SECONDS)
+    work_parser.add_argument(
+        "--template", action="store_true",
+        help="start each browser on a clone of the template profile")
+    subparsers.add_parser("status", help="output the results of every job")
+    args = parser.parse_args()
+    if args.command == "submit":
+        budget = None
+        if any(
+            limit is not None
+            for limit in (args.target, args.seconds, args.commands)
+        ):
+            budget = Budget(args.target, args.seconds, args.commands)
+        for test_name in args.tests:
+            if test_name not in METRICS:
+                parser.error(f"unknown test: {test_name}")
+            if test_name == "typing" and budget is not None:
+                parser.error("the typing test takes no budget")
+        queue = JobQueue(args.queue)
+        for test_name in args.tests:
+            for _ in range(args.jobs):
+                queue.submit(test_name, args.repetitions, budget)
+    elif args.command == "work":
+        if args.template and not args.simulate:
+            # Built once here, rather than by every worker at once.
+            profiles.ensure_template(headless=not args.windowed)
+        # Processes joined one by one rather than a pool, which would
+        # wait forever on a worker killed outright (such as by the OOM
+        # killer). The jobs of a dead worker are retried once their
+        # leases expire.
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=report_work, args=(
+                results, args.queue, args.simulate, not args.windowed,
+                args.lease_seconds, args.template))
+            for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        completed = dict(
+            results.get() for process in processes if process.exitcode == 0)
+        print(
+            "Jobs completed by each worker: "
+            f"{[completed.get(process.pid) for process in processes]}")
+        failed = [
+            process.exitcode for process in processes
+            if process.exitcode != 0]
+        if failed:
+            print(f"Workers exited abnormally with codes: {failed}")
+    else:
+        queue = JobQueue(args.queue)
+        output_results(queue)
+        print(", ".join(
+            f"{status}: {count}" for status, count in queue.counts().items()))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,109 @@
+"""
+Persistent lexicon of the verbal memory test. The site draws from one
+fixed word list, so every word ever seen is stored once in an SQLite
+table with its length, vowel and consonant counts precomputed, along
+with how many times it has been seen over all runs. The table is only
+loaded when first needed, then looked up in memory during play.
+Several processes may share the table, so SQLite assigns the ids.
+"""
+import heapq
+import pathlib
+import sqlite3
+from collections import namedtuple
+
+from utils import DATA_FOLDER
+
+
+VOWELS = set("aeiou")
+LEXICON_FILE = DATA_FOLDER / "lexicon.db"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS words (
+    id INTEGER PRIMARY KEY,
+    word TEXT UNIQUE NOT NULL,
+    length INTEGER NOT NULL,
+    vowels INTEGER NOT NULL,
+    consonants INTEGER NOT NULL,
+    frequency INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+Entry = namedtuple(
+    "Entry", ("id", "word", "length", "vowels", "consonants", "frequency"))
+
+
+def count_vowels(word: str) -> int:
+    """Returns the number of vowels (aeiou) in a word."""
+    return sum(char in VOWELS for char in word)
+
+
+def count_consonants(word: str) -> int:
+    """Returns the number of consonants in a word."""
+    return sum(char.isalpha() and char not in VOWELS for char in word)
+
+
+class Lexicon:
+    """Every word seen, stored in SQLite and loaded lazily into memory."""
+
+    def __init__(self, path: pathlib.Path = LEXICON_FILE) -> None:
+        self.path = path
+        # Word to entry, None until loaded. Words not yet saved have no id.
+        self.entries: dict[str, Entry] | None = None
+        # Words interned since the last save, not yet in the table.
+        self.unsaved: list[Entry] = []
+
+    def read(self, connection: sqlite3.Connection) -> None:
+        """Reads all the entries through a connection."""
+        self.entries = {
+            row[1]: Entry(*row) for row in connection.execute(
+                "SELECT id, word, length, vowels, consonants, frequency "
+                "FROM words")}
+
+    def load(self) -> dict[str, Entry]:
+        """Reads all the entries, if not already."""
+        if self.entries is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with sqlite3.connect(self.path) as connection:
+                connection.execute(SCHEMA)
+                self.read(connection)
+        return self.entries
+
+    def intern(self, word: str) -> Entry:
+        """Returns the entry of a word, adding it if never seen."""
+        entries = self.load()
+        entry = entries.get(word)
+        if entry is None:
+            entry = entries[word] = Entry(
+                None, word, len(word), count_vowels(word),
+                count_consonants(word), 0)
+            self.unsaved.append(entry)
+        return entry
+
+    def save(self, counts: dict[str, int]) -> None:
+        """
+        Adds how many times each word was seen in a run to the lifetime
+        frequencies, storing any new words, in a single transaction.
+        The entries are then read again, including any words and
+        frequencies saved by other processes in the meantime.
+        """
+        for word in counts:
+            self.intern(word)
+        with sqlite3.connect(self.path) as connection:
+            # Other processes may have stored the same new words.
+            connection.executemany(
+                "INSERT OR IGNORE INTO words "
+                "(word, length, vowels, consonants) VALUES (?, ?, ?, ?)",
+                (entry[1:5] for entry in self.unsaved))
+            connection.executemany(
+                "UPDATE words SET frequency = frequency + ? WHERE word = ?",
+                ((count, word) for word, count in counts.items()))
+            self.read(connection)
+        self.unsaved.clear()
+
+    def most_common(self, count: int) -> list[Entry]:
+        """The entries most seen over all runs."""
+        return heapq.nlargest(
+            count, self.load().values(), key=lambda entry: entry.frequency)
+
+
+LEXICON = Lexicon()
@@ -5,25 +5,42 @@ Creator Note:
 This mini programming project serves as a break from the madness of
 recent larger projects, and also a chance to recap web automation!
 """
+import pathlib
 import sys
+import time
 from contextlib import suppress
-from typing import Callable
+from timeit import default_timer as timer
+from typing import Any, Callable
 
 from selenium.common.exceptions import WebDriverException
 from selenium.webdriver import Chrome, ChromeOptions
+from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.command import Command
 from selenium.webdriver.remote.webdriver import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait as Wait
 
 import aim
+import archive
 import chimp
+import elements
+import lexicon
+import metrics
+import network
 import number
+import profiles
 import reaction
+import recording
 import sequence
+import stalls
+import tabs
+import transport
 import typing_
 import verbal
 import visual
+import watchdog
+from budget import Budget
 
 
 # The Human Benchmark website.
@@ -40,6 +57,22 @@ OPTIONS = "\n".join((
     "8) Visual Memory",
     "Q) Quit"
 ))
+# Last part of the URL of each test, by its ComputerBenchmark method.
+TEST_PATHS = {
+    "reaction_time": "reactiontime",
+    "sequence": "sequence",
+    "chimp": "chimp",
+    "aim": "aim",
+    "typing": "typing",
+    "verbal": "verbal-memory",
+    "number": "number-memory",
+    "visual": "memory"
+}
+# Commands which count as a test acting on the page.
+ACTION_COMMANDS = (
+    Command.CLICK_ELEMENT, Command.SEND_KEYS_TO_ELEMENT, Command.W3C_ACTIONS)
+# Method name of each test, by the last part of its URL.
+TEST_NAMES = {path: test_name for test_name, path in TEST_PATHS.items()}
 
 
 def format_seconds(seconds: float) -> str:
@@ -94,7 +127,16 @@ def terminate() -> None:
 class ComputerBenchmark(Chrome):
     """Driver which allows Human/Computer Benchmark to be run."""
 
-    def __init__(self, headless: bool = False) -> None:
+    def __init__(
+        self, headless: bool = False, domain: str = DOMAIN,
+        network_policy: "network.NetworkPolicy | None" = None,
+        eager_load: bool = False, prefetch: bool = False,
+        record: pathlib.Path | None = None, metrics_port: int | None = None,
+        metrics_file: pathlib.Path | None = None,
+        resource_thresholds: watchdog.Thresholds | None = None,
+        stall_slo: float | None = None,
+        profile: pathlib.Path | None = None
+    ) -> None:
         options = ChromeOptions()
         # Do not clutter console with random messages.
         options.add_experimental_option(
@@ -102,11 +144,65 @@ class ComputerBenchmark(Chrome):
         options.add_argument("--log-level=3")
         if headless:
             options.add_argument("--headless")
+        if eager_load:
+            # Return from page loads on DOM ready, not waiting for
+            # every image, font and ad to finish loading.
+            options.page_load_strategy = "eager"
+        if profile is not None:
+            # Typically a clone of the template profile, already warm.
+            options.add_argument(f"--user-data-dir={profile.resolve()}")
+        self.profile = profile
+        # Time from loading each test to its first action, with the test.
+        self.first_action_times = []
+        self.test_loaded = None
+        # Time taken to start prefetching the next test, with the test,
+        # included in the time to its first action.
+        self.prefetch_times = []
+        # Method name of the current test (home before any test),
+        # labelling its metrics.
+        self.current_test = "home"
+        self.metrics_exporter = None
+        # Stores the words seen in verbal memory, None to leave it be.
+        self.lexicon = lexicon.LEXICON
+        if metrics_port is not None or metrics_file is not None:
+            self.metrics_exporter = metrics.MetricsExporter(
+                metrics_port, metrics_file)
+        # Kept for starting a new browser when recycling it.
+        self.session_capabilities = options.to_capabilities()
         super().__init__(options=options)
+        # Swaps in the tuned transport now that the session has started.
+        self.command_executor.close()
+        self.command_executor = transport.TunedConnection(
+            self.service.service_url)
+        self.domain = domain
+        self.network_policy = network_policy
+        self.prefetch = prefetch
+        self.element_cache = elements.ElementCache()
+        self.stall_watchdog = None
+        if stall_slo is not None:
+            self.stall_watchdog = stalls.StallWatchdog(
+                self, stall_slo, overlay_hosts=network.get_blocked_hosts(
+                    network_policy or network.NetworkPolicy()))
+        self.prepare_session()
+        self.watchdog = None
+        if resource_thresholds is not None:
+            self.watchdog = watchdog.Watchdog(self, resource_thresholds)
+        if record is not None:
+            self.start_recording(record)
+
+    def prepare_session(self) -> None:
+        """Sets up a newly started browser, loading the home page."""
+        if self.network_policy is not None:
+            network.apply_network_policy(self, self.network_policy)
+        self.tab_pool = tabs.TabPool(self) if self.prefetch else None
         # Needed for many of the challenges to function correctly.
         self.maximize_window()
-        self.get(DOMAIN)
-        # Attempts to agree to cookies several times before giving up.
+        self.get(self.domain)
+        if not profiles.has_consent(self.profile):
+            self.accept_cookies()
+
+    def accept_cookies(self) -> None:
+        """Attempts to agree to cookies several times before giving up."""
         for _ in range(3):
             with suppress(WebDriverException):
                 self.wait(
@@ -115,53 +211,204 @@ class ComputerBenchmark(Chrome):
                 break
         else:
             raise RuntimeError("Failed to accept cookies.")
+
+    def recycle_tab(self) -> None:
+        """
+        Replaces the current tab with a new one (and a new renderer),
+        agreeing to cookies again if asked.
+        """
+        old_handle = self.current_window_handle
+        self.switch_to.new_window("tab")
+        new_handle = self.current_window_handle
+        self.switch_to.window(old_handle)
+        self.close()
+        self.switch_to.window(new_handle)
+        if self.network_policy is not None:
+            # Blocking is per tab, so must be applied to each new tab.
+            network.apply_network_policy(self, self.network_policy)
+        self.element_cache.invalidate()
+        self.get(self.domain)
+        if not profiles.has_consent(self.profile):
+            with suppress(RuntimeError):
+                # The agreement usually carries over within the browser.
+                self.accept_cookies()
+
+    def recycle_browser(self) -> None:
+        """Closes the browser and starts a fresh one in its place."""
+        with suppress(WebDriverException):
+            super().execute(Command.QUIT)
+        self.start_session(self.session_capabilities)
+        self.element_cache.invalidate()
+        self.prepare_session()
     
     def get_test(self, test_name: str) -> None:
         """Loads a particular test, by the last part of the URL."""
-        self.get(f"{DOMAIN}/tests/{test_name}")
+        if self.watchdog is not None:
+            self.watchdog.between_tests()
+        self.test_loaded = (test_name, timer())
+        self.current_test = TEST_NAMES.get(test_name, test_name)
+        self.command_executor.metrics.reset()
+        self.element_cache.invalidate()
+        self.element_cache.reset_stats()
+        url = f"{self.domain}/tests/{test_name}"
+        if self.stall_watchdog is not None:
+            self.stall_watchdog.start_test(self.current_test, url)
+        if self.tab_pool is None:
+            self.get(url)
+            return
+        if not self.tab_pool.take(url):
+            self.get(url)
+        # The next test loads in the background whilst this one runs.
+        # Starting it delays this test, so is part of its time to first
+        # action, but is also timed by itself for the breakdown.
+        prefetch_start = timer()
+        self.tab_pool.prefetch_next()
+        self.prefetch_times.append((test_name, timer() - prefetch_start))
+
+    def run_tests(self, test_names: list[str]) -> None:
+        """Runs tests back to back by their method names."""
+        if self.tab_pool is not None:
+            self.tab_pool.schedule([
+                f"{self.domain}/tests/{TEST_PATHS[test_name]}"
+                for test_name in test_names[1:]])
+        for test_name in test_names:
+            getattr(self, test_name)()
+            self.print_command_summary()
+
+    def pipeline(self, calls: list[Callable]) -> list:
+        """Runs driver calls which do not depend on each other at once."""
+        return self.command_executor.pipeline(calls)
+
+    def print_command_summary(self) -> None:
+        """Outputs the commands which took the most time in the last test."""
+        print("Slowest commands:")
+        for summary in self.command_executor.metrics.summary():
+            print(
+                f"{summary.command} - {summary.count} "
+                f"({round(summary.total_ms)}ms total, "
+                f"{round(summary.mean_ms, 1)}ms mean)")
+        print(self.element_cache.summary())
+        if self.stall_watchdog is not None:
+            print(self.stall_watchdog.summary())
+
+    def find_cached(
+        self, by: str, value: str, many: bool = False
+    ) -> WebElement | list[WebElement]:
+        """Finds an element (or elements), cached until the page changes."""
+        return self.element_cache.find(self, (by, value), many)
+
+    def use_cached(
+        self, locator: tuple[str, str], use: Callable, many: bool = False
+    ) -> Any:
+        """
+        Calls a function with a cached element (or elements),
+        finding it again if it turns out to be stale.
+        """
+        return self.element_cache.use(self, locator, use, many)
+
+    def execute(self, driver_command: str, params: dict = None) -> dict:
+        """Executes a WebDriver command, timing the first test action."""
+        response = super().execute(driver_command, params)
+        if driver_command in ACTION_COMMANDS or (
+            driver_command == Command.W3C_EXECUTE_SCRIPT
+            and ".click()" in params["script"]
+        ):
+            metrics.CLICKS.inc(self.current_test)
+        if self.test_loaded is not None and driver_command in ACTION_COMMANDS:
+            test_name, loaded = self.test_loaded
+            self.first_action_times.append((test_name, timer() - loaded))
+            self.test_loaded = None
+        return response
     
+    def start_recording(self, trace_path: pathlib.Path) -> None:
+        """Records every command and response into a trace for replay."""
+        self.command_executor.recorder = recording.Recorder(
+            trace_path, self.domain)
+
+    def stop_recording(self) -> None:
+        """Stops recording, finishing the trace."""
+        if self.command_executor.recorder is not None:
+            self.command_executor.recorder.close()
+            self.command_executor.recorder = None
+
+    def quit(self) -> None:
+        """
+        Closes the browser, finishing any recording and the final
+        export of the metrics first.
+        """
+        self.stop_recording()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.close()
+        super().quit()
+
     def click_start(self, start_button_text: str = "Start") -> None:
         """Clicks on the start button of a test."""
         start_button = self.wait(
             (By.XPATH, f"//button[text()='{start_button_text}']"))
         start_button.click()
 
+    def clock(self) -> float:
+        """Current time in seconds, for timing the tests."""
+        return timer()
+
+    def sleep(self, seconds: float) -> None:
+        """Pauses between actions, never for a negative duration."""
+        time.sleep(max(seconds, 0))
+
+    def offset_click(
+        self, element: WebElement, x_offset: int, y_offset: int
+    ) -> None:
+        """Clicks at an offset from the centre of an element."""
+        ActionChains(self).move_to_element_with_offset(
+            element, x_offset, y_offset).click().perform()
+
     def wait(
         self, locator: tuple[By, str],
         timeout: int | float = 15, poll: float = 0.1,
         until = EC.presence_of_element_located
     ) -> WebElement:
-        """Wrapper for simplifying the wait syntax."""
+        """
+        Wrapper for simplifying the wait syntax,
+        failing early if the page stalls.
+        """
+        if self.stall_watchdog is not None:
+            return self.stall_watchdog.wait(locator, timeout, poll, until)
         return Wait(self, timeout, poll).until(until(locator))
 
-    def reaction_time(self) -> None:
+    def reaction_time(
+        self, budget: Budget | None = None
+    ) -> "reaction.ReactionTimeResult":
         """Entire reaction time test process from start to finish."""
-        reaction_time = reaction.reaction_time(self)
+        reaction_time = reaction.reaction_time(self, budget)
         if reaction_time.mean is None:
-            return
+            return reaction_time
         reaction.log(f"Mean: {reaction_time.mean}ms")
         geometric_mean = round(reaction_time.geometric_mean, 1)
         reaction.log(f"Geometric mean: {geometric_mean}ms")
         reaction.log(f"Median: {reaction_time.median}ms")
         reaction.log(f"Best: {reaction_time.best}ms")
+        return reaction_time
 
-    def sequence(self) -> None:
+    def sequence(
+        self, budget: Budget | None = None
+    ) -> "sequence.SequenceResult":
         """Entire sequence test process from start to finish."""
-        sequence_result = sequence.sequence(self)
+        sequence_result = sequence.sequence(self, budget)
         sequence.log(f"Score: {sequence_result.score}")
         sequence.log(f"Final sequence:\n{sequence_result.final_sequence}")
         longest_sub_sequence = sequence_result.longest_sub_sequence
         if len(longest_sub_sequence) >= 2:
             sequence.log(f"Longest sub-sequence: {longest_sub_sequence}")
+        return sequence_result
     
-    def chimp(self) -> None:
+    def chimp(self, budget: Budget | None = None) -> "chimp.ChimpResult":
         """Entire chimp test process from start to finish."""
-        chimp_result = chimp.chimp(self)
+        chimp_result = chimp.chimp(self, budget)
         is_max = chimp_result.numbers == chimp.MAX_NUMBERS
         chimp.log(f"Final numbers: {chimp_result.numbers} "
             f"{'(max)' if is_max else ''}")
         if not chimp_result.numbers:
-            return
+            return chimp_result
         time_taken = format_seconds(chimp_result.seconds)
         chimp.log(f"Time taken: {time_taken}")
         chimp.log(f"Squares: {chimp_result.squares}")
@@ -170,28 +417,30 @@ class ComputerBenchmark(Chrome):
         chimp.log("Island counts:")
         for numbers, grid in enumerate(chimp_result.grids, 4):
             chimp.log(f"{numbers} numbers - {len(grid.islands)}")
+        return chimp_result
     
-    def aim(self) -> None:
+    def aim(self, budget: Budget | None = None) -> "aim.AimResult":
         """Entire aim test process from start to finish."""
-        aim_result = aim.aim_trainer(self)
+        aim_result = aim.aim_trainer(self, budget)
         is_max = aim_result.targets == aim.TARGETS
         aim.log(
             f"Targets hit: {aim_result.targets} {'(max)' if is_max else ''}")
         if not aim_result.targets:
-            return
+            return aim_result
         time_taken = format_seconds(aim_result.seconds)
         aim.log(f"Time taken: {time_taken}")
         aim.log(f"{round(aim_result.ms_per_target, 1)}ms / target")
         distance = aim_result.distance
         if distance.mean is None:
-            return
+            return aim_result
         aim.log(f"Total distance: {round(distance.total, 2)}px")
         aim.log(f"Mean distance: {round(distance.mean, 2)}px")
         aim.log(f"Median distance: {round(distance.median, 2)}px")
         aim.log(f"Minimum distance: {round(distance.min, 2)}px")
         aim.log(f"Maximum distance: {round(distance.max, 2)}px")
+        return aim_result
     
-    def typing(self) -> None:
+    def typing(self) -> "typing_.TypingResult":
         """Entire typing test process from start to finish."""
         typing_result = typing_.typing_speed(self)
         typing_.log(f"Text:\n{typing_result.text}")
@@ -208,13 +457,14 @@ class ComputerBenchmark(Chrome):
         typing_.log(f"Capital letters: {round(difficulty.capital_letters, 2)}")
         typing_.log(f"Punctuation: {round(difficulty.punctuation, 2)}")
         typing_.log(f"OVERALL: {round(difficulty.overall, 2)}")
+        return typing_result
     
-    def verbal(self) -> None:
+    def verbal(self, budget: Budget | None = None) -> "verbal.VerbalResult":
         """Entire verbal memory test from start to finish."""
-        verbal_result = verbal.verbal(self)
+        verbal_result = verbal.verbal(self, budget)
         verbal.log(f"Score: {verbal_result.score}")
         if not verbal_result.score:
-            return
+            return verbal_result
         verbal.log(f"Unique words: {verbal_result.unique_count}")
         verbal.log(f"Duplicates: {verbal_result.duplicate_count}")
         average_word_length = round(verbal_result.average_word_length, 2)
@@ -234,30 +484,42 @@ class ComputerBenchmark(Chrome):
         verbal.log(f"Most seen words:")
         for i, most_common in enumerate(verbal_result.most_common, 1):
             verbal.log(f"{i}. {most_common.word} ({most_common.count})")
+        if verbal_result.global_most_common:
+            verbal.log("Most seen words over all runs:")
+            for i, most_common in enumerate(
+                verbal_result.global_most_common, 1
+            ):
+                verbal.log(f"{i}. {most_common.word} ({most_common.count})")
+        return verbal_result
     
-    def number(self) -> None:
+    def number(self, budget: Budget | None = None) -> "number.NumberResult":
         """Entire number memory test from start to finish."""
-        number_result = number.number(self)
+        number_result = number.number(self, budget)
         number.log(f"Score: {number_result.score}")
         number.log(f"Seen numbers:\n{number_result.numbers}")
         number.log(f"Total digits: {number_result.total_digits}")
         if not number_result.score:
-            return
+            return number_result
         number.log("Digit breakdown:")
         for digit, count in number_result.digit_breakdown.items():
             percentage = round(count / number_result.total_digits * 100, 2)
             number.log(f"{digit} - {count} ({percentage}%)")
+        number.log("Round latency by digits:")
+        for digits, seconds in number_result.latencies.items():
+            number.log(f"{digits} - {round(seconds * 1000)}ms")
+        return number_result
     
-    def visual(self) -> None:
+    def visual(self, budget: Budget | None = None) -> "visual.VisualResult":
         """Entire visual memory test from start to finish."""
-        visual_result = visual.visual(self)
+        visual_result = visual.visual(self, budget)
         visual.log(f"Score: {visual_result.score}")
         visual.log(f"Total squares: {visual_result.total_squares}")
         if not visual_result.score:
-            return
+            return visual_result
         visual.log(f"Island counts:")
         for level, board in enumerate(visual_result.boards, 1):
             visual.log(f"Level {level}: {len(board.islands)}")
+        return visual_result
 
 
 def main() -> None:
@@ -269,7 +531,12 @@ def main() -> None:
     else:
         print("Trust the program - the window is there, but hidden!")
     print("Initialising program...")
-    with ComputerBenchmark(headless=headless) as driver:
+    for result in archive.rotate_logs():
+        print(f"Archived {result.runs} runs of {result.log_path.name}.")
+    with ComputerBenchmark(
+        headless=headless, resource_thresholds=watchdog.Thresholds(),
+        stall_slo=stalls.DEFAULT_SLO
+    ) as driver:
         print("Ready to go!")
         mappings = get_mappings(driver)
         while True:
@@ -277,6 +544,7 @@ def main() -> None:
             for inputs, command in mappings.items():
                 if option in inputs:
                     command()
+                    driver.print_command_summary()
                     break
             else:
                 print("Invalid input.")
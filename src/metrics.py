@@ -0,0 +1,301 @@
+"""
+Live metrics of the running tests and the driver, in the OpenMetrics
+text format, served over HTTP and/or written to a textfile for the
+dashboards to scrape. Recording a value is a dictionary update under a
+lock, cheap enough to leave on during timing-sensitive tests.
+"""
+import bisect
+import os
+import pathlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import stalls
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# Seconds between writes of the textfile.
+TEXTFILE_INTERVAL = 5
+# Upper bounds of the latency histogram buckets in seconds.
+ACTION_BUCKETS = (
+    0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30)
+
+
+def escape_label_value(value: str) -> str:
+    """Escapes backslashes, quotes and newlines in a label value."""
+    return (
+        value.replace("\\", "\\\\").replace('"', '\\"')
+        .replace("\n", "\\n"))
+
+
+def format_labels(label_names: tuple[str], values: tuple) -> str:
+    """Label set of a sample, such as {test="chimp"}."""
+    if not label_names:
+        return ""
+    labels = ",".join(
+        f'{name}="{escape_label_value(str(value))}"'
+        for name, value in zip(label_names, values))
+    return f"{{{labels}}}"
+
+
+class Metric:
+    """Family of samples of one metric, one per set of label values."""
+
+    type_ = "unknown"
+
+    def __init__(
+        self, name: str, help_text: str, label_names: tuple[str] = (),
+        lock: threading.Lock = None
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.lock = lock or threading.Lock()
+        self.values: dict[tuple, float] = {}
+
+    def header(self) -> list[str]:
+        """Type and help lines of the family."""
+        return [
+            f"# TYPE {self.name} {self.type_}",
+            f"# HELP {self.name} {self.help_text}"]
+
+    def samples(self) -> list[str]:
+        """Sample lines of the family."""
+        with self.lock:
+            values = list(self.values.items())
+        return [
+            f"{self.name}{format_labels(self.label_names, labels)} {value}"
+            for labels, value in values]
+
+
+class Counter(Metric):
+    """Value which only goes up."""
+
+    type_ = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Increments the value of a set of label values."""
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return [
+            f"{self.name}_total{format_labels(self.label_names, labels)} "
+            f"{value}" for labels, value in values]
+
+
+class Gauge(Metric):
+    """Value which goes up and down."""
+
+    type_ = "gauge"
+
+    def set(self, *labels: str, value: float) -> None:
+        """Sets the value of a set of label values."""
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    """Distribution of values in cumulative buckets."""
+
+    type_ = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, label_names: tuple[str] = (),
+        buckets: tuple[float] = ACTION_BUCKETS, lock: threading.Lock = None
+    ) -> None:
+        super().__init__(name, help_text, label_names, lock)
+        self.buckets = buckets
+        # Count per bucket (not cumulative), with a final bucket for
+        # anything bigger, then the sum of the values.
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        """Adds a value to the distribution of a set of label values."""
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            counts[i] += 1
+            counts[-1] += value
+
+    def samples(self) -> list[str]:
+        with self.lock:
+            values = [
+                (labels, counts.copy())
+                for labels, counts in self.values.items()]
+        lines = []
+        label_names = (*self.label_names, "le")
+        for labels, counts in values:
+            cumulative = 0
+            for bucket, count in zip(
+                (*(f"{bucket:g}" for bucket in self.buckets), "+Inf"),
+                counts
+            ):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{format_labels(label_names, (*labels, bucket))} "
+                    f"{cumulative}")
+            label_set = format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_count{label_set} {cumulative}")
+            lines.append(f"{self.name}_sum{label_set} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """All the metrics, in the order they were created."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics: list[Metric] = []
+
+    def add(self, metric: Metric) -> Metric:
+        """Registers a metric, returning it."""
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, *label_names: str) -> Counter:
+        return self.add(Counter(name, help_text, label_names, self.lock))
+
+    def gauge(self, name: str, help_text: str, *label_names: str) -> Gauge:
+        return self.add(Gauge(name, help_text, label_names, self.lock))
+
+    def histogram(
+        self, name: str, help_text: str, *label_names: str,
+        buckets: tuple[float] = ACTION_BUCKETS
+    ) -> Histogram:
+        return self.add(
+            Histogram(name, help_text, label_names, buckets, self.lock))
+
+    def render(self) -> str:
+        """All the metrics in the OpenMetrics text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+LEVELS = REGISTRY.counter(
+    "benchmark_levels", "Levels (or rounds) completed.", "test")
+CLICKS = REGISTRY.counter(
+    "benchmark_clicks", "Clicks and other input actions sent.", "test")
+ERRORS = REGISTRY.counter(
+    "benchmark_errors", "Tests ended by an error.", "test")
+COMMANDS = REGISTRY.counter(
+    "benchmark_webdriver_commands", "WebDriver commands sent.", "command")
+COMMAND_ERRORS = REGISTRY.counter(
+    "benchmark_webdriver_command_errors", "WebDriver commands which failed.",
+    "command")
+RECYCLES = REGISTRY.counter(
+    "benchmark_browser_recycles",
+    "Actions taken by the resource watchdog.", "action")
+SCORE = REGISTRY.gauge(
+    "benchmark_score", "Score (or level) of the current test.", "test")
+LIVES = REGISTRY.gauge(
+    "benchmark_lives", "Lives remaining in the current test.", "test")
+ROUND_SECONDS = REGISTRY.histogram(
+    "benchmark_round_seconds", "Seconds taken by each level (or round).",
+    "test")
+COMMAND_SECONDS = REGISTRY.histogram(
+    "benchmark_webdriver_command_seconds",
+    "Seconds taken by each WebDriver command.", "command")
+
+
+class TestProgress:
+    """Reports the progress of a running test to the metrics."""
+
+    def __init__(self, driver: Any, test: str) -> None:
+        self.driver = driver
+        self.test = test
+        self.last_round = driver.clock()
+        SCORE.set(test, value=0)
+        stalls.heartbeat(driver)
+
+    def round(self, score: int) -> None:
+        """Registers a level (or round) completed, reaching a score."""
+        now = self.driver.clock()
+        LEVELS.inc(self.test)
+        SCORE.set(self.test, value=score)
+        ROUND_SECONDS.observe(self.test, value=now - self.last_round)
+        self.last_round = now
+        # Each round is progress, so the test has not stalled.
+        stalls.heartbeat(self.driver)
+
+    def lives(self, lives: int) -> None:
+        """Registers the lives remaining."""
+        LIVES.set(self.test, value=lives)
+
+    def error(self) -> None:
+        """Registers the test ending by an error."""
+        ERRORS.inc(self.test)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics at any path."""
+
+    def do_GET(self) -> None:
+        """Responds with the current metrics."""
+        content = REGISTRY.render().encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *_) -> None:
+        """Do not clutter console with request messages."""
+        pass
+
+
+class MetricsExporter:
+    """
+    Exposes the metrics on a local HTTP port and/or writes them to a
+    textfile periodically, each in a background thread.
+    """
+
+    def __init__(
+        self, port: int | None = None,
+        textfile: pathlib.Path | None = None,
+        interval: float = TEXTFILE_INTERVAL
+    ) -> None:
+        self.server = None
+        if port is not None:
+            self.server = ThreadingHTTPServer(
+                ("127.0.0.1", port), MetricsHandler)
+            self.server.daemon_threads = True
+            threading.Thread(
+                target=self.server.serve_forever, daemon=True).start()
+        self.textfile = textfile
+        self.interval = interval
+        self.stopped = threading.Event()
+        if textfile is not None:
+            threading.Thread(
+                target=self.write_periodically, daemon=True).start()
+
+    def write_textfile(self) -> None:
+        """Writes the metrics, replacing the textfile all at once."""
+        self.textfile.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.textfile.with_name(f"{self.textfile.name}.tmp")
+        temporary.write_text(REGISTRY.render(), "utf8")
+        os.replace(temporary, self.textfile)
+
+    def write_periodically(self) -> None:
+        """Writes the textfile at every interval until stopped."""
+        while not self.stopped.wait(self.interval):
+            self.write_textfile()
+
+    def close(self) -> None:
+        """Stops exporting, writing the textfile a final time."""
+        self.stopped.set()
+        if self.textfile is not None:
+            self.write_textfile()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
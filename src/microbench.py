@@ -0,0 +1,253 @@
+"""
+Microbenchmarks of the pure analysis functions of the tests, on seeded
+synthetic inputs from game-realistic to extreme sizes. Each case is
+timed repeatably (best of several repeats, garbage collection off) with
+its peak memory measured, and checked against its time budget.
+Outputs JSON, so the results can be tracked over time.
+"""
+import argparse
+import datetime as dt
+import gc
+import json
+import platform
+import random
+import string
+import sys
+import timeit
+import tracemalloc
+from collections import namedtuple
+from typing import Any, Callable
+
+import aim
+import chimp
+import number
+import sequence
+import typing_
+import verbal
+from utils import get_islands
+
+
+DEFAULT_SEED = 0
+# Number of timings taken of each case, the best being kept.
+REPEATS = 5
+# Minimum seconds each timing runs the case for, calling it repeatedly.
+MIN_TIMING_SECONDS = 0.2
+# Fraction of squares filled on generated boards, low enough to keep
+# islands (and hence the recursion counting them) small.
+BOARD_DENSITY = 0.4
+
+
+# Generates the arguments of a function call from a seeded random state.
+Case = namedtuple("Case", ("function", "size", "generate", "budget"))
+CaseResult = namedtuple(
+    "CaseResult",
+    ("function", "size", "seconds", "peak_bytes", "budget", "within_budget"))
+
+
+def generate_board(rng: random.Random, size: int) -> tuple:
+    """Square board of 1s and 0s."""
+    return ([
+        [int(rng.random() < BOARD_DENSITY) for _ in range(size)]
+        for _ in range(size)],)
+
+
+def generate_sequence(rng: random.Random, length: int) -> tuple:
+    """Sequence of squares of the sequence memory board."""
+    return ([rng.randrange(9) for _ in range(length)],)
+
+
+def generate_verbal_words(
+    rng: random.Random, length: int, vocabulary: int
+) -> tuple:
+    """Indexes of each word seen in a verbal memory test of given length."""
+    words = [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12)))
+        for _ in range(vocabulary)]
+    indexes = {}
+    for i in range(length):
+        indexes.setdefault(rng.choice(words), []).append(i)
+    return indexes, length
+
+
+def generate_passage(rng: random.Random, characters: int) -> tuple:
+    """Typing test passage of roughly a given number of characters."""
+    words = []
+    length = 0
+    while length < characters:
+        word = "".join(
+            rng.choices(string.ascii_lowercase, k=rng.randint(1, 10)))
+        if rng.random() < 0.05:
+            word = word.capitalize()
+        if rng.random() < 0.1:
+            word += rng.choice(",.;:!?")
+        words.append(word)
+        length += len(word) + 1
+    return rng.randint(100, 300), " ".join(words)
+
+
+def generate_numbers(rng: random.Random, count: int) -> tuple:
+    """Numbers of a number memory test, one digit longer each."""
+    return ([
+        str(rng.randint(1, 9))
+        + "".join(rng.choices(string.digits, k=digits - 1))
+        for digits in range(1, count + 1)],)
+
+
+def generate_coordinates(rng: random.Random, count: int) -> tuple:
+    """Coordinates of the aim trainer targets hit."""
+    return ([
+        (rng.randint(0, 1000), rng.randint(0, 500))
+        for _ in range(count)],)
+
+
+def generate_grids(rng: random.Random, count: int) -> tuple:
+    """Chimp test grids completed, with their islands."""
+    grids = []
+    for _ in range(count):
+        grid = generate_board(rng, 5)[0]
+        grids.append(chimp.Grid(grid, get_islands(grid)))
+    return grids, rng.uniform(10, 60)
+
+
+# Budgets are seconds per call, generous enough for slower machines.
+CASES = (
+    Case(
+        "utils.get_islands", "realistic",
+        lambda rng: generate_board(rng, 7), 0.0001),
+    Case(
+        "utils.get_islands", "extreme",
+        lambda rng: generate_board(rng, 100), 0.02),
+    Case(
+        "sequence.longest_duplicate_subarray", "realistic",
+        lambda rng: generate_sequence(rng, 50), 0.0001),
+    Case(
+        "sequence.longest_duplicate_subarray", "extreme",
+        lambda rng: generate_sequence(rng, 5000), 0.04),
+    Case(
+        "verbal.get_verbal_result", "realistic",
+        lambda rng: generate_verbal_words(rng, 1000, 300), 0.003),
+    Case(
+        "verbal.get_verbal_result", "extreme",
+        lambda rng: generate_verbal_words(rng, 100_000, 5000), 0.1),
+    Case(
+        "typing_.get_typing_result", "realistic",
+        lambda rng: generate_passage(rng, 300), 0.0005),
+    Case(
+        "typing_.get_typing_result", "extreme",
+        lambda rng: generate_passage(rng, 50_000), 0.05),
+    Case(
+        "number.get_number_result", "realistic",
+        lambda rng: generate_numbers(rng, 20), 0.0002),
+    Case(
+        "number.get_number_result", "extreme",
+        lambda rng: generate_numbers(rng, 2000), 0.2),
+    Case(
+        "aim.get_distance_result", "realistic",
+        lambda rng: generate_coordinates(rng, aim.TARGETS), 0.00025),
+    Case(
+        "aim.get_distance_result", "extreme",
+        lambda rng: generate_coordinates(rng, 100_000), 0.5),
+    Case(
+        "chimp.get_chimp_result", "realistic",
+        lambda rng: generate_grids(
+            rng, chimp.MAX_NUMBERS - chimp.MIN_NUMBERS + 1), 0.00001),
+    Case(
+        "chimp.get_chimp_result", "extreme",
+        lambda rng: generate_grids(rng, 10_000), 0.00001)
+)
+FUNCTIONS = {
+    "utils.get_islands": get_islands,
+    "sequence.longest_duplicate_subarray": sequence.longest_duplicate_subarray,
+    "verbal.get_verbal_result": verbal.get_verbal_result,
+    "typing_.get_typing_result": typing_.get_typing_result,
+    "number.get_number_result": number.get_number_result,
+    "aim.get_distance_result": aim.get_distance_result,
+    "chimp.get_chimp_result": chimp.get_chimp_result
+}
+
+
+def time_call(function: Callable, args: tuple) -> float:
+    """
+    Returns the best seconds per call of a function over several repeats,
+    each calling it enough times to run for a minimum duration.
+    """
+    timer = timeit.Timer(lambda: function(*args))
+    calls, seconds = timer.autorange()
+    if seconds < MIN_TIMING_SECONDS:
+        calls = max(int(calls * MIN_TIMING_SECONDS / seconds), 1)
+    # Garbage collection is disabled whilst timing, as by default.
+    return min(timer.repeat(REPEATS, calls)) / calls
+
+
+def measure_peak_memory(function: Callable, args: tuple) -> int:
+    """Returns the peak bytes allocated during a single call."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case: Case, seed: int) -> CaseResult:
+    """Benchmarks a single case."""
+    function = FUNCTIONS[case.function]
+    args = case.generate(random.Random(seed))
+    seconds = time_call(function, args)
+    peak_bytes = measure_peak_memory(function, args)
+    return CaseResult(
+        case.function, case.size, seconds, peak_bytes, case.budget,
+        seconds <= case.budget)
+
+
+def get_report(results: list[CaseResult], seed: int) -> dict[str, Any]:
+    """Report of the results with the environment they were measured in."""
+    return {
+        "measured_at": dt.datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": [result._asdict() for result in results]
+    }
+
+
+def main() -> None:
+    """Runs the benchmarks from the command line, outputting JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "functions", nargs="*", default=list(FUNCTIONS),
+        help="functions to benchmark (by default, all)")
+    parser.add_argument(
+        "--size", choices=("realistic", "extreme"),
+        help="only benchmark inputs of a given size")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument(
+        "--output", type=argparse.FileType("w", encoding="utf8"),
+        default=sys.stdout, help="file to write the JSON to")
+    args = parser.parse_args()
+    for function in args.functions:
+        if function not in FUNCTIONS:
+            parser.error(f"Unknown function: {function}")
+    results = []
+    for case in CASES:
+        if (
+            case.function in args.functions
+            and args.size in (None, case.size)
+        ):
+            result = run_case(case, args.seed)
+            status = "OK" if result.within_budget else "OVER BUDGET"
+            print(
+                f"{case.function} ({case.size}) - "
+                f"{result.seconds * 1000:.3f}ms, "
+                f"{result.peak_bytes / 1024:.1f}KiB peak - {status}",
+                file=sys.stderr)
+            results.append(result)
+    json.dump(get_report(results, args.seed), args.output, indent=4)
+    args.output.write("\n")
+    if not all(result.within_budget for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Network policy for the driver. The site is full of ads which slow
+down page loads and intercept clicks, so blocking them (along with
+analytics, fonts and images) keeps the tests lean and more stable.
+"""
+import statistics
+from collections import namedtuple
+from timeit import default_timer as timer
+
+import main
+import reaction
+from standin import StandInServer
+
+
+# Hosts blocked by default, by category.
+AD_HOSTS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "pubmatic.com",
+    "rubiconproject.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "moatads.com",
+    "playwire.com"
+)
+ANALYTICS_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "hotjar.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "facebook.net"
+)
+FONT_HOSTS = (
+    "fonts.googleapis.com",
+    "fonts.gstatic.com",
+    "use.typekit.net"
+)
+IMAGE_HOSTS = (
+    "tpc.googlesyndication.com",
+    "i.ytimg.com",
+    "images-na.ssl-images-amazon.com"
+)
+BLOCKED_HOSTS = AD_HOSTS + ANALYTICS_HOSTS + FONT_HOSTS + IMAGE_HOSTS
+# Number of times to load each test page when comparing load times.
+COMPARISON_LOADS = 5
+
+
+# The hosts to block, and hosts to never block even if otherwise blocked.
+NetworkPolicy = namedtuple(
+    "NetworkPolicy", ("blocked_hosts", "allowed_hosts"),
+    defaults=(BLOCKED_HOSTS, ()))
+LoadComparison = namedtuple(
+    "LoadComparison", ("blocking", "load_times", "reaction_time"))
+
+
+def get_blocked_hosts(policy: NetworkPolicy) -> list[str]:
+    """
+    Returns the hosts blocked by a policy.
+    An allowed host takes priority over a blocked host which is the
+    same host or one of its subdomains, but not over its parent domain.
+    """
+    return [
+        host for host in policy.blocked_hosts
+        if not any(
+            host == allowed or host.endswith(f".{allowed}")
+            for allowed in policy.allowed_hosts)]
+
+
+def get_blocked_url_patterns(policy: NetworkPolicy) -> list[str]:
+    """Returns the DevTools URL patterns to block for a policy."""
+    return [f"*{host}*" for host in get_blocked_hosts(policy)]
+
+
+def apply_network_policy(
+    driver: "main.ComputerBenchmark", policy: NetworkPolicy
+) -> None:
+    """Blocks requests to the hosts of the policy in the current tab."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd(
+        "Network.setBlockedURLs", {"urls": get_blocked_url_patterns(policy)})
+
+
+def compare_load_times(
+    blocking: bool, loads: int = COMPARISON_LOADS
+) -> LoadComparison:
+    """
+    Loads a test page several times from a stand-in server serving slow
+    third-party assets, with or without blocking and DOM ready loading.
+    The reaction time test is then performed to compare the results.
+    """
+    policy = NetworkPolicy() if blocking else None
+    with (
+        StandInServer() as server,
+        main.ComputerBenchmark(
+            headless=True, domain=server.domain,
+            network_policy=policy, eager_load=blocking) as driver
+    ):
+        load_times = []
+        for _ in range(loads):
+            start = timer()
+            driver.get_test("reactiontime")
+            load_times.append(timer() - start)
+        reaction_time = reaction.reaction_time(driver)
+    return LoadComparison(blocking, load_times, reaction_time)
+
+
+def run_comparison() -> None:
+    """Compares load times and test results with blocking off and on."""
+    for blocking in (False, True):
+        comparison = compare_load_times(blocking)
+        mean_load = statistics.mean(comparison.load_times) * 1000
+        print(f"Blocking {'on' if blocking else 'off'}:")
+        print(f"Mean load time: {round(mean_load, 1)}ms")
+        print(f"Mean reaction time: {comparison.reaction_time.mean}ms")
+
+
+if __name__ == "__main__":
+    run_comparison()
@@ -4,69 +4,108 @@ Can you do more? Hopefully you can...
 The average computer can remember like 8 billion numbers.
 Can you do more?! Hopefully you cannot...
 """
-import random
 from collections import namedtuple
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 
 import main
+from budget import (
+    ERROR, GAME_OVER, RANDOM_FAILURE, Budget, BudgetTracker)
+from metrics import TestProgress
 from utils import DATA_FOLDER, get_log_function, log_date_time
 
 
-# A small chance of failure to avoid going on forever.
+# Chance of failing each round, if failing at random.
 FAILURE_RATE = 0.05
+# Stops at the score a 5% failure rate reaches on average by default.
+BUDGET = Budget(target=20)
 LOG = DATA_FOLDER / "number.txt"
+# Only shown once the game is over, unlike the rest of the page.
+SAVE_SCORE_XPATH = "//button[text()='Save score']"
 
 NumberResult = namedtuple(
     "NumberResult",
-    ("score", "numbers", "total_digits", "digit_breakdown")
+    ("score", "numbers", "total_digits", "digit_breakdown", "latencies",
+    "stop_reason"),
+    defaults=(None,)
 )
 log = get_log_function(LOG)
 
 
-def get_number_result(numbers: list[int]) -> NumberResult:
-    """Generates the results for the number memory test."""
+def get_number_result(
+    numbers: list[str], latencies: dict[int, float] = None,
+    stop_reason: str | None = None
+) -> NumberResult:
+    """
+    Generates the results for the number memory test.
+    The numbers are kept as strings, since numbers of thousands of digits
+    are beyond the limit of converting between strings and integers.
+    """
     score = len(numbers)
     total_digits = (score * (score + 1)) // 2
-    digit_breakdown = {n: 0 for n in range(10)}
-    for number in numbers:
-        for digit in str(number):
-            digit_breakdown[int(digit)] += 1
-    return NumberResult(score, numbers, total_digits, digit_breakdown)
+    digit_breakdown = {
+        n: sum(number.count(str(n)) for number in numbers)
+        for n in range(10)}
+    return NumberResult(
+        score, numbers, total_digits, digit_breakdown, latencies or {},
+        stop_reason)
 
 
-def number(driver: "main.ComputerBenchmark") -> NumberResult:
-    """Performs the number memory test and returns the result."""
+def number(
+    driver: "main.ComputerBenchmark", budget: Budget | None = None
+) -> NumberResult:
+    """
+    Performs the number memory test and returns the result,
+    stopping once the budget (by default BUDGET) is used up.
+    """
     log_date_time(log, "Number memory test started at {} UTC.")
     driver.get_test("number-memory")
+    tracker = BudgetTracker(driver, BUDGET if budget is None else budget)
+    progress = TestProgress(driver, "number")
     driver.click_start()
     numbers = []
+    # Seconds from the entry appearing to the answer being checked,
+    # by number of digits.
+    latencies = {}
     while True:
         try:
             number_element = driver.wait((By.CLASS_NAME, "big-number "), 5)
-            number = int(number_element.text)
+            number = number_element.text
             # Wait for entry to appear, longer as the number length increases.
             entry = driver.wait((By.TAG_NAME, "input"), len(numbers) + 10)
+            start = driver.clock()
             # Inputs the number, and presses ENTER twice.
             # The first ENTER submits the number.
             # The second ENTER proceeds to the next number.
             entry.send_keys(f"{number}{Keys.ENTER * 2}")
-            if "Save score" in driver.page_source:
+            if driver.find_elements(By.XPATH, SAVE_SCORE_XPATH):
                 # Number was somehow incorrectly input - game over.
                 solution = driver.find_element(By.CLASS_NAME, "actual-answer")
-                actual_answer = int(
-                    solution.find_element(By.CLASS_NAME, "number").text)
+                actual_answer = solution.find_element(
+                    By.CLASS_NAME, "number").text
                 log(
                     f"Game over - {number} was input, "
                     f"{actual_answer} is the correct answer.")
+                stop_reason = GAME_OVER
                 break
         except Exception:
             log("An error has occurred with the test.")
+            progress.error()
+            stop_reason = ERROR
             break
         numbers.append(number)
-        log(f"{len(numbers)}. {number}")
-        if random.random() < FAILURE_RATE:
-            log("Failing now to avoid going on forever.")
+        latencies[len(number)] = driver.clock() - start
+        progress.round(len(numbers))
+        log(
+            f"{len(numbers)}. {number} "
+            f"({round(latencies[len(number)] * 1000)}ms)")
+        stop_reason = tracker.check(len(numbers))
+        if stop_reason is not None:
+            log(f"Budget used up ({stop_reason}).")
             break
-    return get_number_result(numbers)
+        if tracker.random_failure(FAILURE_RATE):
+            log("Random failure activated.")
+            stop_reason = RANDOM_FAILURE
+            break
+    return get_number_result(numbers, latencies, stop_reason)
@@ -0,0 +1,137 @@
+"""
+Batch difficulty scoring of typing test passages, for scoring whole
+collections of passages offline rather than one per test.
+The scores are identical to those of the typing test results.
+"""
+import argparse
+import csv
+import os
+import pathlib
+import re
+import statistics
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+import archive
+import typing_
+
+
+# Runs of characters which are not alphanumeric (underscore included,
+# since it is otherwise a word character).
+NON_ALNUM_REGEX = re.compile(r"[\W_]+")
+# Non-alphanumeric characters other than spaces, removed before splitting.
+NON_ALNUM_OR_SPACE_REGEX = re.compile(r"[^\w ]|_")
+# Weighted punctuation characters and their weightings, in the same order
+# as the weightings themselves, so the points sum identically.
+PUNCTUATION_TABLE = tuple(typing_.PUNCTUATION_WEIGHTINGS.items())
+# Passages sent to each worker process at a time, at most.
+MAX_CHUNK_SIZE = 256
+
+
+PassageScore = namedtuple(
+    "PassageScore",
+    ("text", "word_count", "character_count", "average_word_length",
+    "punctuation_count", "difficulty_score")
+)
+
+
+def score_passage(text: str) -> PassageScore:
+    """Scores a passage, exactly as the typing test result would."""
+    # Words only contain alphanumeric characters, separated by spaces.
+    words = NON_ALNUM_OR_SPACE_REGEX.sub("", text).lower().split(" ")
+    words = [word for word in words if word]
+    word_count = len(words)
+    character_count = len(text)
+    alnum_count = sum(map(len, words))
+    # As in the test, the final word is registered by an added space.
+    punctuation_count = (
+        character_count - len(NON_ALNUM_REGEX.sub("", text)) + 1)
+    punctuation = {
+        character: text.count(character) for character, _ in PUNCTUATION_TABLE}
+    punctuation[" "] += 1
+    capital_letters_count = sum(map(str.isupper, text))
+    difficulty_score = typing_.get_difficulty_score(
+        words, character_count, alnum_count,
+        capital_letters_count, punctuation)
+    return PassageScore(
+        text, word_count, character_count, alnum_count / word_count,
+        punctuation_count, difficulty_score)
+
+
+def score_passages(
+    texts: list[str], workers: int | None = None
+) -> list[PassageScore]:
+    """Scores passages spread over worker processes, in order."""
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        return list(map(score_passage, texts))
+    chunk_size = min(max(len(texts) // (workers * 4), 1), MAX_CHUNK_SIZE)
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(score_passage, texts, chunksize=chunk_size))
+
+
+def read_logged_passages(log_path: pathlib.Path) -> list[str]:
+    """
+    Returns the passages of the typing tests logged so far,
+    including those of runs since archived.
+    """
+    passages = []
+    passage_lines = None
+    for _, text in archive.iter_runs(log_path):
+        for line in text.removesuffix("\n").split("\n"):
+            if line == "Text:":
+                passage_lines = []
+            elif passage_lines is not None:
+                if line.startswith("Time taken: "):
+                    passages.append("\n".join(passage_lines))
+                    passage_lines = None
+                else:
+                    passage_lines.append(line)
+    return passages
+
+
+def read_passages(file_path: pathlib.Path) -> list[str]:
+    """Returns the passages of a text file, one passage per line."""
+    with file_path.open(encoding="utf8") as f:
+        return [line for line in f.read().splitlines() if line]
+
+
+def main() -> None:
+    """Scores passages from the command line, outputting throughput."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "files", nargs="*", type=pathlib.Path,
+        help="text files with one passage per line "
+            "(by default, the passages in the typing test log)")
+    parser.add_argument("--workers", type=int, help="number of processes")
+    parser.add_argument(
+        "--output", type=pathlib.Path, help="CSV file to save the scores to")
+    args = parser.parse_args()
+    if args.files:
+        texts = [text for file in args.files for text in read_passages(file)]
+    else:
+        texts = read_logged_passages(typing_.LOG)
+    if not texts:
+        parser.error("No passages to score.")
+    start = timer()
+    scores = score_passages(texts, args.workers)
+    seconds = timer() - start
+    if args.output is not None:
+        with args.output.open("w", encoding="utf8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ("text", "repeated_words", "capital_letters",
+                    "punctuation", "overall"))
+            for score in scores:
+                writer.writerow((score.text, *score.difficulty_score))
+    overall = statistics.mean(
+        score.difficulty_score.overall for score in scores)
+    print(f"Passages: {len(scores)}")
+    print(f"Mean difficulty: {round(overall, 2)}")
+    print(f"Time taken: {round(seconds, 3)}s")
+    print(f"Passages per second: {round(len(scores) / seconds, 1)}")
+
+
+if __name__ == "__main__":
+    main()
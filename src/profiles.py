@@ -0,0 +1,217 @@
+"""
+Pre-warmed Chrome profiles. Every browser otherwise starts on a new
+temporary profile, repeating first-run set-up, downloading the JS
+bundles of the website again and agreeing to cookies. Instead, a
+template profile is built once by agreeing to cookies and loading every
+test, then cloned into a profile of each browser's own: each file is
+reflinked where the filesystem supports copy-on-write, else copied.
+Chrome writes to cache entries in place, so no file is ever shared
+between clones running at the same time.
+"""
+import argparse
+import datetime as dt
+import os
+import pathlib
+import shutil
+import statistics
+from collections import namedtuple
+from timeit import default_timer as timer
+
+import main
+from utils import DATA_FOLDER
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, where every file is copied outright.
+    fcntl = None
+
+
+PROFILES_FOLDER = DATA_FOLDER / "profiles"
+TEMPLATE_FOLDER = PROFILES_FOLDER / "template"
+CLONES_FOLDER = PROFILES_FOLDER / "clones"
+# Written once a template is complete, cookies having been agreed to.
+CONSENT_MARKER = "benchmark_consent.txt"
+# Templates older than this many days are rebuilt, so the cached
+# bundles do not drift too far from the website.
+TEMPLATE_MAX_AGE_DAYS = 7
+# Locks of the browser which built the template, which would make the
+# clone look in use.
+SKIPPED_NAMES = {"SingletonLock", "SingletonCookie", "SingletonSocket"}
+# ioctl request cloning a file by reflink on Linux (btrfs, XFS).
+FICLONE = 0x40049409
+# Test timed from the constructor to its first action by default.
+COMPARISON_TEST = "reaction_time"
+
+
+CloneResult = namedtuple(
+    "CloneResult", ("path", "reflinked", "copied", "seconds"))
+# Seconds from the constructor to the browser being ready, from then to
+# the first action of the test, and in total.
+StartupTime = namedtuple(
+    "StartupTime", ("startup", "first_action", "total"))
+
+
+def has_consent(profile: pathlib.Path | None) -> bool:
+    """Whether a profile is cloned from a complete template."""
+    return profile is not None and (profile / CONSENT_MARKER).is_file()
+
+
+def is_template_fresh(
+    template: pathlib.Path = TEMPLATE_FOLDER,
+    max_age_days: float = TEMPLATE_MAX_AGE_DAYS
+) -> bool:
+    """Whether a template is complete and not too old to use."""
+    if not has_consent(template):
+        return False
+    built = dt.datetime.fromtimestamp(
+        (template / CONSENT_MARKER).stat().st_mtime)
+    return dt.datetime.now() - built < dt.timedelta(days=max_age_days)
+
+
+def build_template(
+    template: pathlib.Path = TEMPLATE_FOLDER, headless: bool = True
+) -> float:
+    """
+    Builds a template profile afresh, agreeing to cookies and caching
+    every test. Returns the seconds taken.
+    """
+    start = timer()
+    shutil.rmtree(template, ignore_errors=True)
+    template.mkdir(parents=True)
+    with main.ComputerBenchmark(headless=headless, profile=template) as driver:
+        for test_path in main.TEST_PATHS.values():
+            driver.get(f"{driver.domain}/tests/{test_path}")
+    # Written last, after the browser has saved the profile on quitting,
+    # so a template left half-built is never used.
+    (template / CONSENT_MARKER).write_text(
+        f"Built at {dt.datetime.utcnow().isoformat()} UTC.\n", "utf8")
+    return timer() - start
+
+
+def ensure_template(
+    template: pathlib.Path = TEMPLATE_FOLDER, headless: bool = True,
+    max_age_days: float = TEMPLATE_MAX_AGE_DAYS
+) -> None:
+    """Builds a template profile if missing or too old."""
+    if not is_template_fresh(template, max_age_days):
+        build_template(template, headless)
+
+
+def reflink(source: pathlib.Path, target: pathlib.Path) -> bool:
+    """Clones a file copy-on-write, returning False if unsupported."""
+    if fcntl is None:
+        return False
+    try:
+        with source.open("rb") as src, target.open("wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        target.unlink(missing_ok=True)
+        return False
+    shutil.copystat(source, target)
+    return True
+
+
+def clone_template(
+    name: str, template: pathlib.Path = TEMPLATE_FOLDER
+) -> CloneResult:
+    """
+    Clones a template into a profile of the given name, replacing any
+    left over from before.
+    """
+    start = timer()
+    target = CLONES_FOLDER / name
+    shutil.rmtree(target, ignore_errors=True)
+    reflinked = copied = 0
+    # Checked once, every file being on the same filesystem.
+    can_reflink = True
+    for folder, _, file_names in os.walk(template):
+        folder = pathlib.Path(folder)
+        relative = folder.relative_to(template)
+        (target / relative).mkdir(parents=True, exist_ok=True)
+        for file_name in file_names:
+            source = folder / file_name
+            if file_name in SKIPPED_NAMES or source.is_symlink():
+                continue
+            destination = target / relative / file_name
+            if can_reflink and reflink(source, destination):
+                reflinked += 1
+                continue
+            can_reflink = False
+            shutil.copy2(source, destination)
+            copied += 1
+    return CloneResult(target, reflinked, copied, timer() - start)
+
+
+def remove_clone(profile: pathlib.Path) -> None:
+    """Deletes a cloned profile once its browser has quit."""
+    shutil.rmtree(profile, ignore_errors=True)
+
+
+def time_to_first_action(
+    test_name: str, headless: bool, template: bool
+) -> StartupTime:
+    """
+    Times a test from the constructor of the driver to its first
+    action, on a fresh profile or a clone of the template.
+    """
+    start = timer()
+    profile = None
+    if template:
+        profile = clone_template(f"compare-{os.getpid()}").path
+    try:
+        with main.ComputerBenchmark(
+            headless=headless, profile=profile
+        ) as driver:
+            ready = timer()
+            getattr(driver, test_name)()
+    finally:
+        if profile is not None:
+            remove_clone(profile)
+    first_action = driver.first_action_times[0][1]
+    return StartupTime(
+        ready - start, first_action, ready - start + first_action)
+
+
+def compare_startup_times(test_name: str, runs: int, headless: bool) -> None:
+    """
+    Starts browsers on fresh profiles and then on clones of the
+    template, outputting the mean times to the first test action.
+    """
+    ensure_template(headless=headless)
+    for template in (False, True):
+        times = [
+            time_to_first_action(test_name, headless, template)
+            for _ in range(runs)]
+        print(f"{'Template' if template else 'Fresh'} profile:")
+        for field in StartupTime._fields:
+            mean_seconds = statistics.mean(
+                getattr(startup_time, field) for startup_time in times)
+            print(f"{field} - {round(mean_seconds * 1000)}ms")
+
+
+def cli() -> None:
+    """Builds the template or compares start-up from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser(
+        "build", help="build the template profile afresh")
+    compare_parser = subparsers.add_parser(
+        "compare", help="time fresh against templated profiles")
+    compare_parser.add_argument(
+        "--test", choices=main.TEST_PATHS, default=COMPARISON_TEST)
+    compare_parser.add_argument("--runs", type=int, default=3)
+    for subparser in (build_parser, compare_parser):
+        subparser.add_argument("--windowed", action="store_true")
+    args = parser.parse_args()
+    if args.command == "build":
+        seconds = build_template(headless=not args.windowed)
+        print(f"Template built in {round(seconds, 1)}s.")
+        return
+    if args.runs < 1:
+        parser.error("at least one run is needed")
+    compare_startup_times(args.test, args.runs, not args.windowed)
+
+
+if __name__ == "__main__":
+    cli()
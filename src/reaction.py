@@ -9,37 +9,52 @@ from collections import namedtuple
 from selenium.webdriver.common.by import By
 
 import main
+from budget import COMPLETE, ERROR, Budget, BudgetTracker
+from metrics import TestProgress
 from utils import DATA_FOLDER, get_log_function, log_date_time
 
 
 ROUNDS = 5
+# No limits by default, the test always being a fixed number of rounds.
+BUDGET = Budget()
 LOG = DATA_FOLDER / "reaction_time.txt"
 
 
 ReactionTimeResult = namedtuple(
     "ReactionTimeResult",
-    ("times", "mean", "geometric_mean", "median", "best")
+    ("times", "mean", "geometric_mean", "median", "best", "stop_reason"),
+    defaults=(None,)
 )
 log = get_log_function(LOG)
 
 
-def get_reaction_time_result(times: list[int]) -> ReactionTimeResult:
+def get_reaction_time_result(
+    times: list[int], stop_reason: str | None = None
+) -> ReactionTimeResult:
     """Provides various basic, relevant stats on the times."""
     if not times:
         # Not a single result - something went wrong for this to happen...
-        return ReactionTimeResult([], None, None, None, None)
+        return ReactionTimeResult([], None, None, None, None, stop_reason)
     # Utilise various statistical functions to provide results insight.
     mean = statistics.mean(times)
     geometric_mean = statistics.geometric_mean(times)
     median = statistics.median(times)
     best = min(times)
-    return ReactionTimeResult(times, mean, geometric_mean, median, best)
+    return ReactionTimeResult(
+        times, mean, geometric_mean, median, best, stop_reason)
 
 
-def reaction_time(driver: "main.ComputerBenchmark") -> ReactionTimeResult:
-    """Performs the reaction time test and returns the result."""
+def reaction_time(
+    driver: "main.ComputerBenchmark", budget: Budget | None = None
+) -> ReactionTimeResult:
+    """
+    Performs the reaction time test and returns the result,
+    stopping early if the budget (by default BUDGET) is used up.
+    """
     log_date_time(log, "Reaction time test started at {} UTC.")
     driver.get_test("reactiontime")
+    tracker = BudgetTracker(driver, BUDGET if budget is None else budget)
+    progress = TestProgress(driver, "reaction_time")
     times = []
     for round_ in range(ROUNDS):
         try:
@@ -50,6 +65,8 @@ def reaction_time(driver: "main.ComputerBenchmark") -> ReactionTimeResult:
             ms = int(driver.wait((By.TAG_NAME, "h1")).text.removesuffix("ms"))
         except Exception:
             log("An error has occurred while performing the test.")
+            progress.error()
+            stop_reason = ERROR
             break
         if round_ == ROUNDS - 1:
             # Cannot directly access 5th, after the last attempt, the
@@ -58,4 +75,12 @@ def reaction_time(driver: "main.ComputerBenchmark") -> ReactionTimeResult:
             ms = ms * ROUNDS - sum(times)
         log(f"Attempt {round_ + 1}: {ms}ms")
         times.append(ms)
-    return get_reaction_time_result(times)
+        progress.round(len(times))
+        if round_ < ROUNDS - 1:
+            stop_reason = tracker.check(len(times))
+            if stop_reason is not None:
+                log(f"Budget used up ({stop_reason}).")
+                break
+    else:
+        stop_reason = COMPLETE
+    return get_reaction_time_result(times, stop_reason)
@@ -0,0 +1,68 @@
+"""
+Recording of test sessions into traces. A trace captures every
+WebDriver command sent and its response (page sources, element text
+and so on), with timings, so the session can be replayed exactly.
+Traces are gzip compressed JSON lines, one line per command.
+"""
+import datetime as dt
+import gzip
+import json
+import pathlib
+import random
+import threading
+from collections import namedtuple
+from timeit import default_timer as timer
+
+
+TRACE_VERSION = 1
+
+
+# Start and seconds are relative to the start of the recording.
+TraceEntry = namedtuple(
+    "TraceEntry", ("command", "params", "response", "start", "seconds"))
+
+
+class Recorder:
+    """Writes the commands of a session into a trace as they happen."""
+
+    def __init__(self, trace_path: pathlib.Path, domain: str) -> None:
+        trace_path = pathlib.Path(trace_path)
+        trace_path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = gzip.open(trace_path, "wt", encoding="utf8")
+        # Commands sent at once may be recorded from several threads.
+        self.lock = threading.Lock()
+        self.start = timer()
+        # Tests may fail at random, so the random state is part of the trace.
+        seed = random.randrange(2 ** 32)
+        random.seed(seed)
+        header = {
+            "version": TRACE_VERSION, "domain": domain, "seed": seed,
+            "recorded_at": dt.datetime.utcnow().isoformat()}
+        self.file.write(f"{json.dumps(header)}\n")
+
+    def record(
+        self, command: str, params: dict, response: dict,
+        start: float, seconds: float
+    ) -> None:
+        """Writes a command, its response and its timing to the trace."""
+        line = json.dumps(
+            [command, params, response,
+                round(start - self.start, 6), round(seconds, 6)],
+            separators=(",", ":"))
+        with self.lock:
+            self.file.write(f"{line}\n")
+
+    def close(self) -> None:
+        """Finishes the trace."""
+        with self.lock:
+            self.file.close()
+
+
+def load_trace(trace_path: pathlib.Path) -> tuple[dict, list[TraceEntry]]:
+    """Returns the header and entries of a trace."""
+    with gzip.open(trace_path, "rt", encoding="utf8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version: {header}")
+        entries = [TraceEntry(*json.loads(line)) for line in f]
+    return header, entries
@@ -0,0 +1,158 @@
+"""
+Repeats a test on one warm browser session until the 95% confidence
+interval of its headline metric is narrow enough, or until a maximum
+number of runs, rather than guessing how many runs are enough.
+The final mean and confidence interval are logged.
+"""
+import argparse
+import math
+from typing import Any, Callable
+
+import main
+import simulation
+import stalls
+import watchdog
+from baseline import METRICS
+from utils import (
+    DATA_FOLDER, get_log_function, log_date_time, logging_disabled)
+
+
+LOG = DATA_FOLDER / "repeat.txt"
+DEFAULT_MAX_RUNS = 50
+# Runs before the interval is trusted to decide whether to stop.
+MIN_RUNS = 5
+# Target width of the interval as a fraction of the mean, by default.
+DEFAULT_RELATIVE_WIDTH = 0.1
+# Two-sided 95% critical values of Student's t, by degrees of freedom,
+# the normal value being close enough beyond the table.
+T_CRITICAL_VALUES = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+Z_CRITICAL_VALUE = 1.960
+
+
+log = get_log_function(LOG)
+
+
+class RunningEstimate:
+    """Mean and variance of a stream of values (Welford's algorithm)."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0
+        # Sum of squared differences from the mean.
+        self.squares = 0
+
+    def add(self, value: float) -> None:
+        """Adds a value to the estimate."""
+        self.count += 1
+        difference = value - self.mean
+        self.mean += difference / self.count
+        self.squares += difference * (value - self.mean)
+
+    @property
+    def standard_deviation(self) -> float:
+        """Sample standard deviation, 0 for fewer than 2 values."""
+        if self.count < 2:
+            return 0
+        return math.sqrt(self.squares / (self.count - 1))
+
+    @property
+    def half_width(self) -> float:
+        """Half the width of the 95% confidence interval of the mean."""
+        if self.count < 2:
+            return math.inf
+        degrees_of_freedom = self.count - 1
+        critical_value = (
+            T_CRITICAL_VALUES[degrees_of_freedom - 1]
+            if degrees_of_freedom <= len(T_CRITICAL_VALUES)
+            else Z_CRITICAL_VALUE)
+        return critical_value * self.standard_deviation / math.sqrt(self.count)
+
+
+def repeat(
+    run_test: Callable[[], Any], test_name: str, max_runs: int,
+    width: float | None, relative_width: float
+) -> RunningEstimate:
+    """
+    Runs a test until the confidence interval of its headline metric is
+    narrower than the width (by default relative to the mean), or until
+    the maximum number of runs, logging the final estimate.
+    """
+    metric = METRICS[test_name][0]
+    estimate = RunningEstimate()
+    log_date_time(log, "Repetition started at {} UTC.")
+    log(f"Test: {test_name} ({metric.name})")
+    stop_reason = "maximum runs"
+    for run in range(1, max_runs + 1):
+        value = metric.get(run_test())
+        if value is None:
+            # Failed runs have no metric and are not counted.
+            log(f"Run {run}: failed")
+            continue
+        estimate.add(value)
+        target_width = (
+            width if width is not None
+            else abs(estimate.mean) * relative_width)
+        log(
+            f"Run {run}: {round(value, 2)} - mean {round(estimate.mean, 2)} "
+            f"+/- {round(estimate.half_width, 2)}")
+        if (
+            estimate.count >= MIN_RUNS
+            and estimate.half_width * 2 <= target_width
+        ):
+            stop_reason = "converged"
+            break
+    log(f"Stopped: {stop_reason}")
+    log(f"Runs counted: {estimate.count}")
+    if estimate.count:
+        log(f"Mean: {round(estimate.mean, 3)}")
+        log(f"Standard deviation: {round(estimate.standard_deviation, 3)}")
+        log(
+            f"95% confidence interval: "
+            f"{round(estimate.mean - estimate.half_width, 3)} to "
+            f"{round(estimate.mean + estimate.half_width, 3)}")
+    return estimate
+
+
+def cli() -> None:
+    """Repeats a test until its metric converges from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("test", choices=METRICS)
+    parser.add_argument("--max-runs", type=int, default=DEFAULT_MAX_RUNS)
+    parser.add_argument(
+        "--width", type=float,
+        help="target width of the interval, in the units of the metric")
+    parser.add_argument(
+        "--relative-width", type=float, default=DEFAULT_RELATIVE_WIDTH,
+        help="target width of the interval as a fraction of the mean")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument(
+        "--simulate", action="store_true",
+        help="run the simulated test instead of the browser")
+    args = parser.parse_args()
+    if args.simulate:
+        driver = simulation.SimulatedBenchmark()
+        simulated_test, _ = simulation.SIMULATED_TESTS[args.test]
+
+        def run_test() -> Any:
+            # Simulated runs are kept out of the logs of the tests.
+            with logging_disabled():
+                return simulated_test(driver)
+
+        repeat(
+            run_test, args.test, args.max_runs, args.width,
+            args.relative_width)
+        return
+    with main.ComputerBenchmark(
+        headless=args.headless, resource_thresholds=watchdog.Thresholds(),
+        stall_slo=stalls.DEFAULT_SLO
+    ) as driver:
+        repeat(
+            getattr(driver, args.test), args.test, args.max_runs,
+            args.width, args.relative_width)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,207 @@
+"""
+Replay of recorded test sessions. The unchanged tests run against a
+driver which answers every command from the trace instead of a browser,
+at the recorded speed or as fast as possible. Useful for reproducing
+misbehaving runs and benchmarking analysis changes on identical inputs.
+"""
+import argparse
+import json
+import pathlib
+import random
+import time
+from contextlib import suppress
+from timeit import default_timer as timer
+from typing import Callable
+
+from selenium.common.exceptions import (
+    NoSuchElementException, TimeoutException)
+from selenium.webdriver import ChromeOptions
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+from selenium.webdriver.remote.webdriver import WebElement
+from selenium.webdriver.support import expected_conditions as EC
+
+import elements
+import main
+from recording import TraceEntry, load_trace
+from transport import CommandMetrics
+from utils import logging_disabled
+
+
+# Number of upcoming trace entries searched for a matching command,
+# since commands sent at once may have been recorded in any order.
+MATCH_WINDOW = 8
+
+
+class ReplayError(Exception):
+    """The tests sent a command which the trace does not contain."""
+    pass
+
+
+class ReplayConnection:
+    """Answers commands from the entries of a trace, in order."""
+
+    def __init__(self, entries: list[TraceEntry], speed: str) -> None:
+        self.entries = entries
+        self.consumed = [False] * len(entries)
+        # Index of the first entry not yet consumed.
+        self.position = 0
+        # Indexes of the consumed entries, in order of consumption.
+        self.history = []
+        self.speed = speed
+        self.replay_start = timer()
+        # Recorded time at the end of the latest consumed command.
+        self.now = 0
+        self.metrics = CommandMetrics()
+        self.recorder = None
+
+    def find(self, command: str, params: dict) -> int | None:
+        """Returns the index of the next entry matching a command."""
+        stop = min(self.position + MATCH_WINDOW, len(self.entries))
+        for i in range(self.position, stop):
+            entry = self.entries[i]
+            if (
+                not self.consumed[i] and entry.command == command
+                and entry.params == params
+            ):
+                return i
+        return None
+
+    def execute(self, command: str, params: dict) -> dict:
+        """Returns the recorded response to a command."""
+        if command == Command.NEW_SESSION:
+            return {"value": {"sessionId": "replay", "capabilities": {}}}
+        # Normalised the same way as the recorded parameters.
+        params = json.loads(json.dumps(
+            {key: value for key, value in params.items()
+                if key != "sessionId"}))
+        i = self.find(command, params)
+        if i is None:
+            if command == Command.QUIT:
+                return {"value": None}
+            raise ReplayError(
+                f"Command {command} {params} diverges from the trace "
+                f"at entry {self.position}.")
+        entry = self.entries[i]
+        self.consumed[i] = True
+        self.history.append(i)
+        while (
+            self.position < len(self.entries)
+            and self.consumed[self.position]
+        ):
+            self.position += 1
+        if self.speed == "recorded":
+            delay = (
+                self.replay_start + entry.start + entry.seconds - timer())
+            if delay > 0:
+                time.sleep(delay)
+        self.now = max(self.now, entry.start + entry.seconds)
+        self.metrics.record(command, entry.seconds)
+        return entry.response
+
+    def pipeline(self, calls: list[Callable]) -> list:
+        """Runs driver calls in order."""
+        return [call() for call in calls]
+
+    def close(self) -> None:
+        pass
+
+
+class ReplayDriver(main.ComputerBenchmark):
+    """Driver replaying a trace, in place of a browser."""
+
+    def __init__(self, trace_path: pathlib.Path, speed: str = "max") -> None:
+        header, entries = load_trace(trace_path)
+        # The same random state as the recording, for identical failures.
+        random.seed(header["seed"])
+        self.first_action_times = []
+        self.prefetch_times = []
+        self.test_loaded = None
+        self.current_test = "home"
+        self.metrics_exporter = None
+        # The words were stored when recorded, so must not be again.
+        self.lexicon = None
+        # Options are required from Selenium 4.10, though unused here.
+        RemoteWebDriver.__init__(
+            self, command_executor=ReplayConnection(entries, speed),
+            options=ChromeOptions())
+        self.domain = header["domain"]
+        self.network_policy = None
+        self.tab_pool = None
+        self.profile = None
+        self.element_cache = elements.ElementCache()
+        # Resources were not recorded, so there is nothing to watch
+        # (the commands of the watchdogs being left out of the trace).
+        self.watchdog = None
+        self.stall_watchdog = None
+
+    def clock(self) -> float:
+        """Recorded time, so timings match the recording exactly."""
+        return self.command_executor.now
+
+    def sleep(self, seconds: float) -> None:
+        """The trace timings already include any sleeping."""
+        pass
+
+    def wait(
+        self, locator: tuple[str, str],
+        timeout: int | float = 15, poll: float = 0.1,
+        until = EC.presence_of_element_located
+    ) -> WebElement:
+        """
+        Waits as the recording did: checking again for as long as the
+        trace shows the recording checking again, else timing out.
+        """
+        condition = until(locator)
+        connection = self.command_executor
+        while True:
+            attempt = len(connection.history)
+            # Like a regular wait, only a missing element is ignored.
+            with suppress(NoSuchElementException):
+                value = condition(self)
+                if value:
+                    return value
+            first = connection.entries[connection.history[attempt]]
+            if connection.find(first.command, first.params) is None:
+                raise TimeoutException(
+                    f"Timed out waiting for {locator} in the recording.")
+
+    def quit(self) -> None:
+        """Ends the replay."""
+        RemoteWebDriver.quit(self)
+
+
+def record(trace_path: pathlib.Path, test_name: str) -> None:
+    """Records a live run of a test into a trace."""
+    with main.ComputerBenchmark(headless=True, record=trace_path) as driver:
+        result = getattr(driver, test_name)()
+    print(result)
+
+
+def replay(trace_path: pathlib.Path, test_name: str, speed: str) -> None:
+    """Replays a test from a trace, outputting the result."""
+    start = timer()
+    with logging_disabled(), ReplayDriver(trace_path, speed) as driver:
+        result = getattr(driver, test_name)()
+    print(result)
+    print(f"Replayed in {round(timer() - start, 3)}s.")
+
+
+def cli() -> None:
+    """Records or replays a test from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("trace", type=pathlib.Path)
+    parser.add_argument("test", choices=main.TEST_PATHS)
+    parser.add_argument(
+        "--speed", choices=("recorded", "max"), default="max",
+        help="replay at the recorded speed or as fast as possible")
+    args = parser.parse_args()
+    if args.mode == "record":
+        record(args.trace, args.test)
+    else:
+        replay(args.trace, args.test, args.speed)
+
+
+if __name__ == "__main__":
+    cli()
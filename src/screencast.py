@@ -0,0 +1,271 @@
+"""
+Frame-based reaction time detection. Rather than polling the DOM for
+the "Click!" text, the frames Chrome paints are streamed over DevTools
+(Page.startScreencast) and the switch from red to green is detected
+with a vectorised colour test on a downsampled region of each frame,
+firing the click straight away. Timestamps of the painted frame, the
+DOM change and the click separate the paint-to-click latency from the
+DOM-to-click latency. Requires NumPy and Pillow, unlike the tests.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import statistics
+import time
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+import main
+import reaction
+from async_runner import DevToolsBenchmark
+from budget import COMPLETE, ERROR
+from metrics import TestProgress
+from standin import StandInServer
+from utils import log_date_time
+
+
+# Every nth pixel of the region in each direction is tested.
+STRIDE = 8
+# Fraction of the tested pixels which must be green.
+GREEN_FRACTION = 0.6
+# How much more green than red and blue a pixel must be, to tell the
+# green of "Click!" from the red of waiting and the blue of the results.
+GREEN_MARGIN = 40
+# Screencast frames are downscaled to at most this size.
+MAX_FRAME_SIZE = 640
+FRAME_QUALITY = 60
+# Seconds to wait for the screen to turn green, and for the result.
+STIMULUS_TIMEOUT = 20
+RESULT_TIMEOUT = 5
+# Finds the coloured area of the test behind its heading, recording
+# when "Click!" appears and when the page receives each click.
+SETUP_FUNCTION = """
+function() {
+    let area = this.querySelector("h1");
+    while (
+        area.parentElement
+        && getComputedStyle(area).backgroundColor === "rgba(0, 0, 0, 0)"
+    ) {
+        area = area.parentElement;
+    }
+    window.reactionTimes = {changes: [], clicks: []};
+    let shown = false;
+    new MutationObserver(() => {
+        const now = performance.timeOrigin + performance.now();
+        const showing = [...this.querySelectorAll("div")].some(
+            div => div.innerText === "Click!");
+        if (showing && !shown) {
+            reactionTimes.changes.push(now);
+        }
+        shown = showing;
+    }).observe(this.body, {childList: true, subtree: true});
+    this.addEventListener(
+        "mousedown",
+        event => reactionTimes.clicks.push(
+            performance.timeOrigin + event.timeStamp),
+        true);
+    const rect = area.getBoundingClientRect();
+    return [rect.left, rect.top, rect.width, rect.height];
+}
+"""
+# Times recorded by the page since the setup.
+TIMES_FUNCTION = "function() { return window.reactionTimes; }"
+# Text of the heading, which shows the result of each attempt.
+HEADING_FUNCTION = """
+function() {
+    const heading = this.querySelector("h1");
+    return heading ? heading.innerText : "";
+}
+"""
+
+
+FrameReactionResult = namedtuple(
+    "FrameReactionResult", ("reaction", "paint_to_click", "dom_to_click"))
+
+
+def is_green(
+    image: np.ndarray, region: tuple[int, int, int, int], stride: int = STRIDE
+) -> bool:
+    """
+    Whether most of a region (left, top, right, bottom) of an RGB image
+    is green, testing every nth pixel at once.
+    """
+    left, top, right, bottom = region
+    pixels = image[top:bottom:stride, left:right:stride].astype(np.int16)
+    if not pixels.size:
+        return False
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    green_pixels = (
+        (green - red > GREEN_MARGIN) & (green - blue > GREEN_MARGIN))
+    return green_pixels.mean() >= GREEN_FRACTION
+
+
+class FrameDetector:
+    """
+    Watches the screencast frames of a page for the area turning green,
+    clicking as soon as it does whilst armed.
+    """
+
+    def __init__(
+        self, driver: DevToolsBenchmark,
+        area: tuple[float, float, float, float]
+    ) -> None:
+        self.page = driver.page
+        self.area = area
+        left, top, width, height = area
+        self.click_point = (left + width / 2, top + height / 2)
+        self.armed = False
+        self.clicked = None
+        # Timestamp (ms since the epoch) of the frame which was clicked.
+        self.frame_time = None
+
+    def arm(self) -> asyncio.Future:
+        """Clicks on the next green frame, resolving the future once sent."""
+        self.clicked = asyncio.get_running_loop().create_future()
+        self.armed = True
+        return self.clicked
+
+    def get_region(
+        self, image: np.ndarray, metadata: dict
+    ) -> tuple[int, int, int, int]:
+        """Region of the area in a frame, which may be downscaled."""
+        scale = image.shape[1] / metadata["deviceWidth"]
+        left, top, width, height = self.area
+        top += metadata.get("offsetTop", 0)
+        return (
+            max(int(left * scale), 0), max(int(top * scale), 0),
+            int((left + width) * scale), int((top + height) * scale))
+
+    def on_frame(self, params: dict, session_id: str | None) -> None:
+        """Acknowledges a frame, checking it for green if armed."""
+        if session_id != self.page.session_id:
+            return
+        asyncio.create_task(self.page.send(
+            "Page.screencastFrameAck", {"sessionId": params["sessionId"]}))
+        if not self.armed:
+            return
+        image = np.asarray(Image.open(
+            io.BytesIO(base64.b64decode(params["data"]))).convert("RGB"))
+        metadata = params["metadata"]
+        if not is_green(image, self.get_region(image, metadata)):
+            return
+        self.armed = False
+        # Frames without a timestamp are taken to be painted just now.
+        self.frame_time = metadata.get("timestamp", time.time()) * 1000
+        click = asyncio.create_task(self.page.click_at(*self.click_point))
+        click.add_done_callback(
+            lambda _: self.clicked.done() or self.clicked.set_result(None))
+
+    async def start(self) -> None:
+        """Starts the screencast."""
+        self.page.connection.on("Page.screencastFrame", self.on_frame)
+        await self.page.send("Page.startScreencast", {
+            "format": "jpeg", "quality": FRAME_QUALITY,
+            "maxWidth": MAX_FRAME_SIZE, "maxHeight": MAX_FRAME_SIZE})
+
+    async def stop(self) -> None:
+        """Stops the screencast."""
+        await self.page.send("Page.stopScreencast")
+        self.page.connection.off("Page.screencastFrame", self.on_frame)
+
+
+async def wait_for_result(driver: DevToolsBenchmark) -> int:
+    """Waits for the heading to show the milliseconds of an attempt."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + RESULT_TIMEOUT
+    while loop.time() < deadline:
+        heading = await driver.page.call(None, HEADING_FUNCTION)
+        if heading.endswith("ms"):
+            return int(heading.removesuffix("ms"))
+        await asyncio.sleep(0.01)
+    raise TimeoutError("No result shown.")
+
+
+async def frame_reaction_time(
+    driver: DevToolsBenchmark
+) -> FrameReactionResult:
+    """
+    Performs the reaction time test by watching the frames painted,
+    returning the result along with the paint-to-click and DOM-to-click
+    milliseconds of each attempt.
+    """
+    page = driver.page
+    log_date_time(
+        reaction.log, "Reaction time test (frames) started at {} UTC.")
+    await page.navigate(f"{driver.domain}/tests/reactiontime")
+    progress = TestProgress(driver, "reaction_time")
+    area = await page.call(None, SETUP_FUNCTION)
+    detector = FrameDetector(driver, area)
+    await detector.start()
+    times = []
+    paint_to_click = []
+    dom_to_click = []
+    try:
+        for round_ in range(reaction.ROUNDS):
+            clicked = detector.arm()
+            try:
+                # Starts the attempt, the screen turning red until green.
+                await page.click_at(*detector.click_point)
+                await asyncio.wait_for(clicked, STIMULUS_TIMEOUT)
+                ms = await wait_for_result(driver)
+                recorded = await page.call(None, TIMES_FUNCTION)
+            except Exception:
+                reaction.log(
+                    "An error has occurred while performing the test.")
+                progress.error()
+                stop_reason = ERROR
+                break
+            if round_ == reaction.ROUNDS - 1:
+                # The mean of all attempts is shown after the last.
+                ms = ms * reaction.ROUNDS - sum(times)
+            page_click = recorded["clicks"][-1]
+            paint_to_click.append(page_click - detector.frame_time)
+            dom_to_click.append(page_click - recorded["changes"][-1])
+            reaction.log(f"Attempt {round_ + 1}: {ms}ms")
+            reaction.log(
+                f"Paint to click: {round(paint_to_click[-1], 1)}ms, "
+                f"DOM to click: {round(dom_to_click[-1], 1)}ms")
+            times.append(ms)
+            progress.round(len(times))
+        else:
+            stop_reason = COMPLETE
+    finally:
+        await detector.stop()
+    return FrameReactionResult(
+        reaction.get_reaction_time_result(times, stop_reason),
+        paint_to_click, dom_to_click)
+
+
+def cli() -> None:
+    """Runs the reaction time test by frames from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument(
+        "--stand-in", action="store_true",
+        help="run against the local stand-in rather than the real site")
+    args = parser.parse_args()
+    if args.stand_in:
+        with (
+            StandInServer() as server,
+            DevToolsBenchmark(args.headless, server.domain) as driver
+        ):
+            result = driver.run(frame_reaction_time(driver))
+    else:
+        with DevToolsBenchmark(args.headless, main.DOMAIN) as driver:
+            result = driver.run(frame_reaction_time(driver))
+    if not result.paint_to_click:
+        return
+    reaction.log(f"Mean: {result.reaction.mean}ms")
+    reaction.log(
+        "Mean paint to click: "
+        f"{round(statistics.mean(result.paint_to_click), 1)}ms")
+    reaction.log(
+        "Mean DOM to click: "
+        f"{round(statistics.mean(result.dom_to_click), 1)}ms")
+
+
+if __name__ == "__main__":
+    cli()
@@ -3,16 +3,16 @@ Sequence test. Who has better sequential memory, you or your computer?
 This test will find out!
 For the computer, headless is overpowered, with window is a bit bad!
 """
-import random
-import time
 from collections import namedtuple
-from timeit import default_timer as timer
 
 import lxml
 from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 
 import main
+from budget import (
+    ERROR, GAME_OVER, RANDOM_FAILURE, Budget, BudgetTracker)
+from metrics import TestProgress
 from utils import DATA_FOLDER, get_log_function, log_date_time
 
 
@@ -22,17 +22,86 @@ INITIAL_DELAY = 1.25
 # the squares as they appear.
 DELAY_BETWEEN_SQUARES = 0.5
 LOG = DATA_FOLDER / "sequence.txt"
-# Random chance of failure to avoid potentially going on forever.
+# Chance of failing each level, if failing at random.
 FAILURE_RATE = 0.03
+# Stops at the level a 3% failure rate reaches on average by default.
+BUDGET = Budget(target=35)
+# "prefix" records the flashes in the page, only checking the replayed
+# squares against the previous level and watching for the new square.
+# "full" scans the whole board for every square of every level.
+CAPTURE_MODE = "prefix"
+# Seconds between checks whilst the previous sequence is being replayed.
+PREFIX_POLL_INTERVAL = 0.25
+# Seconds between checks whilst waiting for the new square.
+FINAL_POLL_INTERVAL = 0.01
+# Seconds without a new flash after which a square is considered missed.
+FLASH_TIMEOUT = 5
+# Levels and flash interval in seconds of the capture mode benchmark.
+BENCHMARK_LEVELS = 200
+BENCHMARK_FLASH_INTERVAL = 0.05
+BENCHMARK_REPORT_EVERY = 20
+# Records the index of each square as it starts flashing, from whenever
+# it is run, until paused. Running it again clears the recorded flashes.
+OBSERVE_SCRIPT = """
+if (!window.sequenceObserver) {
+    window.sequenceObserver = new MutationObserver(mutations => {
+        if (!window.sequenceRecording) {
+            return;
+        }
+        const squares = [...document.querySelectorAll(".squares .square")];
+        for (const mutation of mutations) {
+            const square = mutation.target;
+            if (
+                square.classList.contains("active")
+                && !/\\bactive\\b/.test(mutation.oldValue || "")
+            ) {
+                window.sequenceFlashes.push(squares.indexOf(square));
+            }
+        }
+    });
+    window.sequenceObserver.observe(document.querySelector(".squares"), {
+        attributes: true, attributeFilter: ["class"],
+        attributeOldValue: true, subtree: true
+    });
+}
+window.sequenceFlashes = [];
+window.sequenceRecording = true;
+"""
+PAUSE_SCRIPT = "window.sequenceRecording = false;"
+# The recorded flashes and whether a square is still flashing.
+POLL_SCRIPT = """
+return [
+    window.sequenceFlashes,
+    document.querySelector(".squares .active") !== null];
+"""
 
 
 SequenceResult = namedtuple(
     "SequenceResult",
-    ("final_sequence", "score", "longest_sub_sequence")
+    ("final_sequence", "score", "longest_sub_sequence", "level_seconds",
+    "stop_reason"),
+    defaults=(None,)
 )
 log = get_log_function(LOG)
 
 
+def find_duplicate_subarray(
+    array: tuple[int], length: int
+) -> tuple[int] | None:
+    """
+    Returns the first sub-array of a given length to appear for
+    a second time in the array, or None if there is no such sub-array.
+    """
+    # Stores seen subarrays for the given length.
+    seen = set()
+    for start_index in range(len(array) - length + 1):
+        sub_array = array[start_index:start_index+length]
+        if sub_array in seen:
+            return sub_array
+        seen.add(sub_array)
+    return None
+
+
 def longest_duplicate_subarray(array: list[int]) -> list[int]:
     """
     Returns the longest sub-array that appears more than once in the array.
@@ -41,69 +110,218 @@ def longest_duplicate_subarray(array: list[int]) -> list[int]:
     """
     # Converts to tuple right away for hashing purposes.
     array = tuple(array)
-    # Tries lengths from largest to smallest.
-    for length in range(len(array) - 1, 0, -1):
-        # Stores seen subarrays for the given length.
-        seen = set()
-        for start_index in range(len(array) - length + 1):
-            sub_array = array[start_index:start_index+length]
-            if sub_array in seen:
-                return list(sub_array)
-            seen.add(sub_array)
-    return []
-
-
-def get_sequence_result(final_sequence: list[int]) -> SequenceResult:
+    # Any duplicate sub-array has duplicate prefixes of every shorter
+    # length, so the longest length can be searched for rather than
+    # trying every length from the largest down. Since it is usually
+    # short, lengths are doubled until there is no duplicate, then
+    # binary searched, keeping the sub-arrays hashed short too.
+    low = 0
+    high = len(array) - 1
+    length = 1
+    while length <= high:
+        if find_duplicate_subarray(array, length) is None:
+            high = length - 1
+            break
+        low = length
+        length *= 2
+    while low < high:
+        length = (low + high + 1) // 2
+        if find_duplicate_subarray(array, length) is None:
+            high = length - 1
+        else:
+            low = length
+    if not low:
+        return []
+    return list(find_duplicate_subarray(array, low))
+
+
+def get_sequence_result(
+    final_sequence: list[int], level_seconds: list[float] = (),
+    stop_reason: str | None = None
+) -> SequenceResult:
     """Generates the sequence result."""
     score = len(final_sequence)
     longest_sub_sequence = longest_duplicate_subarray(final_sequence)
-    return SequenceResult(final_sequence, score, longest_sub_sequence)
+    return SequenceResult(
+        final_sequence, score, longest_sub_sequence, list(level_seconds),
+        stop_reason)
 
 
-def sequence(driver: "main.ComputerBenchmark") -> SequenceResult:
-    """Performs the sequence test and returns the result."""
+def capture_full(
+    driver: "main.ComputerBenchmark", level: int,
+    initial_delay: float = INITIAL_DELAY,
+    delay_between_squares: float = DELAY_BETWEEN_SQUARES
+) -> list[int]:
+    """
+    Captures the sequence of a level by scanning the whole board for
+    every square of the sequence as it appears.
+    Returns None if a square is missed.
+    """
+    sequence = []
+    driver.sleep(initial_delay)
+    for _ in range(level):
+        start = driver.clock()
+        soup = BeautifulSoup(driver.page_source, "lxml")
+        squares = soup.find(class_="squares")
+        for i, square in enumerate(squares.find_all(class_="square")):
+            if "active" in square["class"]:
+                sequence.append(i)
+                stop = driver.clock()
+                # Ensures 0.5s pretty much exactly between checking
+                # each square appearing in the sequence. This includes
+                # the processing time beforehand, to avoid a delay
+                # of greater than 0.5s overall, since the BeautifulSoup
+                # processing takes a few milliseconds, which matters...
+                driver.sleep(delay_between_squares - (stop - start))
+                break
+        else:
+            return None
+    return sequence
+
+
+def capture_prefix(
+    driver: "main.ComputerBenchmark", level: int,
+    previous_sequence: list[int]
+) -> tuple[list[int], bool] | None:
+    """
+    Captures the sequence of a level from the flashes recorded in the
+    page, only checking the replayed squares against the previous
+    sequence, then watching closely for the one new square.
+    Returns the sequence and whether the replay diverged from the
+    previous sequence, or None if the squares stop flashing.
+    """
+    last_flash = driver.clock()
+    seen = 0
+    while True:
+        flashes, active = driver.execute_script(POLL_SCRIPT)
+        if len(flashes) > seen:
+            seen = len(flashes)
+            last_flash = driver.clock()
+        elif driver.clock() - last_flash > FLASH_TIMEOUT:
+            return None
+        replayed = flashes[:level-1]
+        if replayed != previous_sequence[:len(replayed)]:
+            # Possibly a stray flash, so only the latest flashes count.
+            if len(flashes) >= level and not active:
+                return flashes[-level:], True
+        elif len(flashes) >= level and not active:
+            return flashes[:level], False
+        driver.sleep(
+            PREFIX_POLL_INTERVAL if len(flashes) < level - 1
+            else FINAL_POLL_INTERVAL)
+
+
+def sequence(
+    driver: "main.ComputerBenchmark", budget: Budget | None = None,
+    capture_mode: str = CAPTURE_MODE, initial_delay: float = INITIAL_DELAY,
+    delay_between_squares: float = DELAY_BETWEEN_SQUARES
+) -> SequenceResult:
+    """
+    Performs the sequence test and returns the result,
+    stopping once the budget (by default BUDGET) is used up.
+    The delays time the scans of full capture to the flashes.
+    """
     log_date_time(log, "Sequence memory test started at {} UTC.")
     driver.get_test("sequence")
+    tracker = BudgetTracker(driver, BUDGET if budget is None else budget)
+    progress = TestProgress(driver, "sequence")
     driver.click_start()
+    if capture_mode == "prefix":
+        driver.wait((By.CLASS_NAME, "squares"))
+        driver.execute_script(OBSERVE_SCRIPT)
     level = 1
     # Track previous sequence to output it as the final result
     # (the last successful sequence).
     previous_sequence = []
+    level_seconds = []
     while True:
-        sequence = []
-        time.sleep(INITIAL_DELAY)
-        for _ in range(level):
-            start = timer()
-            try:
-                soup = BeautifulSoup(driver.page_source, "lxml")
-                squares = soup.find(class_="squares")
-                for i, square in enumerate(squares.find_all(class_="square")):
-                    if "active" in square["class"]:
-                        sequence.append(i)
-                        stop = timer()
-                        # Ensures 0.5s pretty much exactly between checking
-                        # each square appearing in the sequence. This includes
-                        # the processing time beforehand, to avoid a delay
-                        # of greater than 0.5s overall, since the BeautifulSoup
-                        # processing takes a few milliseconds, which matters...
-                        time.sleep(DELAY_BETWEEN_SQUARES - (stop - start))
-                        break
+        level_start = driver.clock()
+        try:
+            if capture_mode == "prefix":
+                captured = capture_prefix(driver, level, previous_sequence)
+                if captured is not None:
+                    sequence, diverged = captured
+                    if diverged:
+                        log("Sequence diverged - using full capture.")
+                        capture_mode = "full"
                 else:
-                    # Missed a square - in big trouble - surrender!
-                    log("Missed a square - game over.")
-                    return get_sequence_result(previous_sequence)
-            except Exception:
-                print("An error has occurred while performing the test.")
-                return get_sequence_result(previous_sequence)
+                    sequence = None
+            else:
+                sequence = capture_full(
+                    driver, level, initial_delay, delay_between_squares)
+            if sequence is None:
+                # Missed a square - in big trouble - surrender!
+                log("Missed a square - game over.")
+                return get_sequence_result(
+                    previous_sequence, level_seconds, GAME_OVER)
+        except Exception:
+            print("An error has occurred while performing the test.")
+            progress.error()
+            return get_sequence_result(
+                previous_sequence, level_seconds, ERROR)
         log(f"Level {level}: {sequence}")
         try:
+            if capture_mode == "prefix":
+                # Clicked squares flash too, which must not be recorded.
+                driver.execute_script(PAUSE_SCRIPT)
             for i in sequence:
-                driver.find_elements(By.CLASS_NAME, "square")[i].click()
+                driver.use_cached(
+                    (By.CLASS_NAME, "square"),
+                    lambda squares: squares[i].click(), many=True)
+            if capture_mode == "prefix":
+                driver.execute_script(OBSERVE_SCRIPT)
         except Exception:
             log("Error while clicking!")
-            return get_sequence_result(previous_sequence)
-        level += 1
+            progress.error()
+            return get_sequence_result(
+                previous_sequence, level_seconds, ERROR)
+        level_seconds.append(driver.clock() - level_start)
+        progress.round(level)
         previous_sequence = sequence
-        if random.random() < FAILURE_RATE:
-            log("Random failure activated to avoid going on forever.")
-            return get_sequence_result(previous_sequence)
+        stop_reason = tracker.check(level)
+        if stop_reason is not None:
+            log(f"Budget used up ({stop_reason}).")
+            return get_sequence_result(
+                previous_sequence, level_seconds, stop_reason)
+        level += 1
+        if tracker.random_failure(FAILURE_RATE):
+            log("Random failure activated.")
+            return get_sequence_result(
+                previous_sequence, level_seconds, RANDOM_FAILURE)
+
+
+def compare_capture_modes(
+    levels: int = BENCHMARK_LEVELS,
+    flash_interval: float = BENCHMARK_FLASH_INTERVAL
+) -> None:
+    """
+    Plays levels 1 to the given level of a stand-in sequence test
+    flashing at a given interval, in each capture mode,
+    outputting the levels reached and the time taken per level.
+    """
+    # Imported here, as these modules import this one through main.
+    import network
+    import standin
+    # Scans timed for the stand-in, in the middle of each flash.
+    initial_delay = (
+        standin.LEVEL_DELAY + flash_interval * standin.FLASH_DURATION / 2)
+    with standin.StandInServer(flash_interval=flash_interval) as server:
+        for capture_mode in ("full", "prefix"):
+            with main.ComputerBenchmark(
+                headless=True, domain=server.domain,
+                network_policy=network.NetworkPolicy(
+                    allowed_hosts=("127.0.0.1",)),
+                eager_load=True
+            ) as driver:
+                result = sequence(
+                    driver, Budget(target=levels), capture_mode,
+                    initial_delay, flash_interval)
+            print(f"{capture_mode.capitalize()} capture:")
+            print(f"Levels completed: {result.score}/{levels}")
+            for level, seconds in enumerate(result.level_seconds, 1):
+                if level % BENCHMARK_REPORT_EVERY == 0 or level == 1:
+                    print(f"Level {level} - {round(seconds, 3)}s")
+
+
+if __name__ == "__main__":
+    compare_capture_modes()
@@ -0,0 +1,864 @@
+"""
+In-process simulation of the eight tests, following the same driver
+protocol the test modules use, but with seeded random games and no
+browser or network. Time is simulated too: sleeping and waiting skip
+ahead instantly, so the tests run as fast as the Python allows.
+Useful for regression testing and profiling the pure Python parts.
+"""
+import argparse
+import cProfile
+import html
+import math
+import pstats
+import random
+import re
+import string
+from collections import namedtuple
+from timeit import default_timer as timer
+from typing import Any, Callable, Iterator
+
+from selenium.common.exceptions import (
+    NoSuchElementException, TimeoutException)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+import aim
+import chimp
+import number
+import reaction
+import sequence
+import typing_
+import verbal
+import visual
+from utils import logging_disabled
+
+
+# Number of distinct words the simulated verbal memory test draws from.
+LEXICON_SIZE = 2000
+# Chance of the verbal memory test showing an already seen word.
+SEEN_CHANCE = 0.5
+# Seconds taken to type each character in the typing test.
+SECONDS_PER_KEY = 0.002
+# Seconds each command to the driver takes, as with a fast browser.
+SECONDS_PER_COMMAND = 0.001
+# Sequence memory: seconds into a level of the first flash, seconds
+# between the start of each flash, and seconds each flash lasts.
+FLASH_START = 1
+FLASH_INTERVAL = 0.5
+FLASH_DURATION = 0.45
+# Visual memory: seconds into a level the pattern is shown and hidden.
+REVEAL_START = 0.25
+REVEAL_STOP = 1.75
+# Seconds between completing a level and the next level starting.
+LEVEL_TRANSITION = 1
+# Number memory: base seconds the number is shown for, plus per digit.
+NUMBER_SHOW_SECONDS = 1
+NUMBER_SHOW_SECONDS_PER_DIGIT = 0.5
+CHIMP_ROWS = 5
+CHIMP_COLUMNS = 8
+# Bounds of the aim trainer play area in pixels.
+AIM_WIDTH = 1200
+AIM_HEIGHT = 700
+XPATH_REGEX = re.compile(r"//(\w+)(?:\[(text\(\)|@[\w-]+)='(.*)'\])?")
+
+
+SimulationResult = namedtuple(
+    "SimulationResult", ("games", "rounds", "seconds", "rounds_per_second"))
+
+
+class SimulatedElement:
+    """
+    Element of a simulated page. The attributes, text and children
+    may be functions, evaluated on access, so the page can be live.
+    """
+
+    def __init__(
+        self, tag: str, attributes: dict[str, str | Callable] = None,
+        text: str | Callable = "", children: list | Callable = (),
+        on_click: Callable = None, on_keys: Callable = None
+    ) -> None:
+        self.tag = tag
+        self.attributes = attributes or {}
+        self._text = text
+        self._children = children
+        self.on_click = on_click
+        self.on_keys = on_keys
+        self.parent = None
+
+    @property
+    def children(self) -> list["SimulatedElement"]:
+        """The current child elements."""
+        children = (
+            self._children() if callable(self._children) else self._children)
+        for child in children:
+            child.parent = self
+        return children
+
+    @property
+    def text(self) -> str:
+        """Visible text of the element, including of its children."""
+        text = self._text() if callable(self._text) else self._text
+        texts = [text] if text else []
+        texts.extend(child.text for child in self.children if child.text)
+        return "\n".join(texts)
+
+    def get_attribute(self, name: str) -> str | None:
+        """Returns an attribute, or None if not present."""
+        value = self.attributes.get(name)
+        return value() if callable(value) else value
+
+    def click(self) -> None:
+        """Clicks the element, the click bubbling up to its ancestors."""
+        element = self
+        while element is not None:
+            if element.on_click is not None:
+                element.on_click()
+                return
+            element = element.parent
+
+    def send_keys(self, *values: str) -> None:
+        """Types into the element."""
+        if self.on_keys is not None:
+            self.on_keys("".join(values))
+
+    def descendants(self) -> Iterator["SimulatedElement"]:
+        """Yields all descendants in document order."""
+        for child in self.children:
+            yield child
+            yield from child.descendants()
+
+    def find_elements(self, by: str, value: str) -> list["SimulatedElement"]:
+        """Finds descendants by a locator."""
+        return locate(self, by, value)
+
+    def find_element(self, by: str, value: str) -> "SimulatedElement":
+        """Finds the first descendant by a locator."""
+        elements = locate(self, by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element: {by} {value}")
+        return elements[0]
+
+    def to_html(self) -> str:
+        """Serialises the element and its children into HTML."""
+        attributes = "".join(
+            f' {name}="{html.escape(str(value))}"'
+            for name in self.attributes
+            if (value := self.get_attribute(name)) is not None)
+        text = self._text() if callable(self._text) else self._text
+        inner = "".join(child.to_html() for child in self.children)
+        return (
+            f"<{self.tag}{attributes}>{html.escape(text)}{inner}"
+            f"</{self.tag}>")
+
+
+def locate(
+    root: SimulatedElement, by: str, value: str
+) -> list[SimulatedElement]:
+    """Finds the descendants of an element matching a locator."""
+    if by == By.XPATH and value == "..":
+        return [root.parent] if root.parent is not None else []
+    if by == By.CLASS_NAME:
+        class_name = value.strip()
+        return [
+            element for element in root.descendants()
+            if class_name in (element.get_attribute("class") or "").split()]
+    if by == By.TAG_NAME:
+        return [
+            element for element in root.descendants() if element.tag == value]
+    if by == By.CSS_SELECTOR:
+        # Only a class or tag followed by child tags, e.g. ".grid > div".
+        first, *child_tags = value.split(" > ")
+        elements = (
+            locate(root, By.CLASS_NAME, first[1:]) if first.startswith(".")
+            else locate(root, By.TAG_NAME, first))
+        for tag in child_tags:
+            elements = [
+                child for element in elements for child in element.children
+                if child.tag == tag]
+        return elements
+    if by == By.XPATH and (match := XPATH_REGEX.fullmatch(value)):
+        tag, key, expected = match.groups()
+        elements = [
+            element for element in root.descendants() if element.tag == tag]
+        if key == "text()":
+            text = lambda element: (
+                element._text() if callable(element._text)
+                else element._text)
+            return [
+                element for element in elements
+                if text(element) == expected]
+        if key is not None:
+            return [
+                element for element in elements
+                if element.get_attribute(key[1:]) == expected]
+        return elements
+    raise ValueError(f"Unsupported locator: {by} {value}")
+
+
+def page(*content: SimulatedElement | Callable) -> SimulatedElement:
+    """Wraps content (or a function returning it) into a full page."""
+    children = content[0] if content and callable(content[0]) else content
+    body = SimulatedElement("body", children=children, on_keys=lambda _: None)
+    return SimulatedElement("html", children=[body])
+
+
+def button(text: str, on_click: Callable) -> SimulatedElement:
+    """Creates a button with given text."""
+    return SimulatedElement("button", text=text, on_click=on_click)
+
+
+def random_word(rng: random.Random) -> str:
+    """Generates a random pronounceable word."""
+    syllables = rng.randint(1, 4)
+    return "".join(
+        rng.choice("bcdfghjklmnprstvwz") + rng.choice("aeiou")
+        + rng.choice(("", "", "n", "r", "s", "t"))
+        for _ in range(syllables))
+
+
+class Game:
+    """Base simulated game, with the page and clock."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        self.rng = rng
+        self.clock = clock
+        self.root = page()
+        # Handlers of the scripts the tests run on the page, by script.
+        self.scripts: dict[str, Callable] = {}
+
+    def next_event(self) -> float | None:
+        """Time of the next change to the page by itself, if any."""
+        return None
+
+
+class ReactionGame(Game):
+    """Click when the screen turns green."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        super().__init__(rng, clock)
+        self.state = "idle"
+        self.message = "Reaction Time Test"
+        self.green_at = None
+        self.times = []
+        screen = SimulatedElement(
+            "div", {"class": "view"}, children=self.render,
+            on_click=self.click)
+        self.root = page(screen)
+
+    def update(self) -> None:
+        """Turns the screen green once the delay is over."""
+        if self.state == "waiting" and self.clock() >= self.green_at:
+            self.state = "ready"
+
+    def render(self) -> list[SimulatedElement]:
+        """Returns the current content of the screen."""
+        self.update()
+        if self.state == "waiting":
+            return [SimulatedElement("div", text="Wait for green")]
+        if self.state == "ready":
+            return [SimulatedElement("div", text="Click!")]
+        return [SimulatedElement("h1", text=self.message)]
+
+    def click(self) -> None:
+        """Handles a click anywhere on the screen."""
+        self.update()
+        if self.state == "waiting":
+            self.state = "idle"
+            self.message = "Too soon!"
+        elif self.state == "ready":
+            ms = round((self.clock() - self.green_at) * 1000)
+            self.times.append(ms)
+            if len(self.times) == reaction.ROUNDS:
+                ms = round(sum(self.times) / reaction.ROUNDS)
+            self.state = "idle"
+            self.message = f"{ms}ms"
+        else:
+            self.state = "waiting"
+            self.green_at = self.clock() + self.rng.uniform(1, 3)
+
+    def next_event(self) -> float | None:
+        return self.green_at if self.state == "waiting" else None
+
+
+class SequenceGame(Game):
+    """Repeat the growing sequence of squares flashing on a 3x3 board."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        super().__init__(rng, clock)
+        self.started = False
+        self.over = False
+        self.sequence = [rng.randrange(9)]
+        self.level_start = None
+        self.clicked = 0
+        squares = [
+            SimulatedElement(
+                "div", {"class": lambda i=i: self.square_class(i)},
+                on_click=lambda i=i: self.click(i))
+            for i in range(9)]
+        rows = [
+            SimulatedElement(
+                "div", {"class": "square-row"}, children=squares[i:i+3])
+            for i in range(0, 9, 3)]
+        board = SimulatedElement("div", {"class": "squares"}, children=rows)
+        self.root = page(lambda: [board] if self.started else [
+            button("Start", self.start)])
+        # Clicked squares do not flash, so only the level's flashes count.
+        self.scripts = {
+            sequence.OBSERVE_SCRIPT: lambda: None,
+            sequence.PAUSE_SCRIPT: lambda: None,
+            sequence.POLL_SCRIPT: lambda: [
+                self.sequence[:self.flashed()], self.flashing() is not None]
+        }
+
+    def start(self) -> None:
+        """Starts the first level."""
+        self.started = True
+        self.level_start = self.clock()
+
+    def flashing(self) -> int | None:
+        """Returns the square currently flashing, if any."""
+        if not self.started or self.over:
+            return None
+        elapsed = self.clock() - self.level_start - FLASH_START
+        step = math.floor(elapsed / FLASH_INTERVAL)
+        if (
+            0 <= step < len(self.sequence)
+            and elapsed - step * FLASH_INTERVAL < FLASH_DURATION
+        ):
+            return self.sequence[step]
+        return None
+
+    def flashed(self) -> int:
+        """Returns the number of squares which have started flashing."""
+        if not self.started or self.over:
+            return 0
+        elapsed = self.clock() - self.level_start - FLASH_START
+        return max(min(
+            math.floor(elapsed / FLASH_INTERVAL) + 1, len(self.sequence)), 0)
+
+    def square_class(self, i: int) -> str:
+        """Class of a square, active if flashing."""
+        return "square active" if self.flashing() == i else "square"
+
+    def click(self, i: int) -> None:
+        """Handles a click on a square."""
+        if self.over:
+            return
+        if self.sequence[self.clicked] != i:
+            self.over = True
+            return
+        self.clicked += 1
+        if self.clicked == len(self.sequence):
+            self.sequence.append(self.rng.randrange(9))
+            self.clicked = 0
+            self.level_start = self.clock()
+
+
+class ChimpGame(Game):
+    """Click the numbers in ascending order once they are hidden."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        super().__init__(rng, clock)
+        self.state = "start"
+        self.numbers = chimp.MIN_NUMBERS
+        self.strikes = 0
+        self.next_number = 1
+        self.rows = []
+        self.root = page(self.render)
+
+    def new_level(self) -> None:
+        """Places the numbers randomly on the grid."""
+        cells = CHIMP_ROWS * CHIMP_COLUMNS
+        positions = self.rng.sample(range(cells), self.numbers)
+        numbers = {
+            position: number
+            for number, position in enumerate(positions, 1)}
+        self.rows = [
+            SimulatedElement(
+                "div", {"class": "css-k008qs"}, children=[
+                    self.cell(numbers.get(row * CHIMP_COLUMNS + column))
+                    for column in range(CHIMP_COLUMNS)])
+            for row in range(CHIMP_ROWS)]
+        self.next_number = 1
+        self.state = "playing"
+
+    def cell(self, number: int | None) -> SimulatedElement:
+        """Creates a grid cell, which may have a number."""
+        if number is None:
+            return SimulatedElement("div", {"class": "css-19b5rdt"})
+        return SimulatedElement(
+            "div", {"class": "css-19b5rdt", "data-cellnumber": str(number)},
+            on_click=lambda: self.click(number))
+
+    def render(self) -> list[SimulatedElement]:
+        """Returns the current content of the page."""
+        if self.state == "start":
+            return [button("Start Test", self.new_level)]
+        if self.state == "playing":
+            return self.rows
+        if self.state == "continue":
+            return [button("Continue", self.continue_)]
+        return [SimulatedElement("h1", text="Save score")]
+
+    def click(self, number: int) -> None:
+        """Handles a click on a numbered square."""
+        if self.state != "playing":
+            return
+        if number != self.next_number:
+            self.strikes += 1
+            self.state = "over" if self.strikes == 3 else "continue"
+            return
+        self.next_number += 1
+        if self.next_number > self.numbers:
+            self.state = (
+                "over" if self.numbers == chimp.MAX_NUMBERS else "continue")
+
+    def continue_(self) -> None:
+        """Moves onto the next level."""
+        if self.next_number > self.numbers:
+            self.numbers += 1
+        self.new_level()
+
+
+class AimGame(Game):
+    """Click the targets as they appear."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        super().__init__(rng, clock)
+        self.remaining = aim.TARGETS
+        self.started = False
+        self.target = self.new_target()
+        self.root = page(self.render)
+
+    def new_target(self) -> SimulatedElement:
+        """Creates a target at a random position."""
+        x = self.rng.uniform(aim.RADIUS, AIM_WIDTH - aim.RADIUS)
+        y = self.rng.uniform(aim.RADIUS, AIM_HEIGHT - aim.RADIUS)
+        target = SimulatedElement(
+            "div", {"data-aim-target": "true"}, children=[
+                SimulatedElement("div", {"class": "e6yfngs4"})
+                for _ in range(3)],
+            on_click=self.click)
+        return SimulatedElement(
+            "div", {"style": (
+                "transform: matrix3d(1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, "
+                f"{x:.3f}, {y:.3f}, 0, 1);")},
+            children=[target])
+
+    def render(self) -> list[SimulatedElement]:
+        """Returns the current content of the page."""
+        if not self.remaining:
+            return [SimulatedElement("h1", text="Average time per target")]
+        return [
+            SimulatedElement(
+                "div", {"class": "css-dd6wi1"},
+                text=f"Remaining{self.remaining}"),
+            self.target]
+
+    def click(self) -> None:
+        """Handles a target being hit."""
+        if self.started:
+            self.remaining -= 1
+        self.started = True
+        self.target = self.new_target()
+
+
+class TypingGame(Game):
+    """Type out the passage."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        super().__init__(rng, clock)
+        self.passage = self.new_passage()
+        self.words_per_min = None
+        letters = SimulatedElement(
+            "div", {"class": "letters"}, text=self.passage,
+            on_keys=self.type)
+        self.root = page(lambda: [letters] if self.words_per_min is None else [
+            SimulatedElement("h1", text=f"{self.words_per_min}wpm")])
+
+    def new_passage(self) -> str:
+        """Generates a random passage of a few sentences."""
+        sentences = []
+        for _ in range(self.rng.randint(2, 5)):
+            words = [
+                random_word(self.rng)
+                for _ in range(self.rng.randint(5, 15))]
+            for i in range(len(words) - 1):
+                if self.rng.random() < 0.1:
+                    words[i] += self.rng.choice((",", ";", ":"))
+            sentence = " ".join(words).capitalize()
+            sentences.append(sentence + self.rng.choice(".....!?"))
+        return " ".join(sentences)
+
+    def type(self, text: str) -> None:
+        """Handles text being typed into the passage."""
+        if text != self.passage:
+            return
+        minutes = len(text) * SECONDS_PER_KEY / 60
+        # Standard definition of a word: 5 characters.
+        self.words_per_min = round(len(text) / 5 / minutes)
+
+
+class VerbalGame(Game):
+    """Identify whether each word has been seen before or is new."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        super().__init__(rng, clock)
+        lexicon = {random_word(rng) for _ in range(LEXICON_SIZE)}
+        self.unseen = sorted(lexicon)
+        rng.shuffle(self.unseen)
+        self.seen = []
+        self.seen_set = set()
+        self.lives = verbal.LIVES
+        self.started = False
+        self.word = self.unseen.pop()
+        word = SimulatedElement(
+            "div", {"class": "word"}, text=lambda: self.word)
+        buttons = [
+            button("SEEN", lambda: self.answer(True)),
+            button("NEW", lambda: self.answer(False))]
+        self.root = page(lambda: (
+            [button("Start", self.start)] if not self.started
+            else [word, *buttons] if self.lives
+            else [SimulatedElement("h1", text="Save score")]))
+
+    def start(self) -> None:
+        """Starts the test."""
+        self.started = True
+
+    def answer(self, seen: bool) -> None:
+        """Handles a SEEN or NEW answer and moves onto the next word."""
+        if seen != (self.word in self.seen_set):
+            self.lives -= 1
+        if self.word not in self.seen_set:
+            self.seen.append(self.word)
+            self.seen_set.add(self.word)
+        if not self.unseen or self.rng.random() < SEEN_CHANCE:
+            self.word = self.rng.choice(self.seen)
+        else:
+            self.word = self.unseen.pop()
+
+
+class NumberGame(Game):
+    """Remember the increasingly long numbers."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        super().__init__(rng, clock)
+        self.state = "start"
+        self.digits = 0
+        self.number = ""
+        self.show_until = None
+        big_number = SimulatedElement(
+            "div", {"class": "big-number"}, text=lambda: self.number)
+        entry = SimulatedElement("input", on_keys=self.submit)
+        answer = SimulatedElement(
+            "div", {"class": "actual-answer"}, children=[
+                SimulatedElement(
+                    "div", {"class": "number"}, text=lambda: self.number)])
+        self.root = page(lambda: {
+            "start": [button("Start", self.next_number)],
+            "show": [big_number],
+            "answer": [entry],
+            "over": [button("Save score", lambda: None), answer]
+        }[self.update()])
+
+    def update(self) -> str:
+        """Hides the number once shown for long enough, returning state."""
+        if self.state == "show" and self.clock() >= self.show_until:
+            self.state = "answer"
+        return self.state
+
+    def next_number(self) -> None:
+        """Shows a new number, one digit longer."""
+        self.digits += 1
+        self.number = str(self.rng.randint(1, 9)) + "".join(
+            self.rng.choices(string.digits, k=self.digits - 1))
+        self.show_until = (
+            self.clock() + NUMBER_SHOW_SECONDS
+            + NUMBER_SHOW_SECONDS_PER_DIGIT * self.digits)
+        self.state = "show"
+
+    def submit(self, text: str) -> None:
+        """Handles the number being input, then ENTER to continue."""
+        if self.update() != "answer":
+            return
+        if text.removesuffix(Keys.ENTER * 2) != self.number:
+            self.state = "over"
+            return
+        self.next_number()
+
+    def next_event(self) -> float | None:
+        return self.show_until if self.state == "show" else None
+
+
+class VisualGame(Game):
+    """Click the squares which were briefly shown."""
+
+    def __init__(self, rng: random.Random, clock: Callable) -> None:
+        super().__init__(rng, clock)
+        self.state = "start"
+        self.level = 1
+        self.lives = visual.LIVES
+        self.grid = None
+        self.root = page(lambda: {
+            "start": [button("Start", self.new_level)],
+            "playing": [self.grid],
+            "over": [SimulatedElement("h1", text="Save score")]
+        }[self.state])
+        # The pattern is known exactly, so there is nothing to observe.
+        self.scripts = {
+            visual.OBSERVE_SCRIPT: lambda: None,
+            visual.POLL_SCRIPT: self.poll_capture
+        }
+
+    def new_level(self, delay: float = 0) -> None:
+        """Creates a new random pattern for the current level."""
+        squares = self.level + visual.STARTING_SQUARES - 1
+        # Grows the grid to keep the squares from becoming too dense.
+        size = max(3, math.ceil(math.sqrt(squares / 0.4)))
+        self.size = size
+        self.pattern = set(self.rng.sample(range(size * size), squares))
+        self.clicked = set()
+        self.grey = 0
+        self.level_start = self.clock() + delay
+        rows = [
+            SimulatedElement("div", children=[
+                SimulatedElement(
+                    "div", {"class": lambda i=i: self.square_class(i)},
+                    on_click=lambda i=i: self.click(i))
+                for i in range(row * size, (row + 1) * size)])
+            for row in range(size)]
+        self.grid = SimulatedElement(
+            "div", {"class": "css-hvbk5q eut2yre0"}, children=rows)
+        self.state = "playing"
+
+    def revealed(self) -> bool:
+        """Whether the pattern is currently being shown."""
+        elapsed = self.clock() - self.level_start
+        return REVEAL_START <= elapsed < REVEAL_STOP
+
+    def poll_capture(self) -> list:
+        """The pattern once revealed, and whether it has been hidden."""
+        elapsed = self.clock() - self.level_start
+        if self.state != "playing" or elapsed < REVEAL_START:
+            return [None, False]
+        board = [
+            [int(row * self.size + column in self.pattern)
+                for column in range(self.size)]
+            for row in range(self.size)]
+        return [board, elapsed >= REVEAL_STOP]
+
+    def square_class(self, i: int) -> str:
+        """Class of a square, active if shown or correctly clicked."""
+        if i in self.clicked:
+            return "css-lxtdud eut2yre1 " + (
+                "active" if i in self.pattern else "error")
+        if i in self.pattern and self.revealed():
+            return "css-lxtdud eut2yre1 active"
+        return "css-lxtdud eut2yre1"
+
+    def click(self, i: int) -> None:
+        """Handles a click on a square, ignored until the pattern hides."""
+        if self.clock() - self.level_start < REVEAL_STOP or i in self.clicked:
+            return
+        self.clicked.add(i)
+        if i not in self.pattern:
+            self.grey += 1
+            if self.grey == visual.MAX_GREY:
+                self.lives -= 1
+                if not self.lives:
+                    self.state = "over"
+                    return
+                self.new_level(LEVEL_TRANSITION)
+            return
+        if self.pattern <= self.clicked:
+            self.level += 1
+            self.new_level(LEVEL_TRANSITION)
+
+
+# Simulated game for each test, by the last part of the URL.
+GAMES = {
+    "reactiontime": ReactionGame,
+    "sequence": SequenceGame,
+    "chimp": ChimpGame,
+    "aim": AimGame,
+    "typing": TypingGame,
+    "verbal-memory": VerbalGame,
+    "number-memory": NumberGame,
+    "memory": VisualGame
+}
+# Test procedure of each test and how to count the rounds of its result.
+SIMULATED_TESTS = {
+    "reaction_time": (
+        reaction.reaction_time, lambda result: len(result.times)),
+    "sequence": (sequence.sequence, lambda result: result.score),
+    "chimp": (chimp.chimp, lambda result: len(result.grids)),
+    "aim": (aim.aim_trainer, lambda result: result.targets),
+    "typing": (typing_.typing_speed, lambda result: 1),
+    "verbal": (verbal.verbal, lambda result: result.score),
+    "number": (number.number, lambda result: result.score),
+    "visual": (visual.visual, lambda result: result.score)
+}
+
+
+class SimulatedBenchmark:
+    """
+    Stand-in for the driver running simulated games, seeded so that
+    the same seed always results in the same games.
+    Seeds the global random state too, for tests failing at random.
+    """
+
+    def __init__(self, seed: int = 0) -> None:
+        self.rng = random.Random(seed)
+        # Simulated seconds passed, only by sleeping and waiting, so the
+        # same seed always results in the same timings too.
+        self.now = 0
+        self.game = Game(self.rng, self.clock)
+
+    def __enter__(self) -> "SimulatedBenchmark":
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+    def clock(self) -> float:
+        """Simulated time, from 0 at the start."""
+        return self.now
+
+    def get_test(self, test_name: str) -> None:
+        """Starts a new simulated game of a test."""
+        random.seed(self.rng.random())
+        game_rng = random.Random(self.rng.random())
+        self.game = GAMES[test_name](game_rng, self.clock)
+
+    def click_start(self, start_button_text: str = "Start") -> None:
+        """Clicks on the start button of a test."""
+        start_button = self.wait(
+            (By.XPATH, f"//button[text()='{start_button_text}']"))
+        start_button.click()
+
+    def sleep(self, seconds: float) -> None:
+        """Skips ahead in simulated time."""
+        self.now += max(seconds, 0)
+
+    def wait(
+        self, locator: tuple[str, str],
+        timeout: int | float = 15, poll: float = 0.1, until: Callable = None
+    ) -> SimulatedElement:
+        """
+        Waits for an element to be present, skipping ahead polls at a time
+        until the next change to the page rather than actually polling.
+        """
+        deadline = self.clock() + timeout
+        while True:
+            elements = self.find_elements(*locator)
+            if elements:
+                return elements[0]
+            now = self.clock()
+            if now >= deadline:
+                raise TimeoutException(f"Timed out waiting for {locator}")
+            event = self.game.next_event()
+            if event is None or event > deadline:
+                self.sleep(deadline - now)
+            else:
+                self.sleep(max(math.ceil((event - now) / poll), 1) * poll)
+
+    def find_elements(self, by: str, value: str) -> list[SimulatedElement]:
+        """Finds elements on the page by a locator."""
+        self.sleep(SECONDS_PER_COMMAND)
+        return locate(self.game.root, by, value)
+
+    def find_element(self, by: str, value: str) -> SimulatedElement:
+        """Finds the first element on the page by a locator."""
+        self.sleep(SECONDS_PER_COMMAND)
+        return self.game.root.find_element(by, value)
+
+    def find_cached(
+        self, by: str, value: str, many: bool = False
+    ) -> SimulatedElement | list[SimulatedElement]:
+        """Simulated elements never go stale, so there is nothing to cache."""
+        if many:
+            return self.find_elements(by, value)
+        return self.find_element(by, value)
+
+    def use_cached(
+        self, locator: tuple[str, str], use: Callable, many: bool = False
+    ) -> Any:
+        """Calls a function with an element (or elements)."""
+        return use(self.find_cached(*locator, many))
+
+    @property
+    def page_source(self) -> str:
+        """HTML of the current page."""
+        self.sleep(SECONDS_PER_COMMAND)
+        return self.game.root.to_html()
+
+    def execute_script(self, script: str, *args: Any) -> Any:
+        """
+        Supports the JavaScript click used by the tests, and the scripts
+        the current game handles itself, only.
+        """
+        self.sleep(SECONDS_PER_COMMAND)
+        if script == "arguments[0].click();":
+            args[0].click()
+            return None
+        if script not in self.game.scripts:
+            raise ValueError(f"Unsupported script: {script}")
+        return self.game.scripts[script](*args)
+
+    def pipeline(self, calls: list[Callable]) -> list:
+        """Runs driver calls in order."""
+        return [call() for call in calls]
+
+    def offset_click(
+        self, element: SimulatedElement, x_offset: int, y_offset: int
+    ) -> None:
+        """Clicks an element, offsets being irrelevant in simulation."""
+        self.sleep(SECONDS_PER_COMMAND)
+        element.click()
+
+
+def simulate(test_name: str, games: int, seed: int = 0) -> SimulationResult:
+    """Runs a number of simulated games of a test, without logging."""
+    run_test, count_rounds = SIMULATED_TESTS[test_name]
+    driver = SimulatedBenchmark(seed)
+    rounds = 0
+    start = timer()
+    with logging_disabled():
+        for _ in range(games):
+            rounds += count_rounds(run_test(driver))
+    seconds = timer() - start
+    return SimulationResult(games, rounds, seconds, rounds / seconds)
+
+
+def main() -> None:
+    """Simulates tests from the command line, optionally profiling."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "tests", nargs="*", default=list(SIMULATED_TESTS),
+        help=f"tests to simulate (default all): {', '.join(SIMULATED_TESTS)}")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="output the functions taking the most time")
+    args = parser.parse_args()
+    for test_name in args.tests:
+        if test_name not in SIMULATED_TESTS:
+            parser.error(f"unknown test: {test_name}")
+    profile = cProfile.Profile() if args.profile else None
+    for test_name in args.tests:
+        if profile is not None:
+            profile.enable()
+        result = simulate(test_name, args.games, args.seed)
+        if profile is not None:
+            profile.disable()
+        print(
+            f"{test_name} - {result.games} games, {result.rounds} rounds, "
+            f"{round(result.rounds_per_second)} rounds/s")
+    if profile is not None:
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(20)
+
+
+if __name__ == "__main__":
+    main()
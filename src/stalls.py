@@ -0,0 +1,230 @@
+"""
+Fast failure of stalled pages. Rather than each wait running out its
+full timeout, a wait going on for longer than the SLO since the test
+last made progress (its loop sending a heartbeat each round) has the
+page checked for what went wrong: an ad frame over the test, the page
+having navigated away, or the browser having crashed. Each failure
+kind has a policy of recovering and retrying, or failing straight
+away. A page which is merely slow is waited on as before.
+"""
+from collections import namedtuple
+from typing import Any, Callable
+
+from selenium.common.exceptions import (
+    StaleElementReferenceException, TimeoutException, WebDriverException)
+from selenium.webdriver.support.wait import WebDriverWait as Wait
+
+from utils import DATA_FOLDER, get_log_function
+
+
+LOG = DATA_FOLDER / "stalls.txt"
+# Seconds without progress after which a waiting page is checked.
+DEFAULT_SLO = 5
+# Kinds of failure.
+AD_OVERLAY = "ad overlay"
+NAVIGATION = "navigation"
+STALE_ELEMENT = "stale element"
+DRIVER_CRASH = "driver crash"
+# A wait running out its full timeout without an identified cause.
+TIMEOUT = "timeout"
+# Policy actions.
+RECOVER = "recover"
+RETRY = "retry"
+ABORT = "abort"
+# Finds the overlay covering the middle of the screen, if any: only an
+# iframe loaded from one of the given (blocked) hosts, so nothing of the
+# website itself is ever taken for an ad.
+FIND_OVERLAY_SCRIPT = """
+const hosts = arguments[0];
+let overlay = document.elementFromPoint(innerWidth / 2, innerHeight / 2);
+if (overlay === null || overlay.tagName !== "IFRAME") {
+    overlay = null;
+} else {
+    let host = "";
+    try {
+        host = new URL(overlay.src).hostname;
+    } catch (error) {}
+    if (!hosts.some(
+        blocked => host === blocked || host.endsWith(`.${blocked}`)
+    )) {
+        overlay = null;
+    }
+}
+"""
+# The URL of the page and whether an ad overlay covers the test.
+CLASSIFY_SCRIPT = FIND_OVERLAY_SCRIPT + """
+return [location.href, overlay !== null];
+"""
+# Removes the ad overlay covering the test, if any.
+REMOVE_OVERLAY_SCRIPT = FIND_OVERLAY_SCRIPT + """
+if (overlay !== null) {
+    overlay.remove();
+}
+"""
+
+
+Policy = namedtuple("Policy", ("action", "retries"))
+# Seconds lost is from the start of the wait until the stall was dealt
+# with, compared to the seconds lost if the wait ran out its timeout.
+Stall = namedtuple(
+    "Stall", ("test", "kind", "action", "seconds_lost", "seconds_without"))
+log = get_log_function(LOG)
+
+
+# Policy for each kind of failure.
+POLICIES = {
+    AD_OVERLAY: Policy(RECOVER, 2),
+    STALE_ELEMENT: Policy(RETRY, 3),
+    NAVIGATION: Policy(ABORT, 0),
+    DRIVER_CRASH: Policy(ABORT, 0)
+}
+
+
+class StallError(TimeoutException):
+    """A wait given up on early, the page having stalled."""
+
+    def __init__(self, kind: str) -> None:
+        super().__init__(f"Page stalled ({kind}).")
+        self.kind = kind
+
+
+class StallWatchdog:
+    """Waits on a driver, dealing with stalled pages by policy."""
+
+    def __init__(
+        self, driver: Any, slo: float = DEFAULT_SLO,
+        policies: dict[str, Policy] = POLICIES,
+        overlay_hosts: list[str] = ()
+    ) -> None:
+        self.driver = driver
+        self.slo = slo
+        self.policies = policies
+        # Hosts whose iframes covering the test are ad overlays.
+        self.overlay_hosts = list(overlay_hosts)
+        self.last_progress = driver.clock()
+        # URL the page is expected to stay on, and the current test.
+        self.expected_url = None
+        self.test = "home"
+        self.stalls: list[Stall] = []
+
+    def heartbeat(self) -> None:
+        """Registers the current test having made progress."""
+        self.last_progress = self.driver.clock()
+
+    def start_test(self, test: str, url: str) -> None:
+        """Registers a test being loaded, clearing the stalls."""
+        self.test = test
+        self.expected_url = url
+        self.stalls.clear()
+        self.heartbeat()
+
+    def classify(self) -> str | None:
+        """The kind of failure of a stalled page, None if unidentified."""
+        # Checks are kept out of recordings, replays having no stalls.
+        try:
+            with self.driver.command_executor.unrecorded():
+                url, overlay = self.driver.execute_script(
+                    CLASSIFY_SCRIPT, self.overlay_hosts)
+        except WebDriverException:
+            return DRIVER_CRASH
+        if (
+            self.expected_url is not None
+            and not url.startswith(self.expected_url)
+        ):
+            return NAVIGATION
+        if overlay:
+            return AD_OVERLAY
+        return None
+
+    def recover(self, kind: str) -> None:
+        """Attempts to recover from a failure."""
+        if kind == AD_OVERLAY:
+            with self.driver.command_executor.unrecorded():
+                self.driver.execute_script(
+                    REMOVE_OVERLAY_SCRIPT, self.overlay_hosts)
+        self.driver.element_cache.invalidate()
+
+    def record(
+        self, kind: str, action: str, seconds_lost: float,
+        seconds_without: float
+    ) -> None:
+        """Records and logs a stall."""
+        stall = Stall(self.test, kind, action, seconds_lost, seconds_without)
+        self.stalls.append(stall)
+        log(
+            f"{stall.test}: {kind} - {action} after "
+            f"{round(seconds_lost, 2)}s ({round(seconds_without, 2)}s "
+            "without failing fast)", print_too=False)
+
+    def wait(
+        self, locator: tuple[str, str], timeout: float, poll: float,
+        until: Callable
+    ) -> Any:
+        """
+        Waits for a condition like WebDriverWait, checking the page each
+        time the SLO passes without progress, and recovering, retrying
+        or failing early by the policy for the failure found.
+        """
+        clock = self.driver.clock
+        start = clock()
+        deadline = start + timeout
+        check_at = max(self.last_progress, start) + self.slo
+        attempts = {}
+        while True:
+            now = clock()
+            try:
+                result = Wait(
+                    self.driver, min(deadline, check_at) - now, poll
+                ).until(until(locator))
+            except StaleElementReferenceException:
+                kind = STALE_ELEMENT
+            except TimeoutException:
+                now = clock()
+                if now >= deadline:
+                    self.record(TIMEOUT, ABORT, now - start, timeout)
+                    raise
+                kind = self.classify()
+                if kind is None:
+                    # Merely slow, so checked again after another SLO.
+                    check_at = now + self.slo
+                    continue
+            except WebDriverException:
+                kind = DRIVER_CRASH
+            else:
+                self.heartbeat()
+                return result
+            policy = self.policies[kind]
+            attempts[kind] = attempts.get(kind, 0) + 1
+            seconds_lost = clock() - start
+            # Only a stalled page would otherwise run out the timeout,
+            # errors being raised straight away.
+            seconds_without = (
+                timeout if kind in (AD_OVERLAY, NAVIGATION) else seconds_lost)
+            if policy.action == ABORT or attempts[kind] > policy.retries:
+                self.record(kind, ABORT, seconds_lost, seconds_without)
+                raise StallError(kind)
+            if policy.action == RECOVER:
+                self.recover(kind)
+            self.record(kind, policy.action, seconds_lost, seconds_without)
+            check_at = clock() + self.slo
+
+    def summary(self) -> str:
+        """Stalls in the current test and the time they cost."""
+        if not self.stalls:
+            return "Stalls: none"
+        kinds = ", ".join(stall.kind for stall in self.stalls)
+        lost = sum(stall.seconds_lost for stall in self.stalls)
+        without = sum(stall.seconds_without for stall in self.stalls)
+        return (
+            f"Stalls: {len(self.stalls)} ({kinds}) - {round(lost, 2)}s "
+            f"lost, {round(without, 2)}s without failing fast")
+
+
+def heartbeat(driver: Any) -> None:
+    """
+    Registers progress with the stall watchdog of a driver,
+    on any driver (drivers without one doing nothing).
+    """
+    watchdog = getattr(driver, "stall_watchdog", None)
+    if watchdog is not None:
+        watchdog.heartbeat()
@@ -0,0 +1,219 @@
+"""
+Local stand-in for the Human Benchmark website, used for offline
+measurements where the live site (and its ads) would add too much noise.
+The pages only imitate the parts of the real site the tests rely on.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+# Seconds each third-party asset takes to be served, imitating slow ads.
+THIRD_PARTY_DELAY = 2
+# Third-party assets referenced by every page, served by the stand-in
+# itself, with the imitated host forming the start of the path.
+THIRD_PARTY_ASSETS = (
+    '<script src="/third-party/securepubads.g.doubleclick.net/ad.js">'
+    "</script>",
+    '<script src="/third-party/www.googletagmanager.com/gtag.js"></script>',
+    '<link rel="stylesheet" '
+    'href="/third-party/fonts.googleapis.com/css?family=Roboto">',
+    '<img src="/third-party/tpc.googlesyndication.com/banner.png">'
+)
+# Seconds between the squares of the sequence test flashing, as on the
+# real site, and the fraction of that time each square flashes for.
+FLASH_INTERVAL = 0.5
+FLASH_DURATION = 0.8
+# Seconds from the start of a sequence test level to its first flash.
+LEVEL_DELAY = 1
+HOME_BODY = """
+<h1>Human Benchmark</h1>
+<button onclick="this.remove()"><span>AGREE</span></button>
+"""
+REACTION_TIME_BODY = """
+<div id="screen" style="height: 400px; color: white; background: #2b86d1">
+    <h1>Reaction Time Test</h1>
+</div>
+<script>
+const ROUNDS = 5;
+// Background colours of the real site in each state.
+const COLOURS = {idle: "#2b86d1", waiting: "#ce2636", ready: "#4bdb6a"};
+const screen = document.getElementById("screen");
+let state = "idle";
+let start = 0;
+let times = [];
+function ready() {
+    state = "ready";
+    screen.style.background = COLOURS.ready;
+    screen.innerHTML = "<div>Click!</div>";
+    start = performance.now();
+}
+screen.addEventListener("click", () => {
+    if (state === "waiting") {
+        state = "idle";
+        screen.style.background = COLOURS.idle;
+        screen.innerHTML = "<h1>Too soon!</h1>";
+    } else if (state === "ready") {
+        let ms = Math.round(performance.now() - start);
+        times.push(ms);
+        if (times.length === ROUNDS) {
+            ms = Math.round(times.reduce((a, b) => a + b) / ROUNDS);
+            times = [];
+        }
+        state = "idle";
+        screen.style.background = COLOURS.idle;
+        screen.innerHTML = `<h1>${ms}ms</h1>`;
+    } else {
+        state = "waiting";
+        screen.style.background = COLOURS.waiting;
+        screen.innerHTML = "<div>Wait for green</div>";
+        setTimeout(ready, 1000 + Math.random() * 2000);
+    }
+});
+</script>
+"""
+SEQUENCE_BODY = """
+<div class="sequence">
+    <h1>Sequence Memory Test</h1>
+    <button id="start">Start</button>
+    <div class="squares">
+        <div class="square-row">
+            <div class="square"></div>
+            <div class="square"></div>
+            <div class="square"></div>
+        </div>
+        <div class="square-row">
+            <div class="square"></div>
+            <div class="square"></div>
+            <div class="square"></div>
+        </div>
+        <div class="square-row">
+            <div class="square"></div>
+            <div class="square"></div>
+            <div class="square"></div>
+        </div>
+    </div>
+</div>
+<script>
+const FLASH_INTERVAL = __FLASH_INTERVAL__ * 1000;
+const FLASH_DURATION = __FLASH_DURATION__;
+const LEVEL_DELAY = __LEVEL_DELAY__ * 1000;
+const squares = [...document.querySelectorAll(".square")];
+const sequence = [];
+let clicked = 0;
+let playing = true;
+function flash(square, ms) {
+    square.classList.add("active");
+    setTimeout(() => square.classList.remove("active"), ms);
+}
+function nextLevel() {
+    sequence.push(Math.floor(Math.random() * squares.length));
+    clicked = 0;
+    playing = true;
+    sequence.forEach((i, step) => setTimeout(
+        () => flash(squares[i], FLASH_INTERVAL * FLASH_DURATION),
+        LEVEL_DELAY + step * FLASH_INTERVAL));
+    // Clicks are accepted as soon as the last square starts flashing.
+    setTimeout(
+        () => playing = false,
+        LEVEL_DELAY + (sequence.length - 1) * FLASH_INTERVAL);
+}
+squares.forEach((square, i) => square.addEventListener("click", () => {
+    if (playing) {
+        return;
+    }
+    if (sequence[clicked] !== i) {
+        document.querySelector(".sequence").innerHTML = (
+            `<h1>Level ${sequence.length}</h1><button>Save score</button>`);
+        return;
+    }
+    flash(square, 100);
+    clicked++;
+    if (clicked === sequence.length) {
+        nextLevel();
+    }
+}));
+document.getElementById("start").addEventListener("click", event => {
+    event.target.remove();
+    nextLevel();
+});
+</script>
+"""
+# Test pages by the last part of the URL.
+TEST_BODIES = {
+    "reactiontime": REACTION_TIME_BODY,
+    "sequence": SEQUENCE_BODY
+}
+
+
+def get_page(body: str) -> bytes:
+    """Wraps a page body with the third-party assets the real site loads."""
+    assets = "\n".join(THIRD_PARTY_ASSETS)
+    return (
+        f"<!DOCTYPE html><html><head>{assets}</head>"
+        f"<body>{body}</body></html>").encode("utf8")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves the stand-in pages and the slow third-party assets."""
+
+    def do_GET(self) -> None:
+        """Responds to a GET request."""
+        url = urlparse(self.path)
+        if url.path.startswith("/third-party/"):
+            time.sleep(THIRD_PARTY_DELAY)
+            self.respond(b"", "text/plain")
+            return
+        if url.path == "/":
+            self.respond(get_page(HOME_BODY))
+            return
+        test_name = url.path.removeprefix("/tests/")
+        body = TEST_BODIES.get(test_name)
+        if body is None:
+            self.send_error(404)
+            return
+        for name, value in self.server.parameters.items():
+            body = body.replace(f"__{name.upper()}__", str(value))
+        self.respond(get_page(body))
+
+    def respond(self, content: bytes, content_type: str = "text/html") -> None:
+        """Sends a successful response with the given content."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *_) -> None:
+        """Do not clutter console with request messages."""
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Stand-in website served on a local port in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(
+        self, port: int = 0, flash_interval: float = FLASH_INTERVAL
+    ) -> None:
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        # Substituted into the pages in place of __NAME__ placeholders.
+        self.parameters = {
+            "flash_interval": flash_interval,
+            "flash_duration": FLASH_DURATION, "level_delay": LEVEL_DELAY}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def domain(self) -> str:
+        """Base URL of the stand-in, used in place of the real domain."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> "StandInServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        super().__exit__(*args)
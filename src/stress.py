@@ -0,0 +1,178 @@
+"""
+Environment stress matrix. Runs tests against the local stand-in across
+every combination of DevTools CPU throttling rate, emulated network
+latency and headless/windowed mode, recording the scores, failures and
+timings of each cell, to find out how the fixed delays of the tests
+hold up on loaded hosts and which mode performs better.
+"""
+import argparse
+import itertools
+import json
+import statistics
+import sys
+from collections import namedtuple
+from timeit import default_timer as timer
+from typing import Any
+
+import main
+import network
+import reaction
+import sequence
+from baseline import METRICS
+from budget import ERROR, GAME_OVER, Budget
+from standin import StandInServer
+from utils import logging_disabled
+
+
+# Tests which the stand-in has pages for.
+STAND_IN_TESTS = ("reaction_time", "sequence")
+DEFAULT_CPU_RATES = (1, 2, 4)
+DEFAULT_LATENCIES = (0, 100, 400)
+DEFAULT_MODES = ("headless", "windowed")
+DEFAULT_RUNS = 3
+# Sequence levels played per run, the stand-in never ending by itself.
+DEFAULT_LEVELS = 10
+# Stop reasons which mean the test failed rather than being stopped.
+FAILURE_REASONS = (ERROR, GAME_OVER)
+
+
+Cell = namedtuple("Cell", ("cpu_rate", "latency_ms", "mode"))
+CellResult = namedtuple(
+    "CellResult",
+    ("test_name", "cell", "runs", "scores", "failures", "seconds"))
+
+
+def apply_throttling(
+    driver: "main.ComputerBenchmark", cpu_rate: float, latency_ms: float
+) -> None:
+    """Slows down the CPU and adds network latency in the current tab."""
+    driver.execute_cdp_cmd(
+        "Emulation.setCPUThrottlingRate", {"rate": cpu_rate})
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.emulateNetworkConditions", {
+        "offline": False, "latency": latency_ms,
+        "downloadThroughput": -1, "uploadThroughput": -1})
+
+
+def run_test(
+    driver: "main.ComputerBenchmark", test_name: str, levels: int
+) -> Any:
+    """Runs a test which the stand-in supports."""
+    if test_name == "reaction_time":
+        return reaction.reaction_time(driver)
+    return sequence.sequence(driver, Budget(target=levels))
+
+
+def run_cell(
+    server: StandInServer, cell: Cell, test_names: list[str], runs: int,
+    levels: int
+) -> list[CellResult]:
+    """Runs each test a number of times in one cell of the matrix."""
+    results = []
+    with main.ComputerBenchmark(
+        headless=cell.mode == "headless", domain=server.domain,
+        network_policy=network.NetworkPolicy(allowed_hosts=("127.0.0.1",)),
+        eager_load=True
+    ) as driver:
+        apply_throttling(driver, cell.cpu_rate, cell.latency_ms)
+        for test_name in test_names:
+            metric = METRICS[test_name][0]
+            scores = []
+            failures = 0
+            seconds = []
+            for _ in range(runs):
+                start = timer()
+                try:
+                    result = run_test(driver, test_name, levels)
+                except Exception:
+                    failures += 1
+                    continue
+                seconds.append(timer() - start)
+                value = metric.get(result)
+                if value is None or result.stop_reason in FAILURE_REASONS:
+                    failures += 1
+                if value is not None:
+                    scores.append(value)
+            results.append(
+                CellResult(test_name, cell, runs, scores, failures, seconds))
+    return results
+
+
+def sweep(
+    test_names: list[str], cpu_rates: list[float], latencies: list[float],
+    modes: list[str], runs: int, levels: int
+) -> list[CellResult]:
+    """Runs the tests in every cell of the matrix."""
+    results = []
+    with StandInServer() as server, logging_disabled():
+        for cell in itertools.starmap(
+            Cell, itertools.product(cpu_rates, latencies, modes)
+        ):
+            print(
+                f"CPU {cell.cpu_rate}x, {cell.latency_ms}ms latency, "
+                f"{cell.mode}...", file=sys.stderr)
+            results.extend(run_cell(server, cell, test_names, runs, levels))
+    return results
+
+
+def output_results(results: list[CellResult]) -> None:
+    """Outputs the results of each cell as a table."""
+    headings = (
+        "Test", "CPU", "Latency", "Mode", "Median score", "Failures",
+        "Mean time")
+    rows = [headings] + [
+        (result.test_name, f"{result.cell.cpu_rate:g}x",
+            f"{result.cell.latency_ms:g}ms", result.cell.mode,
+            f"{statistics.median(result.scores):.4g}"
+            if result.scores else "-",
+            f"{result.failures}/{result.runs}",
+            f"{statistics.mean(result.seconds):.2f}s"
+            if result.seconds else "-")
+        for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(headings))]
+    for row in rows:
+        print("  ".join(
+            cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def cli() -> None:
+    """Sweeps the stress matrix from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "tests", nargs="*", default=list(STAND_IN_TESTS),
+        help=f"tests to run (default all): {', '.join(STAND_IN_TESTS)}")
+    parser.add_argument(
+        "--cpu-rates", nargs="+", type=float,
+        default=list(DEFAULT_CPU_RATES),
+        help="CPU slowdown factors (1 is no throttling)")
+    parser.add_argument(
+        "--latencies", nargs="+", type=float,
+        default=list(DEFAULT_LATENCIES),
+        help="added network latencies in milliseconds")
+    parser.add_argument(
+        "--modes", nargs="+", choices=DEFAULT_MODES,
+        default=list(DEFAULT_MODES))
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--levels", type=int, default=DEFAULT_LEVELS,
+        help="sequence test levels to play per run")
+    parser.add_argument(
+        "--output", type=argparse.FileType("w", encoding="utf8"),
+        help="file to also write the results to as JSON")
+    args = parser.parse_args()
+    for test_name in args.tests:
+        if test_name not in STAND_IN_TESTS:
+            parser.error(f"unknown test: {test_name}")
+    results = sweep(
+        args.tests, args.cpu_rates, args.latencies, args.modes, args.runs,
+        args.levels)
+    output_results(results)
+    if args.output is not None:
+        json.dump([
+            {**result._asdict(), "cell": result.cell._asdict()}
+            for result in results], args.output, indent=4)
+        args.output.write("\n")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,121 @@
+"""
+Tab pool which loads the next scheduled test in a background tab
+whilst the current test runs, so the page is already warm by the time
+the test starts instead of paying for the full navigation and render.
+"""
+import statistics
+import sys
+from collections import deque, namedtuple
+from timeit import default_timer as timer
+
+import main
+import network
+
+
+# Seconds after which a prefetched tab is reloaded before being used.
+MAX_TAB_AGE = 120
+
+
+PrefetchedTab = namedtuple("PrefetchedTab", ("handle", "url", "opened"))
+
+
+class TabPool:
+    """Background tabs loading upcoming test pages, by URL."""
+
+    def __init__(
+        self, driver: "main.ComputerBenchmark", max_age: float = MAX_TAB_AGE
+    ) -> None:
+        self.driver = driver
+        self.max_age = max_age
+        self.tabs: dict[str, PrefetchedTab] = {}
+        # URLs of the tests scheduled to run after the current one.
+        self.upcoming = deque()
+
+    def schedule(self, urls: list[str]) -> None:
+        """Sets the URLs of the tests to be run, in order."""
+        self.upcoming = deque(urls)
+
+    def load_in_tab(self, handle: str, url: str) -> None:
+        """
+        Starts loading a URL in a given tab without waiting for it,
+        then returns to the current tab.
+        """
+        current = self.driver.current_window_handle
+        self.driver.switch_to.window(handle)
+        if self.driver.network_policy is not None:
+            # Blocking is per tab, so must be applied to each new tab.
+            network.apply_network_policy(
+                self.driver, self.driver.network_policy)
+        # Assigning the location does not block like a regular get.
+        self.driver.execute_script("location.href = arguments[0];", url)
+        self.driver.switch_to.window(current)
+
+    def prefetch(self, url: str) -> None:
+        """Opens a hidden background tab loading a given URL."""
+        if url in self.tabs:
+            return
+        handles = set(self.driver.window_handles)
+        self.driver.execute_script("window.open('about:blank');")
+        handle = (set(self.driver.window_handles) - handles).pop()
+        self.load_in_tab(handle, url)
+        self.tabs[url] = PrefetchedTab(handle, url, timer())
+
+    def recycle_stale(self) -> None:
+        """Reloads any tabs that have been open for too long."""
+        for url, tab in self.tabs.items():
+            if timer() - tab.opened > self.max_age:
+                self.load_in_tab(tab.handle, url)
+                self.tabs[url] = tab._replace(opened=timer())
+
+    def take(self, url: str) -> bool:
+        """
+        Switches to the prefetched tab for a URL, closing the current tab.
+        Returns False if the URL has not been prefetched.
+        """
+        self.recycle_stale()
+        tab = self.tabs.pop(url, None)
+        if tab is None:
+            return False
+        self.driver.close()
+        self.driver.switch_to.window(tab.handle)
+        return True
+
+    def prefetch_next(self) -> None:
+        """Prefetches the next scheduled test, if any."""
+        if self.upcoming:
+            self.prefetch(self.upcoming.popleft())
+
+
+def compare_first_action_times(test_names: list[str]) -> None:
+    """
+    Runs the given tests back to back without and then with prefetching,
+    outputting the time from loading each test to its first action,
+    broken down by the time spent starting to prefetch the next test.
+    """
+    for prefetch in (False, True):
+        with main.ComputerBenchmark(
+            headless=True, prefetch=prefetch
+        ) as driver:
+            driver.run_tests(test_names)
+        print(f"Prefetch {'on' if prefetch else 'off'}:")
+        prefetch_times = dict(driver.prefetch_times)
+        for test_name, seconds in driver.first_action_times:
+            line = f"{test_name} - {round(seconds * 1000, 1)}ms"
+            if test_name in prefetch_times:
+                line += (
+                    " (of which prefetching "
+                    f"{round(prefetch_times[test_name] * 1000, 1)}ms)")
+            print(line)
+        mean_seconds = statistics.mean(
+            seconds for _, seconds in driver.first_action_times)
+        print(f"Mean time to first action: {round(mean_seconds * 1000, 1)}ms")
+        if driver.prefetch_times:
+            mean_seconds = statistics.mean(
+                seconds for _, seconds in driver.prefetch_times)
+            print(
+                "Mean time to start prefetching (included above): "
+                f"{round(mean_seconds * 1000, 1)}ms")
+
+
+if __name__ == "__main__":
+    compare_first_action_times(sys.argv[1:] or list(main.TEST_PATHS))
@@ -0,0 +1,188 @@
+"""
+Tuned transport for the WebDriver commands sent to ChromeDriver.
+Every element lookup, click and script is its own HTTP request,
+so the per-request overhead adds up quickly in the faster tests.
+"""
+import json
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from timeit import default_timer as timer
+from typing import Any, Callable, Iterator
+from urllib.parse import urlparse
+
+import urllib3
+from selenium.webdriver.chromium.remote_connection import (
+    ChromiumRemoteConnection)
+from selenium.webdriver.remote.errorhandler import ErrorCode
+
+import metrics
+
+
+# Number of persistent connections kept open to ChromeDriver.
+POOL_SIZE = 4
+# Upper bounds of the command latency histogram buckets in milliseconds.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+# Number of commands to output in the summary, most total time first.
+SUMMARY_COUNT = 5
+
+
+CommandSummary = namedtuple(
+    "CommandSummary", ("command", "count", "total_ms", "mean_ms"))
+
+
+class CommandMetrics:
+    """Count and latency histogram of each WebDriver command by name."""
+
+    def __init__(self) -> None:
+        self.counts: dict[str, int] = {}
+        self.total_seconds: dict[str, float] = {}
+        # Count per latency bucket, with a final bucket for anything slower.
+        self.histograms: dict[str, list[int]] = {}
+        # Commands sent at once are recorded from several threads.
+        self.lock = threading.Lock()
+
+    def record(self, command: str, seconds: float) -> None:
+        """Registers a command having taken a given number of seconds."""
+        ms = seconds * 1000
+        for i, bucket in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bucket:
+                break
+        else:
+            i = len(LATENCY_BUCKETS_MS)
+        with self.lock:
+            if command not in self.counts:
+                self.counts[command] = 0
+                self.total_seconds[command] = 0
+                self.histograms[command] = (
+                    [0] * (len(LATENCY_BUCKETS_MS) + 1))
+            self.counts[command] += 1
+            self.total_seconds[command] += seconds
+            self.histograms[command][i] += 1
+
+    def reset(self) -> None:
+        """Clears all metrics, such as before starting a new test."""
+        with self.lock:
+            self.counts.clear()
+            self.total_seconds.clear()
+            self.histograms.clear()
+
+    def summary(self, count: int = SUMMARY_COUNT) -> list[CommandSummary]:
+        """Returns the commands which took the most time overall."""
+        with self.lock:
+            summaries = [
+                CommandSummary(
+                    command, self.counts[command], seconds * 1000,
+                    seconds / self.counts[command] * 1000)
+                for command, seconds in self.total_seconds.items()]
+        summaries.sort(key=lambda summary: summary.total_ms, reverse=True)
+        return summaries[:count]
+
+
+class TunedConnection(ChromiumRemoteConnection):
+    """
+    Connection to ChromeDriver with persistent pooled connections,
+    headers built once and no proxy lookups, recording metrics.
+    """
+
+    def __init__(
+        self, remote_server_addr: str, pool_size: int = POOL_SIZE
+    ) -> None:
+        super().__init__(
+            remote_server_addr, vendor_prefix="goog", browser_name="chrome",
+            keep_alive=False, ignore_proxy=True)
+        parsed_url = urlparse(remote_server_addr)
+        # ChromeDriver is always local, so a single host pool suffices,
+        # skipping the pool manager lookup on each request.
+        self.pool = urllib3.HTTPConnectionPool(
+            parsed_url.hostname, parsed_url.port, maxsize=pool_size,
+            block=True, timeout=self.request_timeout())
+        self.headers = self.get_remote_connection_headers(
+            parsed_url, keep_alive=True)
+        self.pool_size = pool_size
+        self.metrics = CommandMetrics()
+        # Records the commands and responses for replay when set.
+        self.recorder = None
+
+    def request_timeout(self) -> float | None:
+        """Seconds before a request to ChromeDriver times out."""
+        client_config = getattr(self, "client_config", None)
+        if client_config is None:
+            # Selenium before 4.26 only has the deprecated class timeout.
+            return self.get_timeout()
+        return client_config.timeout
+
+    def execute(self, command: str, params: dict) -> dict:
+        """Sends a command to ChromeDriver, timing (and recording) it."""
+        recorder = self.recorder
+        if recorder is not None:
+            # Copied first, Selenium removing the parameters substituted
+            # into the URL, such as the element ID, from the original.
+            recorded = json.loads(json.dumps(
+                {key: value for key, value in (params or {}).items()
+                    if key != "sessionId"}))
+        start = timer()
+        metrics.COMMANDS.inc(command)
+        response = None
+        try:
+            response = super().execute(command, params)
+        finally:
+            seconds = timer() - start
+            self.metrics.record(command, seconds)
+            metrics.COMMAND_SECONDS.observe(command, value=seconds)
+            if response is None or response.get("status") not in (
+                None, ErrorCode.SUCCESS
+            ):
+                metrics.COMMAND_ERRORS.inc(command)
+        if recorder is not None:
+            recorder.record(command, recorded, response, start, seconds)
+        return response
+
+    @contextmanager
+    def unrecorded(self) -> Iterator[None]:
+        """
+        Keeps the commands sent within the context out of any recording,
+        for commands the replaying driver never sends.
+        """
+        recorder = self.recorder
+        self.recorder = None
+        try:
+            yield
+        finally:
+            self.recorder = recorder
+
+    def _request(self, method: str, url: str, body: str = None) -> dict:
+        """Sends an HTTP request to ChromeDriver, parsing the response."""
+        if body and method not in ("POST", "PUT"):
+            body = None
+        response = self.pool.urlopen(
+            method, urlparse(url).path, body=body, headers=self.headers)
+        try:
+            status = response.status
+            data = response.data.decode("utf8")
+            if 399 < status <= 500:
+                return {"status": status, "value": data}
+            try:
+                data = json.loads(data)
+            except ValueError:
+                if 199 < status < 300:
+                    return {"status": ErrorCode.SUCCESS, "value": data}
+                return {"status": ErrorCode.UNKNOWN_ERROR, "value": data}
+            # Some drivers return no value instead of null.
+            data.setdefault("value", None)
+            return data
+        finally:
+            response.release_conn()
+
+    def pipeline(self, calls: list[Callable[[], Any]]) -> list[Any]:
+        """
+        Runs driver calls which do not depend on each other concurrently
+        over the pooled connections, returning the results in order.
+        """
+        with ThreadPoolExecutor(self.pool_size) as executor:
+            return list(executor.map(lambda call: call(), calls))
+
+    def close(self) -> None:
+        """Closes the pooled connections."""
+        self.pool.close()
@@ -9,6 +9,7 @@ from collections import namedtuple
 from selenium.webdriver.common.by import By
 
 import main
+from metrics import TestProgress
 from utils import DATA_FOLDER, get_log_function, log_date_time
 
 
@@ -66,7 +67,7 @@ def get_repeated_words_difficulty(words: list[str]) -> float:
     # Determine the positions of the occurrences of each word.
     word_indexes = {}
     for i, word in enumerate(words):
-        word_indexes[word] = word_indexes.get(word, []) + [i]
+        word_indexes.setdefault(word, []).append(i)
     repeated_words_difficulty = 50
     for word, indexes in word_indexes.items():
         if len(indexes) == 1:
@@ -194,6 +195,7 @@ def typing_speed(driver: "main.ComputerBenchmark") -> TypingResult:
     """Performs the typing test and returns the result."""
     log_date_time(log, "Typing speed test started at {} UTC.")
     driver.get_test("typing")
+    progress = TestProgress(driver, "typing")
     textbox = driver.wait((By.CLASS_NAME, "letters"))
     # Extract the text and simply type it all out at once. That is all
     # for the web automation part of this task.
@@ -202,4 +204,5 @@ def typing_speed(driver: "main.ComputerBenchmark") -> TypingResult:
     # Deduce the WPM displayed on the page.
     result_element = driver.wait((By.TAG_NAME, "h1"))
     words_per_min = int(result_element.text.removesuffix("wpm"))
+    progress.round(1)
     return get_typing_result(words_per_min, text)
@@ -2,7 +2,9 @@
 import datetime as dt
 import pathlib
 import sys
-from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator
 
 
 # Folder to store the data (logs) in for the user to manually view.
@@ -13,6 +15,11 @@ if hasattr(sys, "_MEIPASS"):
 else:
     # Running Python program.
     DATA_FOLDER = pathlib.Path(__file__).parent.parent / "data"
+# Whether logs are written and output. Disabled for simulated runs,
+# which would otherwise spend most of their time writing logs.
+logging_enabled = True
+# Single worker writing the logs in order when logging in the background.
+log_writer = None
 
 
 def append_text(file_path: pathlib.Path, text: str) -> None:
@@ -25,12 +32,46 @@ def append_text(file_path: pathlib.Path, text: str) -> None:
 def get_log_function(log_file: pathlib.Path) -> Callable:
     """Creates a log function for a given file."""
     def log(text: str, print_too: bool = True, end: str = "\n") -> None:
+        if not logging_enabled:
+            return
+        if log_writer is not None:
+            log_writer.submit(write, text, print_too, end)
+            return
+        write(text, print_too, end)
+
+    def write(text: str, print_too: bool, end: str) -> None:
         append_text(log_file, f"{text}{end}")
         if print_too:
             print(text)
     return log
 
 
+@contextmanager
+def logging_disabled() -> Iterator[None]:
+    """Disables all logs within the context."""
+    global logging_enabled
+    logging_enabled = False
+    try:
+        yield
+    finally:
+        logging_enabled = True
+
+
+@contextmanager
+def background_logging() -> Iterator[None]:
+    """
+    Writes and outputs all logs in the background within the context,
+    so the tests do not wait on the files, finishing them on exit.
+    """
+    global log_writer
+    log_writer = ThreadPoolExecutor(1)
+    try:
+        yield
+    finally:
+        log_writer.shutdown(wait=True)
+        log_writer = None
+
+
 def log_date_time(log: Callable, message_format: str) -> None:
     """Logs the UTC date/time, from a given log and message format."""
     date_time = dt.datetime.utcnow()
@@ -6,21 +6,25 @@ your brain with limited working capacity. The computer
 uses a few bits... RIP!
 """
 import itertools
-import random
 import statistics
 from collections import namedtuple
 
 from selenium.webdriver.common.by import By
 
 import main
+import watchdog
+from budget import ERROR, RANDOM_FAILURE, Budget, BudgetTracker
+from lexicon import Lexicon, count_consonants, count_vowels
+from metrics import TestProgress
 from utils import DATA_FOLDER, get_log_function, log_date_time
 
 
-VOWELS = set("aeiou")
 # Interval at which to output the current number of points.
 POINTS_DISPLAY_INTERVAL = 100
-# Small chance to force a mistake to avoid going on forever.
+# Chance to force a mistake each word, if failing at random.
 FAILURE_RATE = 0.002
+# Stops at the score a 0.2% mistake rate reaches on average by default.
+BUDGET = Budget(target=1500)
 # Up to how many of the most commonly seen words to display.
 MOST_COMMON_COUNT = 10
 # How many lives the game starts with.
@@ -32,24 +36,22 @@ VerbalResult = namedtuple(
     "VerbalResult",
     ("score", "most_common", "unique_count", "duplicate_count",
      "average_word_length", "longest", "shortest", "most_vowels",
-     "most_consonants", "biggest_gap", "smallest_gap")
+     "most_consonants", "biggest_gap", "smallest_gap", "stop_reason",
+     "global_most_common"),
+    defaults=(None, None)
 )
 MostCommon = namedtuple("MostCommon", ("word", "count"))
 log = get_log_function(LOG)
 
 
-def count_vowels(word: str) -> int:
-    """Returns the number of vowels (aeiou) in a word."""
-    return sum(char in VOWELS for char in word)
-
-
-def count_consonants(word: str) -> int:
-    """Returns the number of consonants in a word."""
-    return sum(char.isalpha() and char not in VOWELS for char in word)
-
-
-def get_verbal_result(words: dict[str, list[int]], score: int) -> VerbalResult:
-    """Generates the verbal memory result and returns it."""
+def get_verbal_result(
+    words: dict[str, list[int]], score: int, stop_reason: str | None = None,
+    lexicon: Lexicon | None = None
+) -> VerbalResult:
+    """
+    Generates the verbal memory result and returns it, taking the word
+    counts from the lexicon (which is then updated) if provided.
+    """
     unique_count = len(words)
     # Number of word occurrences which were not the first for a given word.
     duplicate_count = sum(map(len, words.values())) - unique_count
@@ -90,10 +92,15 @@ def get_verbal_result(words: dict[str, list[int]], score: int) -> VerbalResult:
             longest = word
         if shortest is None or len(word) < len(shortest):
             shortest = word
-        vowels = count_vowels(word)
+        if lexicon is not None:
+            entry = lexicon.intern(word)
+            vowels = entry.vowels
+            consonants = entry.consonants
+        else:
+            vowels = count_vowels(word)
+            consonants = count_consonants(word)
         if most_vowels is None or vowels > most_vowels[1]:
             most_vowels = (word, vowels)
-        consonants = count_consonants(word)
         if most_consonants is None or consonants > most_consonants[1]:
             most_consonants = (word, consonants)
         # Processes all gaps between instances to see if any
@@ -107,31 +114,55 @@ def get_verbal_result(words: dict[str, list[int]], score: int) -> VerbalResult:
                 biggest_gap = (word, gap)
             if smallest_gap is None or gap < smallest_gap[1]:
                 smallest_gap = (word, gap)
+    global_most_common = None
+    if lexicon is not None:
+        lexicon.save({word: len(indexes) for word, indexes in words.items()})
+        global_most_common = [
+            MostCommon(entry.word, entry.frequency)
+            for entry in lexicon.most_common(MOST_COMMON_COUNT)]
     return VerbalResult(
         score, most_common, unique_count, duplicate_count,
         average_word_length, longest, shortest, most_vowels,
-        most_consonants, biggest_gap, smallest_gap)
+        most_consonants, biggest_gap, smallest_gap, stop_reason,
+        global_most_common)
 
 
-def verbal(driver: "main.ComputerBenchmark") -> VerbalResult:
-    """Performs the verbal memory test and returns the result."""
+def verbal(
+    driver: "main.ComputerBenchmark", budget: Budget | None = None
+) -> VerbalResult:
+    """
+    Performs the verbal memory test and returns the result,
+    stopping once the budget (by default BUDGET) is used up.
+    Words are added to the lexicon of the driver, if it has one.
+    """
     log_date_time(log, "Verbal memory test started at {} UTC.")
     driver.get_test("verbal-memory")
+    tracker = BudgetTracker(driver, BUDGET if budget is None else budget)
+    progress = TestProgress(driver, "verbal")
+    lexicon = getattr(driver, "lexicon", None)
+    if lexicon is not None:
+        # Loads the lexicon before play rather than on the first word.
+        lexicon.load()
     driver.click_start()
     words = {}
     score = 0
     lives = LIVES
     index = 0
+    progress.lives(lives)
     while lives:
         try:
-            word = driver.find_element(By.CLASS_NAME, "word").text
+            word = driver.use_cached(
+                (By.CLASS_NAME, "word"), lambda element: element.text)
         except Exception:
             log("Error while identifying the current word.")
+            progress.error()
+            stop_reason = ERROR
             break
-        if random.random() < FAILURE_RATE:
+        if tracker.random_failure(FAILURE_RATE):
             # Purposely choose the wrong button to avoid infinite words.
             button_text = "NEW" if word in words else "SEEN"
             lives -= 1
+            progress.lives(lives)
             log(f"Purposely chose the incorrect button. Lives: {lives}")
         else:
             button_text = "SEEN" if word in words else "NEW"
@@ -140,12 +171,26 @@ def verbal(driver: "main.ComputerBenchmark") -> VerbalResult:
             if score % POINTS_DISPLAY_INTERVAL == 0:
                 log(f"{score} points reached. {len(words)} unique words.")
         try:
-            driver.find_element(
-                By.XPATH, f"//button[text()='{button_text}']").click()
+            driver.use_cached(
+                (By.XPATH, f"//button[text()='{button_text}']"),
+                lambda button: button.click())
         except Exception:
             log(f"Failed to click on the {button_text} button.")
+            progress.error()
+            stop_reason = ERROR
             break
         # Register the word and increment the index anyways.
+        if lexicon is not None and word not in words:
+            lexicon.intern(word)
         words[word] = words.get(word, []) + [index]
         index += 1
-    return get_verbal_result(words, score)
+        progress.round(score)
+        watchdog.between_levels(driver)
+        stop_reason = tracker.check(score)
+        if stop_reason is not None:
+            log(f"Budget used up ({stop_reason}).")
+            break
+    else:
+        # Out of lives, which only mistakes made on purpose lose.
+        stop_reason = RANDOM_FAILURE
+    return get_verbal_result(words, score, stop_reason, lexicon)
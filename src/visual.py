@@ -2,8 +2,7 @@
 Who has better visual memory, you or your computer?
 If you have functioning eyes, you have a chance. That's all I will say.
 """
-import random
-import time
+import argparse
 from collections import namedtuple
 
 import lxml
@@ -12,7 +11,13 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 
 import main
-from utils import DATA_FOLDER, get_log_function, log_date_time, get_islands
+import watchdog
+from budget import (
+    ERROR, GAME_OVER, RANDOM_FAILURE, Budget, BudgetTracker)
+from metrics import TestProgress
+from utils import (
+    DATA_FOLDER, get_log_function, log_date_time, get_islands,
+    logging_disabled)
 
 
 # How many squares on level 1.
@@ -21,14 +26,71 @@ STARTING_SQUARES = 3
 LIVES = 3
 # Maximum grey squares allowed before a life is lost.
 MAX_GREY = 3
-# Random chance to automatically end, to avoid going on forever.
+# Chance of failing each level, if failing at random.
 FAILURE_RATE = 0.03
+# Stops at the score a 3% failure rate reaches on average by default.
+BUDGET = Budget(target=35)
 LOG = DATA_FOLDER / "visual.txt"
+# "observe" records the pattern in the page the moment it is revealed,
+# clicking as soon as it hides. "sleep" waits fixed delays for the
+# pattern to show and hide, then scans the page source.
+CAPTURE_MODE = "observe"
+CAPTURE_MODES = ("sleep", "observe")
+# Seconds between checks whilst waiting for the pattern to hide.
+HIDE_POLL_INTERVAL = 0.02
+# Seconds without the pattern hiding after which the level has failed.
+REVEAL_TIMEOUT = 10
+# Levels played per capture mode in the comparison.
+COMPARISON_LEVELS = 20
+# Records the pattern as soon as it is revealed, then when it hides,
+# ignoring squares still active from before the grid was cleared.
+# Running it again clears the recorded pattern for the next level.
+OBSERVE_SCRIPT = """
+const update = () => {
+    const capture = window.visualCapture;
+    const grid = document.querySelector(".eut2yre0");
+    if (!capture.recording || !grid) {
+        return;
+    }
+    const board = [...grid.children].map(
+        row => [...row.children].map(
+            square => square.classList.contains("active") ? 1 : 0));
+    const active = board.flat().reduce((a, b) => a + b, 0);
+    if (!active) {
+        if (capture.pattern) {
+            capture.hidden = true;
+            capture.recording = false;
+        } else {
+            capture.cleared = true;
+        }
+    } else if (capture.cleared && active > capture.active) {
+        capture.pattern = board;
+        capture.active = active;
+    }
+};
+window.visualCapture = {
+    recording: true, cleared: false, pattern: null, active: 0,
+    hidden: false};
+if (!window.visualObserver) {
+    window.visualObserver = new MutationObserver(update);
+    window.visualObserver.observe(document.body, {
+        attributes: true, attributeFilter: ["class"],
+        childList: true, subtree: true
+    });
+}
+update();
+"""
+# The recorded pattern and whether it has been hidden.
+POLL_SCRIPT = """
+return [window.visualCapture.pattern, window.visualCapture.hidden];
+"""
 
 
 VisualResult = namedtuple(
     "VisualResult",
-    ("score", "total_squares", "boards")
+    ("score", "total_squares", "boards", "stop_reason", "level_seconds",
+     "missing_levels"),
+    defaults=(None, (), 0)
 )
 # Stores board grid and the island sizes.
 Board = namedtuple("Board", ("grid", "islands"))
@@ -40,38 +102,92 @@ class GreySquareException(Exception):
     pass
 
 
-def get_visual_result(level_lost: int, boards: list[Board]) -> VisualResult:
+def get_visual_result(
+    level_lost: int, boards: list[Board], stop_reason: str | None = None,
+    level_seconds: list[float] = (), missing_levels: int = 0
+) -> VisualResult:
     """Generates and returns the visual memory result."""
     score = level_lost - 1
     if not score:
-        return VisualResult(0, 0, [])
+        return VisualResult(
+            0, 0, [], stop_reason, list(level_seconds), missing_levels)
     total_squares = ((score + 2) * (score + 3)) // 2 - 3
-    return VisualResult(score, total_squares, boards)
+    return VisualResult(
+        score, total_squares, boards, stop_reason, list(level_seconds),
+        missing_levels)
+
+
+def capture_sleep(driver: "main.ComputerBenchmark") -> list[list[int]]:
+    """
+    Captures the pattern by waiting for it to be shown, scanning the
+    page source, then waiting for it to hide.
+    """
+    driver.sleep(1.5)
+    soup = BeautifulSoup(driver.page_source, "lxml")
+    grid = soup.find(class_="eut2yre0")
+    # Identifies the ACTIVE squares, which are the ones to be
+    # clicked. Converts True to 1 and False to 0 for convenient output.
+    board = [
+        [int("active" in square["class"]) for square in row.find_all()]
+        for row in grid.find_all("div", recursive=False)]
+    driver.sleep(1)
+    return board
 
 
-def visual(driver: "main.ComputerBenchmark") -> VisualResult:
-    """Performs the visual memory test and returns the result."""
+def capture_observe(
+    driver: "main.ComputerBenchmark"
+) -> list[list[int]] | None:
+    """
+    Captures the pattern recorded in the page as it was revealed,
+    returning as soon as it hides, or None if it never does.
+    """
+    deadline = driver.clock() + REVEAL_TIMEOUT
+    while driver.clock() < deadline:
+        board, hidden = driver.execute_script(POLL_SCRIPT)
+        if hidden:
+            return board
+        driver.sleep(HIDE_POLL_INTERVAL)
+    return None
+
+
+def visual(
+    driver: "main.ComputerBenchmark", budget: Budget | None = None,
+    capture_mode: str = CAPTURE_MODE
+) -> VisualResult:
+    """
+    Performs the visual memory test and returns the result,
+    stopping once the budget (by default BUDGET) is used up.
+    """
     log_date_time(log, "Visual memory test started at {} UTC.")
     driver.get_test("memory")
+    tracker = BudgetTracker(driver, BUDGET if budget is None else budget)
+    progress = TestProgress(driver, "visual")
     # Move down the page a bit to minimise ad intrusivity.
     driver.find_element(By.TAG_NAME, "body").send_keys(Keys.DOWN)
+    if capture_mode == "observe":
+        # Observing before starting so the first reveal is not missed.
+        driver.execute_script(OBSERVE_SCRIPT)
     driver.click_start()
     boards = []
     lives = LIVES
+    progress.lives(lives)
     level = 1
+    level_seconds = []
+    missing_levels = 0
+    last_level_end = driver.clock()
     while True:
         log(f"Level {level}")
-        time.sleep(1.5)
         try:
-            soup = BeautifulSoup(driver.page_source, "lxml")
-            grid = soup.find(class_="eut2yre0")
-            # Identifies the ACTIVE squares, which are the ones to be
-            # clicked. Converts True to 1 and False to 0 for convenient output.
-            board = [
-                [int("active" in square["class"]) for square in row.find_all()]
-                for row in grid.find_all("div", recursive=False)]
+            if capture_mode == "observe":
+                board = capture_observe(driver)
+                if board is None:
+                    raise TimeoutError("The pattern never hid.")
+            else:
+                board = capture_sleep(driver)
         except Exception:
             log("An error occurred while trying to identify the pattern.")
+            progress.error()
+            stop_reason = ERROR
             break
         # The number of active squares is expected to be 2 more
         # than the current level number. If a single square is missing,
@@ -80,17 +196,15 @@ def visual(driver: "main.ComputerBenchmark") -> VisualResult:
         missing_squares = (level + STARTING_SQUARES - 1) - active_squares
         if missing_squares:
             log("Missing squares, will need to try and guess correctly.")
-        time.sleep(1)
+            missing_levels += 1
         try:
-            grid = driver.find_element(By.CLASS_NAME, "eut2yre0")
-            grid_rows = [
-                div for div in grid.find_elements(By.TAG_NAME, "div")
-                if not div.get_attribute("class")]
+            # All squares in a single lookup, row by row.
+            grid_squares = driver.find_elements(
+                By.CSS_SELECTOR, ".eut2yre0 > div > div")
             grey = 0
-            for i, (grid_row, row) in enumerate(zip(grid_rows, board)):
-                for j, (grid_square, square) in enumerate(
-                    zip(grid_row.find_elements(By.TAG_NAME, "div"), row)
-                ):
+            for i, row in enumerate(board):
+                for j, square in enumerate(row):
+                    grid_square = grid_squares[i * len(row) + j]
                     if square:
                         # Square has been detected to be included.
                         # Simply click it.
@@ -110,12 +224,18 @@ def visual(driver: "main.ComputerBenchmark") -> VisualResult:
         except GreySquareException:
             log("Maximum failed guesses reached.")
             lives -= 1
+            progress.lives(lives)
             if not lives:
                 log("Out of lives.")
+                stop_reason = GAME_OVER
                 break
+            if capture_mode == "observe":
+                driver.execute_script(OBSERVE_SCRIPT)
             continue
         except Exception:
             log("An error occurred while trying to click the squares.")
+            progress.error()
+            stop_reason = ERROR
             break
         islands = get_islands(board)
         log(f"{len(board)}x{len(board)}")
@@ -123,9 +243,72 @@ def visual(driver: "main.ComputerBenchmark") -> VisualResult:
             log(row)
         log(f"Islands: {islands}")
         boards.append(Board(board, islands))
+        progress.round(level)
+        watchdog.between_levels(driver)
+        level_end = driver.clock()
+        level_seconds.append(level_end - last_level_end)
+        last_level_end = level_end
         level += 1
-        if random.random() < FAILURE_RATE:
-            log("Random failure activated to avoid going on forever.")
+        stop_reason = tracker.check(level - 1)
+        if stop_reason is not None:
+            log(f"Budget used up ({stop_reason}).")
+            break
+        if tracker.random_failure(FAILURE_RATE):
+            log("Random failure activated.")
+            stop_reason = RANDOM_FAILURE
             break
-        time.sleep(1)
-    return get_visual_result(level, boards)
+        if capture_mode == "observe":
+            # Records the next pattern once the grid has been cleared.
+            driver.execute_script(OBSERVE_SCRIPT)
+        else:
+            driver.sleep(1)
+    return get_visual_result(
+        level, boards, stop_reason, level_seconds, missing_levels)
+
+
+def compare_capture_modes(
+    levels: int = COMPARISON_LEVELS, simulate: bool = False,
+    headless: bool = True
+) -> None:
+    """
+    Plays up to the given level in each capture mode, outputting the
+    levels per minute and how often squares were missed.
+    Simulated games are seeded the same, timed in simulated seconds.
+    """
+    # Imported here, as the simulation imports this module.
+    import simulation
+    for capture_mode in CAPTURE_MODES:
+        if simulate:
+            with logging_disabled():
+                result = visual(
+                    simulation.SimulatedBenchmark(), Budget(target=levels),
+                    capture_mode)
+        else:
+            with main.ComputerBenchmark(headless=headless) as driver:
+                result = visual(driver, Budget(target=levels), capture_mode)
+        print(f"{capture_mode.capitalize()} capture:")
+        print(f"Levels completed: {result.score}/{levels}")
+        if result.level_seconds:
+            minutes = sum(result.level_seconds) / 60
+            print(
+                "Levels per minute: "
+                f"{round(len(result.level_seconds) / minutes, 2)}")
+        print(
+            f"Levels with missing squares: {result.missing_levels}/"
+            f"{result.score}")
+
+
+def cli() -> None:
+    """Compares the capture modes from the command line."""
+    parser = argparse.ArgumentParser(description=compare_capture_modes.__doc__)
+    parser.add_argument("--levels", type=int, default=COMPARISON_LEVELS)
+    parser.add_argument(
+        "--simulate", action="store_true",
+        help="play simulated games instead of the real site")
+    parser.add_argument("--windowed", action="store_true")
+    args = parser.parse_args()
+    compare_capture_modes(args.levels, args.simulate, not args.windowed)
+
+
+if __name__ == "__main__":
+    cli()
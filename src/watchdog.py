@@ -0,0 +1,185 @@
+"""
+Browser resource watchdog. Long sessions let the memory of Chrome grow
+until actions slow down or the tab crashes, so the resident memory and
+CPU of the Chrome process tree and the JS heap of the page are sampled
+at safe points. Between tests, the tab (or the whole browser) is
+recycled once past a threshold. Between levels the test cannot be
+moved elsewhere, so garbage is collected instead, anything further
+waiting for the next test. Every action is logged with the reason and
+the resources before and after.
+"""
+from collections import namedtuple
+from typing import Any
+
+from selenium.common.exceptions import WebDriverException
+
+import metrics
+from utils import DATA_FOLDER, get_log_function, log_date_time
+
+try:
+    import psutil
+except ImportError:
+    # Only the JS heap is watched without it.
+    psutil = None
+
+
+LOG = DATA_FOLDER / "watchdog.txt"
+# Minimum seconds between samples between levels, since sampling takes
+# longer than a level of the faster tests.
+LEVEL_CHECK_INTERVAL = 5
+# Actions, from least to most disruptive.
+COLLECT_GARBAGE = "collect garbage"
+RECYCLE_TAB = "recycle tab"
+RECYCLE_BROWSER = "recycle browser"
+
+
+# The JS heap past its threshold recycles the tab, whilst the memory or
+# CPU of the browser processes past theirs recycles the browser.
+# Each threshold is None for no limit.
+Thresholds = namedtuple(
+    "Thresholds", ("heap_bytes", "rss_bytes", "cpu_percent"),
+    defaults=(512 * 1024 ** 2, 4 * 1024 ** 3, None))
+# Each resource is None if it could not be measured.
+ResourceSample = namedtuple(
+    "ResourceSample", ("rss_bytes", "cpu_percent", "heap_bytes"))
+log = get_log_function(LOG)
+
+
+def format_sample(sample: ResourceSample) -> str:
+    """Resources of a sample for the log."""
+    parts = []
+    if sample.rss_bytes is not None:
+        parts.append(f"RSS {round(sample.rss_bytes / 1024 ** 2)}MiB")
+    if sample.cpu_percent is not None:
+        parts.append(f"CPU {round(sample.cpu_percent)}%")
+    if sample.heap_bytes is not None:
+        parts.append(f"JS heap {round(sample.heap_bytes / 1024 ** 2)}MiB")
+    return ", ".join(parts) or "unknown"
+
+
+def is_over(value: float | None, limit: float | None) -> bool:
+    """Whether a measured value is past its threshold, if any."""
+    return value is not None and limit is not None and value > limit
+
+
+class Watchdog:
+    """Samples the resources of a browser, recycling it when needed."""
+
+    def __init__(
+        self, driver: Any, thresholds: Thresholds = Thresholds(),
+        level_interval: float = LEVEL_CHECK_INTERVAL
+    ) -> None:
+        self.driver = driver
+        self.thresholds = thresholds
+        self.level_interval = level_interval
+        self.last_level_check = driver.clock()
+        # Kept between samples, since the CPU percentage of a process
+        # is measured since the previous call.
+        self.processes: dict[int, Any] = {}
+
+    def sample_processes(self) -> tuple[int, float] | tuple[None, None]:
+        """Total RSS and CPU percentage of the driver and browser."""
+        if psutil is None:
+            return None, None
+        try:
+            root = psutil.Process(self.driver.service.process.pid)
+            current = [root, *root.children(recursive=True)]
+        except psutil.Error:
+            return None, None
+        processes = {}
+        rss_bytes = 0
+        cpu_percent = 0
+        for process in current:
+            # The same object is needed to measure CPU since last time.
+            process = self.processes.get(process.pid, process)
+            try:
+                rss_bytes += process.memory_info().rss
+                cpu_percent += process.cpu_percent()
+            except psutil.Error:
+                # Browser processes come and go.
+                continue
+            processes[process.pid] = process
+        self.processes = processes
+        return rss_bytes, cpu_percent
+
+    def sample(self) -> ResourceSample:
+        """Measures the resources in use now."""
+        rss_bytes, cpu_percent = self.sample_processes()
+        try:
+            heap_bytes = self.driver.execute_cdp_cmd(
+                "Runtime.getHeapUsage", {})["usedSize"]
+        except WebDriverException:
+            heap_bytes = None
+        return ResourceSample(rss_bytes, cpu_percent, heap_bytes)
+
+    def get_action(self, sample: ResourceSample) -> tuple[str, str] | None:
+        """The action a sample calls for and why, None if fine."""
+        thresholds = self.thresholds
+        if is_over(sample.rss_bytes, thresholds.rss_bytes):
+            return (
+                RECYCLE_BROWSER,
+                f"RSS over {thresholds.rss_bytes // 1024 ** 2}MiB")
+        if is_over(sample.cpu_percent, thresholds.cpu_percent):
+            return RECYCLE_BROWSER, f"CPU over {thresholds.cpu_percent}%"
+        if sample.heap_bytes is None:
+            # The page no longer responds, most likely having crashed.
+            return RECYCLE_BROWSER, "page unresponsive"
+        if is_over(sample.heap_bytes, thresholds.heap_bytes):
+            return (
+                RECYCLE_TAB,
+                f"JS heap over {thresholds.heap_bytes // 1024 ** 2}MiB")
+        return None
+
+    def act(self, action: str, reason: str, before: ResourceSample) -> None:
+        """Performs an action, logging it with the resources after."""
+        if action == RECYCLE_BROWSER:
+            self.driver.recycle_browser()
+            self.processes = {}
+        elif action == RECYCLE_TAB:
+            self.driver.recycle_tab()
+        else:
+            self.driver.execute_cdp_cmd("HeapProfiler.collectGarbage", {})
+        metrics.RECYCLES.inc(action)
+        after = self.sample()
+        log_date_time(log, "Watchdog acted at {} UTC.")
+        log(f"Action: {action} ({reason})")
+        log(f"Before: {format_sample(before)}")
+        log(f"After: {format_sample(after)}")
+
+    def between_tests(self) -> None:
+        """Recycles the tab or browser if any threshold is crossed."""
+        # Kept out of recordings, replays having no resources to watch.
+        with self.driver.command_executor.unrecorded():
+            before = self.sample()
+            decision = self.get_action(before)
+            if decision is not None:
+                self.act(*decision, before)
+
+    def between_levels(self) -> None:
+        """
+        Collects garbage if any threshold is crossed, checking at most
+        every interval, since recycling would lose the test.
+        """
+        now = self.driver.clock()
+        if now - self.last_level_check < self.level_interval:
+            return
+        self.last_level_check = now
+        with self.driver.command_executor.unrecorded():
+            before = self.sample()
+            decision = self.get_action(before)
+            if decision is None or before.heap_bytes is None:
+                # An unresponsive page fails the test by itself.
+                return
+            action, reason = decision
+            self.act(
+                COLLECT_GARBAGE, f"{reason}, {action} deferred", before)
+
+
+def between_levels(driver: Any) -> None:
+    """
+    Lets the watchdog of a driver check the resources between levels,
+    on any driver (drivers without one doing nothing).
+    """
+    watchdog = getattr(driver, "watchdog", None)
+    if watchdog is not None:
+        watchdog.between_levels()
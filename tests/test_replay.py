@@ -0,0 +1,182 @@
+"""Tests of recording test sessions and replaying them."""
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+from timeit import default_timer as timer
+from types import SimpleNamespace
+
+from selenium.webdriver import ChromeOptions
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+
+
+SRC_FOLDER = pathlib.Path(__file__).parent.parent / "src"
+sys.path.append(str(SRC_FOLDER))
+
+
+import elements
+import main
+import replay
+import transport
+import stalls
+import watchdog
+from recording import Recorder, load_trace
+
+
+# Key under which WebDriver returns element references.
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+DOMAIN = "https://example.com"
+
+
+class FakeChromeDriver(transport.TunedConnection):
+    """
+    Answers commands as ChromeDriver would for a page whose score
+    element only appears after a delay, without any browser.
+    """
+
+    def __init__(self, appear_after: float) -> None:
+        super().__init__("http://127.0.0.1:9515")
+        self.appear_at = timer() + appear_after
+        self.url = None
+
+    def _request(self, method: str, url: str, body: str = None) -> dict:
+        path = url.split("/session", 1)[1]
+        params = json.loads(body) if body else {}
+        if method == "POST" and path == "":
+            capabilities = {"browserName": "chrome"}
+            return {
+                "value": {"sessionId": "fake", "capabilities": capabilities}}
+        if path.endswith("/url") and method == "POST":
+            self.url = params["url"]
+            return {"value": None}
+        if path.endswith("/element"):
+            if timer() < self.appear_at:
+                error = {"error": "no such element", "message": ""}
+                return {"status": 404, "value": json.dumps({"value": error})}
+            return {"value": {ELEMENT_KEY: "score"}}
+        if path.endswith("/text"):
+            return {"value": "42"}
+        if path.endswith("/goog/cdp/execute"):
+            return {"value": {"usedSize": 1024}}
+        if path.endswith("/execute/sync"):
+            # The classification of the stall watchdog: not an overlay.
+            return {"value": [self.url, False]}
+        return {"value": None}
+
+
+class RecordingDriver(main.ComputerBenchmark):
+    """Driver of a fake ChromeDriver, with the resource watchdog on."""
+
+    def __init__(self, appear_after: float, stall_slo: float | None) -> None:
+        self.first_action_times = []
+        self.prefetch_times = []
+        self.test_loaded = None
+        self.current_test = "home"
+        self.metrics_exporter = None
+        self.lexicon = None
+        self.profile = None
+        RemoteWebDriver.__init__(
+            self, command_executor=FakeChromeDriver(appear_after),
+            options=ChromeOptions())
+        self.service = SimpleNamespace(
+            process=SimpleNamespace(pid=os.getpid()))
+        self.domain = DOMAIN
+        self.network_policy = None
+        self.tab_pool = None
+        self.element_cache = elements.ElementCache()
+        self.stall_watchdog = None
+        if stall_slo is not None:
+            self.stall_watchdog = stalls.StallWatchdog(self, stall_slo)
+        self.watchdog = watchdog.Watchdog(self, watchdog.Thresholds())
+
+    def quit(self) -> None:
+        self.stop_recording()
+        RemoteWebDriver.quit(self)
+
+
+class ReplayDriverTest(unittest.TestCase):
+    """Replaying a small trace written by the recorder."""
+
+    def setUp(self) -> None:
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.trace_path = pathlib.Path(folder.name) / "trace.jsonl.gz"
+
+    def test_replays_recorded_commands(self) -> None:
+        recorder = Recorder(self.trace_path, "https://example.com")
+        recorder.record(
+            Command.FIND_ELEMENT,
+            {"using": "css selector", "value": '[id="score"]'},
+            {"value": {ELEMENT_KEY: "e1"}}, recorder.start, 0.01)
+        recorder.record(
+            Command.GET_ELEMENT_TEXT, {"id": "e1"}, {"value": "42"},
+            recorder.start + 0.01, 0.01)
+        recorder.close()
+        with replay.ReplayDriver(self.trace_path) as driver:
+            self.assertEqual(driver.domain, "https://example.com")
+            self.assertEqual(driver.find_element(By.ID, "score").text, "42")
+            self.assertAlmostEqual(driver.clock(), 0.02)
+
+    def test_replays_commands_recorded_by_connection(self) -> None:
+        connection = FakeChromeDriver(0)
+        connection.recorder = Recorder(self.trace_path, DOMAIN)
+        driver = RemoteWebDriver(
+            command_executor=connection, options=ChromeOptions())
+        self.assertEqual(driver.find_element(By.ID, "score").text, "42")
+        driver.quit()
+        connection.recorder.close()
+        _, entries = load_trace(self.trace_path)
+        params = {entry.command: entry.params for entry in entries}
+        self.assertEqual(params[Command.GET_ELEMENT_TEXT], {"id": "score"})
+        with replay.ReplayDriver(self.trace_path) as driver:
+            self.assertEqual(driver.find_element(By.ID, "score").text, "42")
+
+    def test_diverging_command_fails(self) -> None:
+        recorder = Recorder(self.trace_path, "https://example.com")
+        recorder.close()
+        with replay.ReplayDriver(self.trace_path) as driver:
+            with self.assertRaises(replay.ReplayError):
+                driver.find_element(By.ID, "score")
+
+
+class RecordThenReplayTest(unittest.TestCase):
+    """Recording a session, then replaying it to the same result."""
+
+    def setUp(self) -> None:
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.trace_path = pathlib.Path(folder.name) / "trace.jsonl.gz"
+
+    def record_and_replay(
+        self, appear_after: float, stall_slo: float | None
+    ) -> None:
+        """Records a test waiting on its score, then replays it."""
+        def run(driver: main.ComputerBenchmark) -> str:
+            driver.get_test("reactiontime")
+            text = driver.wait((By.ID, "score")).text
+            watchdog.between_levels(driver)
+            return text
+
+        with RecordingDriver(appear_after, stall_slo) as driver:
+            driver.watchdog.last_level_check -= watchdog.LEVEL_CHECK_INTERVAL
+            driver.start_recording(self.trace_path)
+            self.assertEqual(run(driver), "42")
+        with replay.ReplayDriver(self.trace_path) as driver:
+            self.assertEqual(run(driver), "42")
+            connection = driver.command_executor
+            self.assertEqual(connection.position, len(connection.entries))
+
+    def test_resource_watchdog_left_out(self) -> None:
+        self.record_and_replay(1, None)
+
+    def test_watchdogs_at_defaults_left_out(self) -> None:
+        # Slow enough for the stall watchdog to check the page.
+        self.record_and_replay(stalls.DEFAULT_SLO + 1, stalls.DEFAULT_SLO)
+
+
+if __name__ == "__main__":
+    unittest.main()